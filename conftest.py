@@ -0,0 +1,57 @@
+import os
+import json
+
+import pytest
+
+from sdk.simulator import SimulatedNI9234
+from sdk.recording import Recorder, load_record_cfg
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def nidaq():
+    '''
+    Simulated NI9234 on the "fast" clock, a task of 2 accelerometer channels at
+    12.8 kS/s and 100 ms frames. The task is closed after the test.
+    '''
+    nidaq = SimulatedNI9234(device_name='NI_9234', clock_mode='fast')
+    nidaq.create_task(task_name='test')
+    for channel in range(2):
+        nidaq.add_accel_channel(
+            physical_channel=channel, name_to_assign_to_channel='sim',
+            terminal_config='default', min_val=-50.0, max_val=50.0, units='g',
+            sensitivity=100.0, sensitivity_units='millivolts_per_g',
+            current_excit_source='internal', current_excit_val=0.004, custom_scale_name='')
+    nidaq.set_sample_rate(12800)
+    nidaq.set_frame_duration(100)
+    yield nidaq
+    nidaq.close_task()
+
+
+@pytest.fixture
+def record(tmp_path, monkeypatch):
+    '''
+    record(writer_type, duration=1.5, **settings): record directory of a short
+    `Recorder` run on the simulated device, 12.8 kS/s and 100 ms frames (1280
+    samples). `settings` override `./models/cfg_ni9234.json`.
+    '''
+    # sensor configs of the record config are relative to the repo
+    monkeypatch.chdir(REPO_DIR)
+    with open('./models/cfg_ni9234.json') as file:
+        default_settings = json.load(file)
+    record_cfg = load_record_cfg('./models/record_cfg.json')
+    record_cfg['sample_rate'] = 12800
+    record_cfg['frame_duration'] = 100
+
+    def record(writer_type: str, duration: float = 1.5, **settings) -> str:
+        settings = {**default_settings, 'simulate_clock': 'fast', 'segment_period': 0.5,
+                    'trigger': dict(default_settings['trigger'], pre_trigger=0.2, post_trigger=0.3),
+                    **settings}
+        recorder = Recorder(record_cfg, settings, writer_type=writer_type,
+                            write_file_directory=str(tmp_path / writer_type), simulate_device=True)
+        recorder.run(duration=duration, stats_interval=10)
+        return recorder.record_dir
+
+    return record
@@ -22,9 +22,12 @@ class App(QApplication):
         self.model = NIDAQModel()
         self.view = NI9234ViewModel(self.model)
         self.focusChanged.connect(self.view.on_focus_changed)
+        self.aboutToQuit.connect(self.model.shutdown)
 
         self.view.show()
 
 
-app = App()
-sys.exit(app.exec())
+# guarded, the acquisition process re-imports this module on spawn
+if __name__ == '__main__':
+    app = App()
+    sys.exit(app.exec())
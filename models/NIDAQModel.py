@@ -6,12 +6,20 @@ from datetime import datetime
 
 import numpy as np
 import numpy.typing as npt
-from PySide6.QtCore import QObject, QTimer
+from PySide6.QtCore import QObject, QTimer, QThread, QMetaObject, Qt, Slot
 
 from sdk.NIDAQ import NI9234
-from sdk.sensor import AccelerometerChannelSettings, MicrophoneChannelSettings
+from sdk.simulator import SimulatedNI9234
+from sdk.acquisition_process import NI9234Process
+from sdk.ring_buffer import RingBufferConsumer
+from sdk.sensor import AccelerometerChannelSettings, MicrophoneChannelSettings, add_channel_from_settings, load_sensor_cfg
 from sdk.utils import get_func_name
+from sdk.recording import build_task_params, make_record_dir, write_task_params, ProgressLog
+from sdk.retention import RetentionManager
 from debug_flags import PRINT_FUNC_NAME_FLAG
+from .frame_processor import FrameProcessor, ProcessedFrame
+from sdk.dsp import get_envelope_len, SampleScaler
+from sdk.instrumentation import format_health_stats
 
 
 class NIDAQModel(QObject):
@@ -25,6 +33,10 @@ class NIDAQModel(QObject):
     default_settings = json.load(cfg_file)
     cfg_file.close()
     device_name: str = default_settings['device_name']
+    simulate_device: bool = default_settings['simulate_device']
+    simulate_clock: str = default_settings['simulate_clock']
+    # run NI9234 in a child process, frames come through shared memory
+    acquisition_process: bool = default_settings['acquisition_process']
     task_name: str = default_settings['default_task_name']
     sample_rate: int = default_settings['default_sample_rate']
     min_sample_rate: int = default_settings['min_sample_rate']
@@ -49,9 +61,43 @@ class NIDAQModel(QObject):
                                           MicrophoneChannelSettings]]] = list()
 
     writer_switch_flag: bool = False
-    nidaq: NI9234 = None
+    nidaq: Union[NI9234, NI9234Process] = None
+    task_created: bool = False
+    # keep device and task on clear, `create()` reconfigures them in place when it can
+    reuse_task: bool = default_settings['reuse_task']
+    # settings the current nidaq / task / frame buffers were made with, see `create()`
+    device_key: Optional[tuple] = None
+    task_key: Optional[tuple] = None
+    read_key: Optional[tuple] = None
     write_file_directory = default_settings['default_write_file_dir']
+    writer_queue_policy: str = default_settings['writer_queue_policy']
+    # "fixed" or "adaptive" DAQmx input buffer, see `NI9234.set_buffer_size_policy()`
+    buffer_size_policy: str = default_settings['buffer_size_policy']
+    buffer_stall_tolerance: int = default_settings['buffer_stall_tolerance']  # millisecond
+    max_input_buffer_size: float = default_settings['max_input_buffer_size']  # MB
+    buffer_retune: bool = default_settings['buffer_retune']
+    stream_sample_dtype: str = default_settings['stream_sample_dtype']
+    # closed segments compressed off the acquisition path, "codec" null for plain *.npy
+    compression: dict = default_settings['compression']
+    # float64 or float32, for acquisition, ring buffer and plot processing
+    sample_dtype: str = default_settings['sample_dtype']
+    # read raw int32 codes, scaled to engineering units only for plotting
+    read_unscaled: bool = default_settings['read_unscaled']
+    sample_scaling: Optional[dict] = None
+    segment_period: float = default_settings['segment_period']  # second
+    max_segment_size: float = default_settings['max_segment_size']  # MB, 0 for no limit
+    # ms between progress log updates of a recording, cfg.json is written at start and stop
+    progress_interval: int = default_settings['progress_interval']
+    progress_log: Optional[ProgressLog] = None
+    # max size (MB) / age (hour) of the task directory, oldest closed segments removed first
+    retention: dict = default_settings['retention']
+    retention_manager: Optional[RetentionManager] = None
     writer_mode = None
+    writer_type: Optional[str] = None
+    segments: list[dict] = list()
+    # event writer: trigger conditions, pre / post trigger seconds, recorded events
+    trigger: dict = default_settings['trigger']
+    events: list[dict] = list()
     chunk_count = 0
 
     # sensor config
@@ -69,10 +115,13 @@ class NIDAQModel(QObject):
     all_channel_settings: list[Union[AccelerometerChannelSettings,
                                      MicrophoneChannelSettings]] = [None, None, None, None]
 
-    # buffer for visualize data
-    data_buffer_update_timer = QTimer()
-    wave_data_buffer: Optional[npt.NDArray[np.float64]]
-    spectrum_data_buffer: Optional[npt.NDArray[np.float64]]
+    # visualize data, buffered and processed in worker thread
+    frame_processor: Optional[FrameProcessor] = None
+    frame_processor_thread: Optional[QThread] = None
+    plot_consumer: Optional[RingBufferConsumer] = None
+    processed_frame: Optional[ProcessedFrame] = None
+    # min/max buckets of wave chart, set by view to the chart width in pixels
+    wave_bucket_count: int = default_settings['default_wave_bucket_count']
 
     wave_data_buffer_mean: float = 0.0
     wave_data_buffer_count: int = 0
@@ -109,10 +158,29 @@ class NIDAQModel(QObject):
             print(f'run function - {get_func_name(self.__init__)}')
 
         super().__init__()
-        self.data_buffer_update_timer.timeout.connect(
-            self.update_plot_data_buffer)
+        self.frame_processor_thread = QThread()
+        self.frame_processor = FrameProcessor()
+        self.frame_processor.moveToThread(self.frame_processor_thread)
+        # queued to GUI thread
+        self.frame_processor.frame_processed.connect(self.on_frame_processed)
+        self.frame_processor_thread.start()
         self.chunk_count_update_timer.timeout.connect(
-            self.update_cfg_chunk_count)
+            self.update_progress_log)
+
+    def shutdown(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.shutdown)}')
+
+        self.stop_frame_processor()
+        self.frame_processor_thread.quit()
+        self.frame_processor_thread.wait()
+        if isinstance(self.nidaq, NI9234Process):
+            self.nidaq.shutdown()
+        elif self.task_key != None:
+            # task kept by `clear()`
+            self.nidaq.close_writer()
+            self.nidaq.close_task()
+        self.task_key = None
 
     def read_sensor_cfg_352C33(self, physical_channel, sensor_cfg_path):
         if PRINT_FUNC_NAME_FLAG:
@@ -164,167 +232,287 @@ class NIDAQModel(QObject):
             f'sensor type : {self.mic_chan_settings.sensor_type}\n')
         self.all_channel_settings[self.mic_chan_settings.physical_channel] = self.mic_chan_settings
 
+    def get_nidaq(self) -> Union[NI9234, NI9234Process]:
+        '''
+        NI9234 of the current device settings. A new one, which resets the device,
+        is only made when the settings changed or the acquisition process is gone.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.get_nidaq)}')
+
+        device_key = (self.device_name, self.simulate_device,
+                      self.simulate_clock, self.acquisition_process)
+        if self.nidaq != None and self.device_key == device_key:
+            if not isinstance(self.nidaq, NI9234Process) or self.nidaq.is_alive():
+                return self.nidaq
+        if isinstance(self.nidaq, NI9234Process):
+            self.nidaq.shutdown()
+        elif self.task_key != None:
+            self.nidaq.close_task()
+        self.task_key = None
+        self.read_key = None
+        if self.acquisition_process:
+            self.nidaq = NI9234Process(
+                device_name=self.device_name, simulate_device=self.simulate_device,
+                clock_mode=self.simulate_clock)
+        elif self.simulate_device:
+            self.nidaq = SimulatedNI9234(
+                device_name=self.device_name, clock_mode=self.simulate_clock)
+        else:
+            self.nidaq = NI9234(device_name=self.device_name)
+        self.device_key = device_key
+        return self.nidaq
+
+    def get_task_key(self) -> tuple:
+        '''
+        What the task channels are made of, the task is rebuilt when it changes.
+        '''
+        sensor_cfgs = tuple(json.dumps(load_sensor_cfg(sensor_cfg_path), sort_keys=True)
+                            for sensor_cfg_path in self.active_sensor_cfg_list)
+        return (self.task_name, tuple(self.channels), tuple(self.active_sensor_model_list), sensor_cfgs)
+
     def create(self):
+        '''
+        Create the task, or reuse the task of the previous `create()`:
+            same channels and sensor configs : sample rate / frame duration applied in place
+            same timing too                  : hardware and frame buffers untouched
+        '''
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.create)}')
 
-        try:
-            print('try to clear task')
+        if self.task_created:
             self.clear()
-        except:
-            pass
-        self.nidaq = NI9234(device_name=self.device_name)
-        self.nidaq.create_task(task_name=self.task_name)
-        for physical_channel, sensor_model, sensor_cfg_path in zip(self.channels, self.active_sensor_model_list, self.active_sensor_cfg_list):
-
-            if sensor_model == '352C33':
-                print('setting sensor config: 352C33')
-                self.read_sensor_cfg_352C33(physical_channel, sensor_cfg_path)
-                self.nidaq.add_accel_channel(
-                    physical_channel=physical_channel,
-                    name_to_assign_to_channel=self.accel_chan_settings.name_to_assign_to_channel,
-                    terminal_config=self.accel_chan_settings.terminal_config,
-                    min_val=self.accel_chan_settings.min_val,
-                    max_val=self.accel_chan_settings.max_val,
-                    units=self.accel_chan_settings.units,
-                    sensitivity=self.accel_chan_settings.sensitivity,
-                    sensitivity_units=self.accel_chan_settings.sensitivity_units,
-                    current_excit_source=self.accel_chan_settings.current_excit_source,
-                    current_excit_val=self.accel_chan_settings.current_excit_val,
-                    custom_scale_name=self.accel_chan_settings.custom_scale_name)
-
-            if sensor_model == '130F20':
-                print('setting sensor config: 130F20')
-                self.read_sensor_cfg_130F20(physical_channel, sensor_cfg_path)
-                self.nidaq.add_microphone_channel(
-                    physical_channel=physical_channel,
-                    name_to_assign_to_channel=self.mic_chan_settings.name_to_assign_to_channel,
-                    terminal_config=self.mic_chan_settings.terminal_config,
-                    units=self.mic_chan_settings.units,
-                    mic_sensitivity=self.mic_chan_settings.mic_sensitivity,
-                    current_excit_source=self.mic_chan_settings.current_excit_source,
-                    current_excit_val=self.mic_chan_settings.current_excit_val,
-                    custom_scale_name=self.mic_chan_settings.custom_scale_name)
-
-        self.nidaq.set_sample_rate(self.sample_rate)
-        self.nidaq.set_frame_duration(self.frame_duration)
-        self.nidaq.show_daq_params()
-        self.nidaq.ready_read(callback_method=lambda foo1, foo2, foo3, foo4: self.nidaq.callback_method(
-            self.nidaq.task._handle, self.nidaq.every_n_samples_event_type, self.nidaq.frame_size, callback_data=self.nidaq))
-
-        self.data_buffer_update_timer.setInterval(self.frame_duration)
+        self.get_nidaq()
+        self.nidaq.set_writer_queue_policy(self.writer_queue_policy)
+        self.nidaq.set_buffer_size_policy(
+            self.buffer_size_policy, stall_tolerance=self.buffer_stall_tolerance,
+            max_buffer_size=self.max_input_buffer_size, retune=self.buffer_retune)
+        self.nidaq.set_stream_sample_dtype(self.stream_sample_dtype)
+        self.nidaq.set_compression(**self.compression)
+
+        task_key = self.get_task_key()
+        read_key = (self.sample_rate, self.frame_duration,
+                    self.sample_dtype, self.read_unscaled)
+        if self.task_key != task_key:
+            self.nidaq.set_sample_dtype(self.sample_dtype)
+            self.nidaq.set_read_unscaled(self.read_unscaled)
+            self.nidaq.create_task(task_name=self.task_name)
+            self.task_key = task_key
+            for physical_channel, sensor_model, sensor_cfg_path in zip(self.channels, self.active_sensor_model_list, self.active_sensor_cfg_list):
+
+                if sensor_model == '352C33':
+                    print('setting sensor config: 352C33')
+                    self.read_sensor_cfg_352C33(physical_channel, sensor_cfg_path)
+                    add_channel_from_settings(self.nidaq, self.accel_chan_settings)
+
+                if sensor_model == '130F20':
+                    print('setting sensor config: 130F20')
+                    self.read_sensor_cfg_130F20(physical_channel, sensor_cfg_path)
+                    add_channel_from_settings(self.nidaq, self.mic_chan_settings)
+
+            self.nidaq.set_sample_rate(self.sample_rate)
+            self.nidaq.set_frame_duration(self.frame_duration)
+            self.nidaq.show_daq_params()
+            self.nidaq.ready_read()
+        elif self.read_key != read_key:
+            print('reuse task, apply timing in place')
+            self.nidaq.set_sample_dtype(self.sample_dtype)
+            self.nidaq.set_read_unscaled(self.read_unscaled)
+            self.nidaq.set_timing(self.sample_rate, self.frame_duration)
+            self.nidaq.ready_read()
+        else:
+            print('reuse task')
+        self.read_key = read_key
+        self.sample_scaling = self.nidaq.get_sample_scaling()
+        self.plot_consumer = self.nidaq.ring_buffer.register_consumer('plot')
+        self.configure_frame_processor()
+        self.task_created = True
+
+    def configure_frame_processor(self):
+        '''
+        Rebuild plot buffers for the current buffer rate and wave bucket count,
+        chart parameter changes only need this, the task is not touched.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.configure_frame_processor)}')
+
         self.chunk_len = int(self.sample_rate * self.frame_duration * 0.001)
         self.buffer_duration: int = self.frame_duration * self.buffer_rate
         self.wave_buffer_len: int = int(
             self.sample_rate * self.buffer_duration * 0.001)
-
-        self.wave_data_buffer = np.zeros(
-            (self.nidaq.task.number_of_channels, self.wave_buffer_len))
         self.spectrum_freqs = np.fft.rfftfreq(
             self.chunk_len, 1/self.sample_rate)
-        # spectrum array format: (number of channels, buffer rate, chunk len)
-        self.spectrum_data_buffer = np.zeros(
-            (self.nidaq.task.number_of_channels, self.buffer_rate, self.spectrum_freqs.shape[0]))
+
+        # frame processor is stopped here, safe to configure from GUI thread
+        self.stop_frame_processor()
+        self.plot_consumer.skip_to_latest()
+        self.frame_processor.configure(
+            consumer=self.plot_consumer,
+            channel_count=self.nidaq.get_channel_count(),
+            wave_buffer_len=self.wave_buffer_len,
+            spectrum_bins=self.spectrum_freqs.shape[0],
+            buffer_rate=self.buffer_rate,
+            interval=self.frame_duration,
+            wave_mean_threshold=self.wave_mean_threshold,
+            wave_bucket_count=self.wave_bucket_count,
+            scaler=None if self.sample_scaling == None else SampleScaler(
+                **self.sample_scaling, dtype=self.sample_dtype),
+            dtype=self.sample_dtype)
+        self.processed_frame = self.frame_processor.build_result()
 
     def start(self):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.start)}')
         self.nidaq.start_task()
-        self.data_buffer_update_timer.start()
-        self.wave_data_cycle_count = 0
+        QMetaObject.invokeMethod(
+            self.frame_processor, 'start', Qt.QueuedConnection)
 
     def stop(self):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.stop)}')
 
-        if self.writer_switch_flag and self.nidaq.writer.file != None:
+        if self.writer_switch_flag and self.nidaq.is_writer_open():
             self.stop_write_file()
         self.nidaq.stop_task()
-        self.data_buffer_update_timer.stop()
+        self.stop_frame_processor()
         self.start_record_time = 'time_not_set'
 
+    def stop_frame_processor(self):
+        '''
+        Return after the worker thread stopped processing.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.stop_frame_processor)}')
+
+        if self.frame_processor_thread.isRunning():
+            QMetaObject.invokeMethod(
+                self.frame_processor, 'stop', Qt.BlockingQueuedConnection)
+
+    @Slot(object)
+    def on_frame_processed(self, processed_frame: ProcessedFrame):
+        self.processed_frame = processed_frame
+        self.wave_data_buffer_mean = processed_frame.wave_data_mean
+        self.abnormal_flag = processed_frame.abnormal_flag
+
     def clear(self):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.clear)}')
 
+        self.task_created = False
+        self.stop_frame_processor()
+        self.nidaq.close_writer()
+        if self.reuse_task:
+            # device and task stay for the next `create()`, closed in `shutdown()`
+            return
         self.nidaq.close_task()
-        if self.nidaq.writer != None:
-            if self.nidaq.writer.file != None:
-                self.nidaq.writer.close_file()
+        self.task_key = None
+        self.read_key = None
 
     def start_write_file(self, mode):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.start_write_file)}')
 
-        self.nidaq.set_writer_type(mode)
-        self.nidaq.set_writer_enable()
-        print(f'nidaq writer switch flag: {self.nidaq.writer_switch_flag}')
-        if self.nidaq.writer_type == 'stream':
+        self.writer_type = mode
+        self.segments = list()
+        self.events = list()
+        if self.writer_type in ('stream', 'csv'):
             self.write_stream_file()
-        if self.nidaq.writer_type == 'segment':
-            self.chunk_count_update_timer.setInterval(self.frame_duration)
-            self.chunk_count_update_timer.start()
-            self.write_segment_file()
+        if self.writer_type in ('segment', 'event'):
+            self.write_segment_file(period=self.segment_period)
 
         self.write_record_info()
+        self.progress_log = ProgressLog(self.record_dir)
+        self.retention_manager = RetentionManager(
+            self.task_dir, **self.retention, pending_segments=self.nidaq.get_pending_segments)
+        self.retention_manager.set_active_record_dir(self.record_dir)
+        self.retention_manager.start()
+        self.chunk_count_update_timer.setInterval(self.progress_interval)
+        self.chunk_count_update_timer.start()
+        self.nidaq.set_writer_enable()
+        print(f'nidaq writer switch flag: {self.nidaq.writer_switch_flag}')
 
     def stop_write_file(self):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.stop_write_file)}')
         self.chunk_count_update_timer.stop()
-        self.get_current_write_file_count()
         self.nidaq.set_writer_disable()
-        if self.nidaq.writer_type == 'stream':
-            self.nidaq.writer.close_file()
+        print(f'writer stats: {self.nidaq.get_writer_stats()}')
+        print(f'frame stats: {self.nidaq.get_frame_stats()}')
+        print(f'acquisition health:\n{format_health_stats(self.nidaq.get_health_stats())}')
+        self.nidaq.close_writer()
+        self.update_progress_log()
+        self.progress_log.close()
+        self.retention_manager.stop()
 
         self.task_params['frame_count'] = self.chunk_count
+        self.task_params['segments'] = self.get_segment_manifest()
+        self.task_params['frame_stats'] = self.nidaq.get_frame_stats()
+        if self.writer_type == 'event':
+            self.task_params['events'] = list(self.events)
         self.write_record_info()
 
+    def build_task_params(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.build_task_params)}')
+
+        return build_task_params(
+            machine_name=self.machine_name,
+            task_name=self.task_name,
+            start_record_time=self.start_record_time,
+            frame_count=self.chunk_count,
+            sample_rate=self.sample_rate,
+            frame_duration=self.frame_duration,
+            channels=self.channels,
+            channel_names=self.nidaq.get_channel_names(),
+            writer_type=self.writer_type,
+            sensor_cfg_paths=self.active_sensor_cfg_list,
+            segments=self.get_segment_manifest(),
+            sample_scaling=self.sample_scaling,
+            frame_stats=self.nidaq.get_frame_stats(),
+            trigger=self.trigger,
+            events=self.events)
+
     def write_record_info(self):
+        '''
+        Write `task_params` built at record start, at start and stop only,
+        progress in between goes to the progress log.
+        '''
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.write_record_info)}')
 
-        self.task_params = {
-            'machine_ID':   self.machine_name,
-            'task_name':   self.task_name,
-            'start_time':   self.start_record_time,
-            'frame_count':   self.chunk_count,
-            'sample_rate':   self.sample_rate,
-            'frame_duration':   self.frame_duration,
-            'chunk_len':   self.chunk_len,
-            'channels':   self.channels,
-            'channel_names':   self.nidaq.task.ai_channels.channel_names,
-            'writer_type':   self.nidaq.writer.writer_type,
-            'sensor_cfgs':   list(),
-        }
-
-        for sensor_cfg_path in self.active_sensor_cfg_list:
-            with open(sensor_cfg_path) as sensor_cfg_file:
-                sensor_cfg = json.load(sensor_cfg_file)
-            self.task_params['sensor_cfgs'].append(sensor_cfg)
-
         self.export_path = os.path.join(
             self.record_dir, self.export_cfg_file_name)
-        with open(self.export_path, 'w') as file:
-            json.dump(self.task_params, file)
+        write_task_params(self.export_path, self.task_params)
         print(f'export task params: {self.task_params}')
 
-    def update_cfg_chunk_count(self):
+    def update_progress_log(self):
         self.get_current_write_file_count()
-        self.task_params['frame_count'] = self.chunk_count
-        with open(self.export_path, 'w') as file:
-            json.dump(self.task_params, file)
-        print(f'update chunk count: {self.task_params["frame_count"]}')
+        writer_state = {'frame_count': self.chunk_count, 'segments': self.segments,
+                        'events': self.events}
+        if self.progress_log.append(writer_state, self.nidaq.get_frame_stats()):
+            print(f'update chunk count: {self.chunk_count}')
 
     def get_current_write_file_count(self):
         if PRINT_FUNC_NAME_FLAG:
             print(
                 f'run function - {get_func_name(self.get_current_write_file_count)}')
 
-        if self.nidaq.writer.writer_type == 'segment':
-            self.chunk_count = self.nidaq.writer.write_file_count
-        elif self.nidaq.writer.writer_type == 'stream':
-            self.chunk_count = 0
+        # one query for frame count and segments, a round trip in acquisition process mode
+        writer_state = self.nidaq.get_writer_state()
+        self.chunk_count = writer_state['frame_count']
+        self.segments = writer_state['segments']
+        self.events = writer_state['events']
+
+    def get_segment_manifest(self):
+        '''
+        closed segments of segment writer: file name, first frame, frame count, sample count
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.get_segment_manifest)}')
+
+        if self.writer_type in ('segment', 'event'):
+            return list(self.segments)
+        return list()
 
     def write_stream_file(self):
         if PRINT_FUNC_NAME_FLAG:
@@ -335,62 +523,46 @@ class NIDAQModel(QObject):
         self.start_record_time = datetime.now().strftime('%Y%m%dT%H%M%S')
         self.task_dir = os.path.join(self.write_file_directory, self.task_name)
         print(f'record path: {self.task_dir}')
-        if not os.path.isdir(self.task_dir):
-            os.mkdir(self.task_dir)
-        self.record_dir = os.path.join(self.task_dir, self.start_record_time)
-        if not os.path.isdir(self.record_dir):
-            os.mkdir(self.record_dir)
-        self.nidaq.writer.set_directory(self.record_dir)
-        file_path = f'{self.task_name}_{datetime.now().strftime("%Y%m%dT%H%M%S")}.csv'
-        self.nidaq.writer.set_file_name(file_path)
-        self.nidaq.writer.open_file()
+        self.record_dir = make_record_dir(
+            self.write_file_directory, self.task_name, self.start_record_time)
+        file_name = f'{self.task_name}_{datetime.now().strftime("%Y%m%dT%H%M%S")}'
+        # built once per record, sensor configs are not read again while recording
+        self.task_params = self.build_task_params()
+        self.nidaq.open_writer(self.writer_type, self.record_dir,
+                               file_name=file_name, header=self.task_params)
 
     def write_segment_file(self, period=10):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.write_segment_file)}')
         '''
         period : seconds, define a time period for a file
+        segment size is also limited by `max_segment_size` (MB)
         '''
         self.start_record_time = datetime.now().strftime('%Y%m%dT%H%M%S')
         self.task_dir = os.path.join(self.write_file_directory, self.task_name)
         print(f'record path: {self.task_dir}')
-        if not os.path.isdir(self.task_dir):
-            os.mkdir(self.task_dir)
-        self.record_dir = os.path.join(self.task_dir, self.start_record_time)
-        if not os.path.isdir(self.record_dir):
-            os.mkdir(self.record_dir)
-        self.nidaq.writer.set_directory(self.record_dir)
-        self.nidaq.writer.reset_write_file_count()
-
-    def update_plot_data_buffer(self):
-        if PRINT_FUNC_NAME_FLAG:
-            print(
-                f'run function - {get_func_name(self.update_plot_data_buffer)}')
-
-        self.wave_data_buffer = np.roll(
-            self.wave_data_buffer, self.chunk_len)
-        self.wave_data_buffer[:, :self.chunk_len] = self.nidaq.chunk
-
-        self.spectrum_data = np.abs(np.fft.rfft(self.nidaq.chunk))
-        self.spectrum_data[:, 0] = 0  # suppress 0 Hz to 0
-        self.spectrum_data_buffer = np.roll(
-            self.spectrum_data_buffer, 1, axis=1)
-        for i in range(self.spectrum_data.shape[0]):
-            self.spectrum_data_buffer[i, 0, :] = self.spectrum_data[i]
-        self.wave_data_buffer_mean = np.mean(np.abs(self.wave_data_buffer))
+        self.record_dir = make_record_dir(
+            self.write_file_directory, self.task_name, self.start_record_time)
+        self.task_params = self.build_task_params()
+        self.nidaq.open_writer(self.writer_type, self.record_dir, segment_period=period,
+                               max_segment_bytes=int(self.max_segment_size * 1024 * 1024),
+                               trigger=self.trigger if self.writer_type == 'event' else None)
 
     def get_wave_data_buffer(self):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.get_wave_data_buffer)}')
 
-        return self.wave_data_buffer
+        # min/max envelope, oldest sample first
+        return self.processed_frame.wave_envelope
 
-    def get_spectrum_data_buffer(self):
+    def get_mean_spectrum(self):
+        '''
+        mean spectrum of all channels over buffer rate, format: (number of channels, bins)
+        '''
         if PRINT_FUNC_NAME_FLAG:
-            print(
-                f'run function - {get_func_name(self.get_spectrum_data_buffer)}')
+            print(f'run function - {get_func_name(self.get_mean_spectrum)}')
 
-        return self.spectrum_data_buffer
+        return self.processed_frame.mean_spectrum
 
     def get_spectrum_freqs(self):
         if PRINT_FUNC_NAME_FLAG:
@@ -404,6 +576,12 @@ class NIDAQModel(QObject):
 
         return self.wave_buffer_len
 
+    def get_wave_envelope_len(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.get_wave_envelope_len)}')
+
+        return get_envelope_len(self.wave_buffer_len, self.wave_bucket_count)
+
     def get_wave_buffer_mean(self):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.get_wave_buffer_mean)}')
@@ -415,21 +593,21 @@ class NIDAQModel(QObject):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.get_abnormal_flag)}')
 
-        if np.abs(self.wave_data_buffer_mean) > self.wave_mean_threshold:
-            self.wave_data_cycle_count += 1
-        else:
-            self.wave_data_cycle_count -= 1
-
-        if self.wave_data_cycle_count >= 5:
-            self.wave_data_cycle_count = 5
-        elif self.wave_data_cycle_count <= 0:
-            self.wave_data_cycle_count = 0
-        if self.wave_data_cycle_count == 5:
-            self.abnormal_flag = True
-        else:
-            self.abnormal_flag = False
+        # updated per frame by frame processor
         return self.abnormal_flag
 
+    def get_health_stats(self) -> Optional[dict]:
+        '''
+        Buffer fill, callback timing, writer latency and overflows of the running
+        task, `None` without a task.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.get_health_stats)}')
+
+        if not self.task_created:
+            return None
+        return self.nidaq.get_health_stats()
+
     def record_cfg_checker(self):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.record_cfg_checker)}')
@@ -0,0 +1,183 @@
+from typing import Optional
+import dataclasses
+
+import numpy as np
+import numpy.typing as npt
+from PySide6.QtCore import QObject, QTimer, Signal, Slot
+
+from sdk.ring_buffer import RingBufferConsumer, CircularBuffer
+from sdk.dsp import minmax_envelope, SampleScaler
+from sdk.utils import get_func_name
+from debug_flags import PRINT_FUNC_NAME_FLAG
+
+
+@dataclasses.dataclass
+class ProcessedFrame:
+    '''
+    Ready-to-draw snapshot published by `FrameProcessor`, arrays are not shared.
+    '''
+    sequence: int
+    wave_envelope: npt.NDArray       # (number of channels, envelope len), oldest first
+    mean_spectrum: npt.NDArray       # (number of channels, bins)
+    wave_data_mean: float
+    abnormal_flag: bool
+    overrun_count: int = 0
+    lost_frame_count: int = 0
+
+
+class FrameProcessor(QObject):
+    '''
+    Buffering, FFT and abnormal detection of every frame, run on a worker QThread.
+
+    Drains a ring buffer consumer every `interval` ms and emits `frame_processed`
+    with a `ProcessedFrame`, which Qt queues to the receivers in the GUI thread.
+    `configure()` must only be called while processing is stopped.
+    '''
+
+    frame_processed = Signal(object)
+
+    def __init__(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        super().__init__()
+        self.process_timer: Optional[QTimer] = None
+        self.consumer: Optional[RingBufferConsumer] = None
+        self.interval = 100
+        self.wave_data_buffer: Optional[CircularBuffer] = None
+        self.spectrum_data_buffer: Optional[CircularBuffer] = None
+        # abs sum of each frame in wave buffer, for wave buffer mean
+        self.wave_abs_sum_buffer: Optional[CircularBuffer] = None
+        self.buffer_rate = 1
+        # min/max buckets of wave envelope, 0 for no decimation
+        self.wave_bucket_count = 0
+        # converts unscaled frames to engineering units, `None` for scaled frames
+        self.scaler: Optional[SampleScaler] = None
+        # dtype of buffers and FFT
+        self.dtype = np.dtype(np.float64)
+        self.sequence = -1
+        self.wave_data_buffer_mean = 0.0
+        self.wave_mean_threshold = 0.005
+        self.wave_data_cycle_count = 0
+        self.abnormal_flag = False
+
+    def configure(self, consumer: RingBufferConsumer, channel_count: int, wave_buffer_len: int,
+                  spectrum_bins: int, buffer_rate: int, interval: int, wave_mean_threshold: float,
+                  wave_bucket_count: int = 0, scaler: Optional[SampleScaler] = None,
+                  dtype=np.float64):
+        '''
+        interval: millisecond, period of draining the ring buffer
+        wave_bucket_count: min/max buckets of wave envelope, about the chart width in pixels
+        scaler: for a ring buffer of unscaled samples
+        dtype: float64 or float32, for buffers and FFT
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.configure)}')
+
+        self.consumer = consumer
+        self.interval = interval
+        self.buffer_rate = buffer_rate
+        self.wave_mean_threshold = wave_mean_threshold
+        self.wave_bucket_count = wave_bucket_count
+        self.scaler = scaler
+        self.dtype = np.dtype(dtype)
+        self.wave_data_buffer = CircularBuffer(
+            channel_count, wave_buffer_len, dtype=self.dtype)
+        # float64 sum, one value per frame
+        self.wave_abs_sum_buffer = CircularBuffer(
+            1, buffer_rate, track_sum=True)
+        # spectrum array format: (number of channels, buffer rate, bins)
+        # running sum over buffer rate keeps the mean spectrum O(bins) per frame
+        self.spectrum_data_buffer = CircularBuffer(
+            channel_count, buffer_rate, tail_shape=(spectrum_bins,), dtype=self.dtype,
+            track_sum=True)
+        self.sequence = -1
+        self.wave_data_buffer_mean = 0.0
+        self.wave_data_cycle_count = 0
+        self.abnormal_flag = False
+
+    @Slot()
+    def start(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.start)}')
+
+        # timer has to be created in the worker thread
+        if self.process_timer == None:
+            self.process_timer = QTimer(self)
+            self.process_timer.timeout.connect(self.process_pending_frames)
+        self.process_timer.setInterval(self.interval)
+        self.process_timer.start()
+
+    @Slot()
+    def stop(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.stop)}')
+
+        if self.process_timer != None:
+            self.process_timer.stop()
+
+    @Slot()
+    def process_pending_frames(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(
+                f'run function - {get_func_name(self.process_pending_frames)}')
+
+        overrun_count = self.consumer.overrun_count
+        processed = False
+        for sequence, chunk in self.consumer.read_all():
+            self.push_frame(chunk)
+            self.sequence = sequence
+            processed = True
+        if self.consumer.overrun_count != overrun_count:
+            print(
+                f'plot buffer overrun: {self.consumer.overrun_count} times, '
+                f'{self.consumer.lost_frame_count} frames lost')
+        if processed:
+            self.frame_processed.emit(self.build_result())
+
+    def push_frame(self, chunk: npt.NDArray):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.push_frame)}')
+
+        if self.scaler != None:
+            chunk = self.scaler(chunk)
+        self.wave_data_buffer.write(chunk)
+
+        # numpy >= 2 keeps float32 through rfft, astype is a no-op then
+        spectrum_data = np.abs(np.fft.rfft(chunk)).astype(self.dtype, copy=False)
+        spectrum_data[:, 0] = 0  # suppress 0 Hz to 0
+        self.spectrum_data_buffer.write(spectrum_data[:, np.newaxis, :])
+
+        self.wave_abs_sum_buffer.write(np.sum(np.abs(chunk)).reshape(1, 1))
+        self.wave_data_buffer_mean = self.wave_abs_sum_buffer.sum[0] / \
+            self.wave_data_buffer.data.size
+        self.update_abnormal_flag()
+
+    def update_abnormal_flag(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.update_abnormal_flag)}')
+
+        if np.abs(self.wave_data_buffer_mean) > self.wave_mean_threshold:
+            self.wave_data_cycle_count += 1
+        else:
+            self.wave_data_cycle_count -= 1
+
+        if self.wave_data_cycle_count >= 5:
+            self.wave_data_cycle_count = 5
+        elif self.wave_data_cycle_count <= 0:
+            self.wave_data_cycle_count = 0
+        self.abnormal_flag = self.wave_data_cycle_count == 5
+
+    def build_result(self) -> ProcessedFrame:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.build_result)}')
+
+        return ProcessedFrame(
+            sequence=self.sequence,
+            wave_envelope=minmax_envelope(
+                self.wave_data_buffer.ordered(), self.wave_bucket_count),
+            mean_spectrum=self.spectrum_data_buffer.sum / self.buffer_rate,
+            wave_data_mean=float(self.wave_data_buffer_mean),
+            abnormal_flag=self.abnormal_flag,
+            overrun_count=self.consumer.overrun_count,
+            lost_frame_count=self.consumer.lost_frame_count)
@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+import signal
+import argparse
+import threading
+
+from sdk.recording import Recorder, load_record_cfg, get_record_cfg_write_file_dir
+
+
+SETTINGS_PATH = os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), 'models', 'cfg_ni9234.json')
+WRITER_TYPES = ('stream', 'csv', 'segment', 'event')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Headless NI9234 recorder, acquisition and writing without the GUI.')
+    parser.add_argument('record_cfg', help='record config, e.g. ./models/record_cfg.json')
+    parser.add_argument('--settings', default=SETTINGS_PATH,
+                        help='device and writer defaults, default: ./models/cfg_ni9234.json')
+    parser.add_argument('--writer', choices=WRITER_TYPES, default='segment')
+    parser.add_argument('--output', default=None,
+                        help='write file directory, default: target_storage/machine_ID/rawdata of record config')
+    parser.add_argument('--duration', type=float, default=0.0,
+                        help='second, 0 to record until interrupted')
+    parser.add_argument('--stats-interval', type=float, default=10.0,
+                        help='second between throughput reports')
+    parser.add_argument('--simulate', action='store_true',
+                        help='use the simulated NI9234')
+    args = parser.parse_args(argv)
+
+    with open(args.settings) as settings_file:
+        settings = json.load(settings_file)
+    record_cfg = load_record_cfg(args.record_cfg)
+    recorder = Recorder(
+        record_cfg, settings, writer_type=args.writer,
+        write_file_directory=args.output or get_record_cfg_write_file_dir(record_cfg),
+        simulate_device=True if args.simulate else None)
+
+    stop_event = threading.Event()
+
+    def on_signal(signum, frame):
+        print(f'signal {signum}, stopping')
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    recorder.run(duration=args.duration, stats_interval=args.stats_interval,
+                 stop_event=stop_event)
+    print(f'recorded to {recorder.record_dir}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
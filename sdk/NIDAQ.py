@@ -1,5 +1,7 @@
-from typing import Optional, Union
+from typing import Optional, Union, AsyncIterator
 import asyncio
+import math
+import time
 from datetime import datetime
 import dataclasses
 
@@ -20,7 +22,12 @@ from nidaqmx.constants import (AcquisitionType,
 import numpy as np
 import numpy.typing as npt
 
-from .utils import CSVStreamWriter, NPYWriter
+from .utils import CSVStreamWriter, BinaryStreamWriter, NPYWriter, BackgroundWriter
+from .ring_buffer import FrameRingBuffer, SharedFrameRingBuffer
+from .instrumentation import AcquisitionMonitor
+from .trigger import TriggerEngine, EventWriter
+from .dsp import SampleScaler
+from .compression import SegmentCompressor
 from .utils import get_func_name
 from debug_flags import PRINT_FUNC_NAME_FLAG
 
@@ -44,14 +51,59 @@ class NIDAQ(GeneralDAQParams):
     device_name: Optional[str] = None
     min_sample_rate: Optional[float] = None
     max_sample_rate: Optional[float] = None
-    stream_reader: Optional[NiStreamReaders.AnalogMultiChannelReader] = None
-    stream_writer: Optional[CSVStreamWriter] = None
+    stream_reader: Optional[Union[NiStreamReaders.AnalogMultiChannelReader,
+                                  NiStreamReaders.AnalogUnscaledReader]] = None
+    # read raw int32 ADC codes, scaled later by `get_sample_scaling()`
+    read_unscaled: bool = False
+    # engineering units per volt of every channel in task
+    channel_gains: list[float] = list()
+    stream_writer: Optional[BinaryStreamWriter] = None
+    csv_writer: Optional[CSVStreamWriter] = None
     segment_writer: Optional[NPYWriter] = None
-    writer: Optional[Union[CSVStreamWriter, NPYWriter]] = None
+    event_writer: Optional[EventWriter] = None
+    writer: Optional[Union[BinaryStreamWriter, CSVStreamWriter, NPYWriter, EventWriter]] = None
+    background_writer: Optional[BackgroundWriter] = None
     writer_switch_flag: Optional[bool] = None
-    chunk: Optional[npt.NDArray[np.float64]] = None
-    # "stream" for *.csv / "segment" for *.npy
+    chunk: Optional[npt.NDArray] = None
+    # dtype of scaled samples in stream files, raw codes are written as int32
+    stream_sample_dtype: str = 'float32'
+    # dtype of scaled frames, "float64" or "float32"
+    sample_dtype: str = 'float64'
+    sample_dtypes: tuple = ('float64', 'float32')
+    # float64 frame the driver reads into when frames are float32
+    read_buffer: Optional[npt.NDArray[np.float64]] = None
+    ring_buffer: Optional[FrameRingBuffer] = None
+    ring_buffer_duration: int = 2000  # millisecond
+    # shared memory block of ring buffer, created by the GUI process in acquisition process mode
+    ring_buffer_name: Optional[str] = None
+    # "stream" for *.bin / "csv" for *.csv / "segment" for *.npy / "event" for triggered event_*.npy
     writer_type: Optional[str] = None
+    # frame continuity since task start, see `check_frame_continuity()`
+    next_first_sample: int = -1
+    frame_count: int = 0
+    gap_count: int = 0
+    lost_sample_count: int = 0
+    duplicate_count: int = 0
+    # DAQmx input buffer sizing, see `set_buffer_size_policy()`
+    buffer_size_policy: str = 'fixed'
+    buffer_size_policies: tuple = ('fixed', 'adaptive')
+    buffer_frame_count: int = 10  # frames in buffer of "fixed" policy
+    min_buffer_frame_count: int = 2
+    stall_tolerance: int = 1000  # millisecond
+    max_buffer_size: float = 64  # MB
+    buffer_retune: bool = False
+    # print a line per frame from the callback, off for long headless runs
+    print_callback_flag: bool = True
+    # called with the sequence of every committed frame from the callback thread, -1 on stop
+    frame_listeners: list = list()
+    # number of task stops, ends the `frames()` iterators started before
+    stop_count: int = 0
+    # buffer fill, callback timing, writer latency and read errors, see `get_health_stats()`
+    monitor: Optional[AcquisitionMonitor] = None
+    # every N samples event of the task, re-registered by `ready_read()` after a frame size change
+    frame_event_registered: bool = False
+    # rate the sample clock of the current task was configured with, None before
+    sample_clock_rate: Optional[float] = None
 
     def __init__(self) -> None:
         if PRINT_FUNC_NAME_FLAG:
@@ -159,9 +211,8 @@ class NI9234(NIDAQ):
         super(NI9234, self).__init__()
 
         self.device_name = device_name
-        self.device = nidaqmx.system.device.Device(device_name)
+        self.connect_device()
         self.device.reset_device()
-        self.system = nidaqmx.system.System.local()
         self.sample_rate = 12800
         self.record_duration = 5.0
         self.frame_duration = 1000  # millisecond
@@ -172,19 +223,34 @@ class NI9234(NIDAQ):
         self.every_n_samples_event_type = EveryNSamplesEventType.ACQUIRED_INTO_BUFFER
         self.writer_switch_flag = False
         self.write_file_dir = '.'
-        self.stream_writer = CSVStreamWriter(directory=self.write_file_dir)
+        self.stream_writer = BinaryStreamWriter(directory=self.write_file_dir)
+        self.csv_writer = CSVStreamWriter(directory=self.write_file_dir)
         self.segment_writer = NPYWriter(directory=self.write_file_dir)
+        self.event_writer = EventWriter(directory=self.write_file_dir)
+        self.compressor: Optional[SegmentCompressor] = None
+        self.background_writer = BackgroundWriter(policy='block')
+        self.monitor = AcquisitionMonitor()
+        self.background_writer.latency_callback = self.monitor.record_writer_latency
         self.stream_switch_flag = False
+        self.frame_listeners = list()
+
+    def connect_device(self) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.connect_device)}')
+
+        self.device = nidaqmx.system.device.Device(self.device_name)
+        self.system = nidaqmx.system.System.local()
 
     def create_task(self, task_name: str) -> None:
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.create_task)}')
 
-        if self.task == None:
-            self.task = nidaqmx.task.Task(new_task_name=task_name)
-        else:
+        if self.task != None:
             self.close_task()
-            self.task = nidaqmx.task.Task(new_task_name=task_name)
+        self.task = nidaqmx.task.Task(new_task_name=task_name)
+        self.channel_gains = list()
+        self.frame_event_registered = False
+        self.sample_clock_rate = None
 
     def clear_task(self) -> None:
         if PRINT_FUNC_NAME_FLAG:
@@ -242,6 +308,8 @@ class NI9234(NIDAQ):
             current_excit_source=current_excit_source,
             current_excit_val=current_excit_val,
             custom_scale_name=custom_scale_name)
+        # millivolts per g
+        self.channel_gains.append(1000.0 / sensitivity)
 
     def add_microphone_channel(
             self,
@@ -275,6 +343,8 @@ class NI9234(NIDAQ):
             current_excit_source=current_excit_source,
             current_excit_val=current_excit_val,
             custom_scale_name=custom_scale_name)
+        # millivolts per pascal
+        self.channel_gains.append(1000.0 / mic_sensitivity)
 
     def set_sample_rate(self, sample_rate: float) -> None:
         if PRINT_FUNC_NAME_FLAG:
@@ -283,6 +353,24 @@ class NI9234(NIDAQ):
         self.sample_rate = sample_rate
         self.task.timing.cfg_samp_clk_timing(
             rate=self.sample_rate, sample_mode=AcquisitionType.CONTINUOUS)
+        self.sample_clock_rate = self.sample_rate
+        self.set_buffer_size()
+
+    def set_timing(self, sample_rate: float, frame_duration: int) -> None:
+        '''
+        Apply sample rate and frame duration to the existing task and its channels,
+        the task must be stopped. The sample clock is only reconfigured when the task
+        has none yet or the rate changed. Call `ready_read()` after it for the new frame size.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.set_timing)}')
+
+        self.sample_rate = sample_rate
+        if self.sample_clock_rate != sample_rate:
+            self.task.timing.cfg_samp_clk_timing(
+                rate=self.sample_rate, sample_mode=AcquisitionType.CONTINUOUS)
+            self.sample_clock_rate = self.sample_rate
+        self.frame_duration = frame_duration
         self.set_buffer_size()
 
     def set_frame_duration(self, frame_duration: int) -> None:
@@ -297,8 +385,82 @@ class NI9234(NIDAQ):
             print(f'run function - {get_func_name(self.set_buffer_size)}')
 
         self.frame_size = int(self.sample_rate * self.frame_duration * 0.001)
-        self.buffer_size = self.frame_size * 10
+        self.buffer_size = self.compute_buffer_size()
         self.task.in_stream.input_buf_size = self.buffer_size
+        self.monitor.configure(self.buffer_size, self.frame_duration)
+
+    def set_buffer_size_policy(self, policy: str, stall_tolerance: Optional[int] = None,
+                               max_buffer_size: Optional[float] = None,
+                               retune: Optional[bool] = None) -> None:
+        '''
+        policy:
+            "fixed"    : `buffer_frame_count` frames
+            "adaptive" : enough frames to ride out `stall_tolerance` plus the callback
+                         lateness measured in the last run
+        stall_tolerance: millisecond the callback may stall without an overflow
+        max_buffer_size: MB, hard cap of the input buffer
+        retune: resize the buffer from the last run's measurements on `start_task()`
+
+        Takes effect on the next `set_sample_rate()` / `set_frame_duration()`.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(
+                f'run function - {get_func_name(self.set_buffer_size_policy)}')
+
+        if policy not in self.buffer_size_policies:
+            raise BaseException(
+                f'Illegal buffer size policy. Legal policy : {self.buffer_size_policies}')
+        self.buffer_size_policy = policy
+        if stall_tolerance != None:
+            self.stall_tolerance = stall_tolerance
+        if max_buffer_size != None:
+            self.max_buffer_size = max_buffer_size
+        if retune != None:
+            self.buffer_retune = retune
+
+    def compute_buffer_size(self, measured_latency: float = 0.0) -> int:
+        '''
+        Input buffer size, samples per channel, a whole number of frames.
+
+        measured_latency: millisecond, how late the callback may come on top of
+        `stall_tolerance`, e.g. `AcquisitionMonitor.get_callback_latency()`
+        '''
+        if self.buffer_size_policy == 'fixed':
+            return self.frame_size * self.buffer_frame_count
+
+        # the frame being acquired + tolerated stall + measured lateness
+        buffer_duration = self.frame_duration + self.stall_tolerance + measured_latency
+        frame_count = max(self.min_buffer_frame_count,
+                          math.ceil(buffer_duration / self.frame_duration))
+        frame_bytes = self.frame_size * self.task.number_of_channels * \
+            self.task.in_stream.raw_data_width
+        max_frame_count = int(self.max_buffer_size * 1e6 // frame_bytes)
+        if max_frame_count < self.min_buffer_frame_count:
+            raise BaseException(
+                f'max buffer size {self.max_buffer_size} MB holds less than '
+                f'{self.min_buffer_frame_count} frames of {frame_bytes} bytes.')
+        if frame_count > max_frame_count:
+            print(f'input buffer capped at {max_frame_count} frames, '
+                  f'{frame_count} frames wanted')
+            frame_count = max_frame_count
+        return self.frame_size * frame_count
+
+    def retune_buffer_size(self) -> None:
+        '''
+        Resize the input buffer of "adaptive" policy from the callback lateness of
+        the last run, the task must be stopped.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.retune_buffer_size)}')
+
+        if self.buffer_size_policy != 'adaptive' or self.monitor.callback_time.count == 0:
+            return
+        buffer_size = self.compute_buffer_size(self.monitor.get_callback_latency())
+        if buffer_size != self.buffer_size:
+            print(f'retune input buffer size: {self.buffer_size} -> {buffer_size}')
+            self.buffer_size = buffer_size
+            self.task.in_stream.input_buf_size = self.buffer_size
+            self.monitor.configure(self.buffer_size, self.frame_duration)
 
     def set_writer_type(self, writer_type) -> None:
         if PRINT_FUNC_NAME_FLAG:
@@ -308,39 +470,348 @@ class NI9234(NIDAQ):
         self.writer_type = writer_type
         if writer_type == 'stream':
             self.writer = self.stream_writer
+        if writer_type == 'csv':
+            self.writer = self.csv_writer
         if writer_type == 'segment':
             self.writer = self.segment_writer
+        if writer_type == 'event':
+            self.writer = self.event_writer
+        self.background_writer.set_writer(self.writer)
+
+    def set_stream_sample_dtype(self, sample_dtype: str) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(
+                f'run function - {get_func_name(self.set_stream_sample_dtype)}')
+
+        if sample_dtype not in self.stream_writer.sample_dtypes:
+            raise BaseException(
+                f'Illegal stream sample dtype. Legal dtype : {tuple(self.stream_writer.sample_dtypes)}')
+        self.stream_sample_dtype = sample_dtype
+
+    def open_writer(self, writer_type: str, directory: str, file_name: Optional[str] = None,
+                    header: Optional[dict] = None, segment_period: float = 10.0,
+                    max_segment_bytes: int = 0, trigger: Optional[dict] = None) -> None:
+        '''
+        Select writer and prepare its file(s), call `set_writer_enable()` to start writing.
+
+        file_name: stream / csv file name without extension
+        header: task params stored in stream file header
+        segment_period: second, segment writer only
+        trigger: event writer only, "conditions" (`TriggerCondition` fields), "pre_trigger"
+        and "post_trigger" (second)
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.open_writer)}')
+
+        self.set_writer_type(writer_type)
+        self.writer.set_directory(directory)
+        if self.compressor != None:
+            self.compressor.reset_stats()
+        if writer_type == 'stream':
+            # raw codes are stored as is, converting them to float would lose the scaling
+            self.writer.set_sample_dtype('int32' if self.read_unscaled else self.stream_sample_dtype)
+        if writer_type in ('stream', 'csv'):
+            self.writer.set_file_name(f'{file_name}{self.writer.file_extension}')
+            self.writer.set_header(header)
+            self.writer.open_file()
+        if writer_type == 'segment':
+            self.writer.reset_write_file_count()
+            self.writer.set_segment_period(segment_period, self.frame_duration)
+            self.writer.set_max_segment_bytes(max_segment_bytes)
+        if writer_type == 'event':
+            self.writer.reset_write_file_count()
+            sample_scaling = self.get_sample_scaling()
+            engine = TriggerEngine(
+                trigger['conditions'], self.sample_rate,
+                scaler=None if sample_scaling == None else SampleScaler(**sample_scaling))
+            self.writer.configure(engine, trigger['pre_trigger'], trigger['post_trigger'],
+                                  self.frame_duration, max_segment_bytes=max_segment_bytes)
+        self.writer.recording = True
+
+    def close_writer(self) -> None:
+        '''
+        Stop writing, flush queued frames and close the writer file.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.close_writer)}')
+
+        self.set_writer_disable()
+        if self.writer != None:
+            # a segment recording stopped on a segment boundary still has its tag and index files open
+            self.writer.close_file()
+        if self.compressor != None:
+            self.compressor.wait()
+
+    def is_writer_open(self) -> bool:
+        return self.writer != None and self.writer.recording
+
+    def get_writer_state(self) -> dict:
+        '''
+        writer_type, frame_count, closed segments of segment / event writer
+        and events of event writer
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.get_writer_state)}')
+
+        if self.writer == None:
+            return {'writer_type': None, 'frame_count': 0, 'segments': list(), 'events': list()}
+        return {
+            'writer_type': self.writer.writer_type,
+            'frame_count': self.writer.frame_count,
+            'segments': list(getattr(self.writer, 'segments', list())),
+            'events': [dict(event) for event in getattr(self.writer, 'events', list())],
+        }
+
+    def set_writer_queue_policy(self, policy: str) -> None:
+        '''
+        policy: "block" or "drop", see `BackgroundWriter`
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(
+                f'run function - {get_func_name(self.set_writer_queue_policy)}')
+
+        self.background_writer.set_policy(policy)
 
     def set_writer_enable(self) -> None:
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.set_writer_enable)}')
 
+        self.background_writer.start()
         self.writer_switch_flag = True
 
     def set_writer_disable(self) -> None:
+        '''
+        Return after every queued frame is written, the writer file can be closed safely.
+        '''
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.set_writer_disable)}')
 
         self.writer_switch_flag = False
+        self.background_writer.disable()
+
+    def get_writer_stats(self) -> dict:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.get_writer_stats)}')
+
+        stats = self.background_writer.get_stats()
+        if self.compressor != None:
+            stats['compression'] = self.compressor.get_stats()
+        return stats
+
+    def get_pending_segments(self) -> list[str]:
+        '''
+        Closed segments not compressed yet, retention leaves them alone.
+        '''
+        if self.compressor == None:
+            return list()
+        return self.compressor.get_pending_paths()
 
-    def ready_read(self, callback_method) -> None:
+    def set_compression(self, codec: Optional[str] = None, level: int = 6,
+                        filter: str = 'shuffle', workers: int = 2) -> None:
+        '''
+        Compress closed segments of segment / event writer to *.npyz in a thread pool,
+        see `SegmentCompressor`, codec `None` writes plain *.npy.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.set_compression)}')
+
+        if self.compressor != None:
+            self.compressor.wait()
+            self.compressor.shutdown()
+            self.compressor = None
+        if codec != None:
+            self.compressor = SegmentCompressor(codec, level, filter, workers)
+        self.segment_writer.compressor = self.compressor
+        self.event_writer.compressor = self.compressor
+
+    def set_read_unscaled(self, read_unscaled: bool) -> None:
+        '''
+        Takes effect in the next `ready_read()`.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.set_read_unscaled)}')
+
+        self.read_unscaled = read_unscaled
+
+    def set_sample_dtype(self, sample_dtype: str) -> None:
+        '''
+        dtype of scaled frames in ring buffer, takes effect in the next `ready_read()`.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.set_sample_dtype)}')
+
+        if sample_dtype not in self.sample_dtypes:
+            raise BaseException(
+                f'Illegal sample dtype. Legal sample dtype : {self.sample_dtypes}')
+        self.sample_dtype = sample_dtype
+
+    def get_sample_dtype(self) -> np.dtype:
+        return np.dtype(np.int32) if self.read_unscaled else np.dtype(self.sample_dtype)
+
+    def get_sample_scaling(self) -> Optional[dict]:
+        '''
+        `None` for scaled samples, otherwise per channel "coeffs" (ascending polynomial
+        from raw code to volt) and "gains" (engineering units per volt), see `SampleScaler`.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.get_sample_scaling)}')
+
+        if not self.read_unscaled:
+            return None
+        return {
+            'coeffs': [list(channel.ai_dev_scaling_coeff) for channel in self.task.ai_channels],
+            'gains': list(self.channel_gains),
+        }
+
+    def read_frame(self, chunk: npt.NDArray) -> int:
+        if self.read_unscaled:
+            return self.stream_reader.read_int32(
+                chunk, number_of_samples_per_channel=self.frame_size)
+        if self.read_buffer is None:
+            return self.stream_reader.read_many_sample(
+                chunk, number_of_samples_per_channel=self.frame_size)
+        # driver only reads float64, convert into the float32 slot
+        number_of_samples = self.stream_reader.read_many_sample(
+            self.read_buffer, number_of_samples_per_channel=self.frame_size)
+        chunk[:] = self.read_buffer
+        return number_of_samples
+
+    def get_channel_names(self) -> list[str]:
+        return list(self.task.ai_channels.channel_names)
+
+    def get_channel_count(self) -> int:
+        return self.task.number_of_channels
+
+    def build_callback(self):
+        '''
+        Every N samples callback passing this daq to `callback_method()`.
+        '''
+        return lambda task_handle, every_n_samples_event_type, number_of_samples, callback_data: self.callback_method(
+            self.task._handle, self.every_n_samples_event_type, self.frame_size, callback_data=self)
+
+    def ready_read(self, callback_method=None) -> None:
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.ready_read)}')
 
+        if callback_method == None:
+            callback_method = self.build_callback()
+        self.register_frame_event(callback_method)
+
+        self.allocate_frame_buffers()
+        if self.read_unscaled:
+            self.stream_reader = NiStreamReaders.AnalogUnscaledReader(
+                self.task.in_stream)
+        else:
+            self.stream_reader = NiStreamReaders.AnalogMultiChannelReader(
+                self.task.in_stream)
+
+    def register_frame_event(self, callback_method) -> None:
+        '''
+        Register the every N samples event of one frame, a callback registered
+        before is removed first, DAQmx refuses a second registration.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.register_frame_event)}')
+
+        if self.frame_event_registered:
+            self.task.register_every_n_samples_acquired_into_buffer_event(
+                sample_interval=self.frame_size, callback_method=None)
         self.task.register_every_n_samples_acquired_into_buffer_event(
             sample_interval=self.frame_size,
             callback_method=callback_method)
+        self.frame_event_registered = True
 
-        self.chunk = np.zeros((self.task.number_of_channels, self.frame_size))
-        self.stream_reader = NiStreamReaders.AnalogMultiChannelReader(
-            self.task.in_stream)
+    def allocate_frame_buffers(self) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(
+                f'run function - {get_func_name(self.allocate_frame_buffers)}')
+
+        slot_count = self.get_frame_layout()['slot_count']
+        if self.ring_buffer_name == None:
+            self.ring_buffer = FrameRingBuffer(
+                slot_count=slot_count,
+                channel_count=self.task.number_of_channels,
+                frame_size=self.frame_size,
+                dtype=self.get_sample_dtype())
+        else:
+            self.ring_buffer = SharedFrameRingBuffer(
+                slot_count=slot_count,
+                channel_count=self.task.number_of_channels,
+                frame_size=self.frame_size,
+                dtype=self.get_sample_dtype(),
+                name=self.ring_buffer_name)
+        self.read_buffer = None
+        if self.get_sample_dtype() not in (np.dtype(np.int32), np.dtype(np.float64)):
+            self.read_buffer = np.zeros(
+                (self.task.number_of_channels, self.frame_size), dtype=np.float64)
+        self.chunk = self.ring_buffer.get_write_frame()
+        # queued frames are ring buffer slots, they must not be overwritten before written
+        self.background_writer.stop()
+        self.background_writer.set_max_queue_size(slot_count - 2)
+
+    def get_frame_layout(self) -> dict:
+        '''
+        Ring buffer shape for the current task and frame size.
+        '''
+        return {
+            'slot_count': max(4, -(-self.ring_buffer_duration // self.frame_duration)),
+            'channel_count': self.task.number_of_channels,
+            'frame_size': self.frame_size,
+            'dtype': self.get_sample_dtype().str,
+        }
 
     def start_task(self) -> None:
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.start_task)}')
 
+        if self.buffer_retune:
+            self.retune_buffer_size()
+        self.reset_frame_stats()
         self.task.start()
 
+    def reset_frame_stats(self) -> None:
+        self.next_first_sample = -1
+        self.frame_count = 0
+        self.gap_count = 0
+        self.lost_sample_count = 0
+        self.duplicate_count = 0
+        self.monitor.reset()
+
+    def check_frame_continuity(self, first_sample: int) -> None:
+        '''
+        Count frames not starting right after the previous one: a gap loses samples,
+        a duplicate repeats samples already read.
+        '''
+        if self.next_first_sample >= 0:
+            if first_sample > self.next_first_sample:
+                self.gap_count += 1
+                self.lost_sample_count += first_sample - self.next_first_sample
+            elif first_sample < self.next_first_sample:
+                self.duplicate_count += 1
+        self.next_first_sample = first_sample + self.frame_size
+        self.frame_count += 1
+
+    def get_frame_stats(self) -> dict:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.get_frame_stats)}')
+
+        return {
+            'frame_count': self.frame_count,
+            'gap_count': self.gap_count,
+            'lost_sample_count': self.lost_sample_count,
+            'duplicate_count': self.duplicate_count,
+            'read_error_count': self.monitor.read_error_count,
+        }
+
+    def get_health_stats(self) -> dict:
+        '''
+        Histograms and error counts of `AcquisitionMonitor` since task start.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.get_health_stats)}')
+
+        return self.monitor.get_stats()
+
     def start_streaming_period_time(self, time: Union[float, int]) -> None:
         '''
         time: second
@@ -353,16 +824,97 @@ class NI9234(NIDAQ):
         return self.task.in_stream.read(number_of_samples_per_channel=number_of_samples)
 
     async def async_start_task(self) -> None:
+        '''
+        `start_task()` in the default executor, the driver call does not block the event loop.
+        '''
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.async_start_task)}')
 
-        self.task.start()
+        await asyncio.get_running_loop().run_in_executor(None, self.start_task)
+
+    async def async_stop_task(self) -> None:
+        '''
+        `stop_task()` in the default executor, running `frames()` iterators end
+        after their pending frames.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.async_stop_task)}')
+
+        await asyncio.get_running_loop().run_in_executor(None, self.stop_task)
+
+    def add_frame_listener(self, listener) -> None:
+        # copy on write, the callback thread iterates the old list without a lock
+        self.frame_listeners = self.frame_listeners + [listener]
+
+    def remove_frame_listener(self, listener) -> None:
+        self.frame_listeners = [
+            item for item in self.frame_listeners if item is not listener]
+
+    def notify_frame_listeners(self, sequence: int) -> None:
+        for listener in self.frame_listeners:
+            listener(sequence)
+
+    async def frames(self, copy: bool = True) -> AsyncIterator[tuple[int, npt.NDArray, npt.NDArray]]:
+        '''
+        Async iterator of (sequence, frame, tag) of every frame committed from now on,
+        until the task is stopped or closed. Frames are (number of channels, samples).
+
+        The callback only wakes the event loop, frames are read from `ring_buffer`
+        like any other consumer. With `copy=False` the frame is a ring slot view,
+        valid while `ring_buffer.is_available(sequence)`. Frames the consumer was
+        too slow for are skipped and counted in the consumer `lost_frame_count`.
+
+            async for sequence, frame, tag in daq.frames():
+                ...
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.frames)}')
+
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+
+        def notify(sequence: int) -> None:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # event loop is closed
+                pass
+
+        ring_buffer = self.ring_buffer
+        consumer = ring_buffer.register_consumer(f'frames-{id(wakeup)}')
+        stop_count = self.stop_count
+        self.add_frame_listener(notify)
+        try:
+            while True:
+                item = consumer.read()
+                if item == None:
+                    if self.stop_count != stop_count:
+                        return
+                    wakeup.clear()
+                    # a frame committed before clear() would not wake us
+                    if consumer.available() == 0 and self.stop_count == stop_count:
+                        await wakeup.wait()
+                    continue
+                sequence, frame = item
+                if copy:
+                    frame = frame.copy()
+                tag = ring_buffer.get_frame_tag(sequence)
+                if not ring_buffer.is_available(sequence):
+                    # overwritten while being copied
+                    consumer.lost_frame_count += 1
+                    continue
+                yield sequence, frame, tag
+        finally:
+            self.remove_frame_listener(notify)
+            ring_buffer.unregister_consumer(consumer.name)
 
     def stop_task(self) -> None:
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.stop_task)}')
 
         self.task.stop()
+        self.stop_count += 1
+        self.notify_frame_listeners(-1)
         print('Task is stopped!!')
 
     def close_task(self) -> None:
@@ -370,7 +922,14 @@ class NI9234(NIDAQ):
             print(f'run function - {get_func_name(self.close_task)}')
 
         self.set_writer_disable()
-        self.task.close()
+        self.background_writer.stop()
+        if self.task != None:
+            self.task.close()
+            self.task = None
+            self.frame_event_registered = False
+            self.sample_clock_rate = None
+        self.stop_count += 1
+        self.notify_frame_listeners(-1)
         print('Task is done!!')
 
     def show_control_manual(self):
@@ -390,6 +949,7 @@ class NI9234(NIDAQ):
             if keyboard.is_pressed('s') and not self.stream_switch_flag:
                 self.set_writer_enable()
                 self.start_task()
+                self.stream_switch_flag = True
                 print('start streaming')
             elif keyboard.is_pressed('p'):
                 self.set_writer_disable()
@@ -403,34 +963,57 @@ class NI9234(NIDAQ):
     @staticmethod
     def callback_method(task_handle, every_n_samples_event_type,
                         num_of_samples, callback_data: NIDAQ):
+        start_time = time.perf_counter()
         daq = callback_data
-        daq.stream_reader.read_many_sample(daq.chunk)
+        ring_buffer = daq.ring_buffer
+        chunk = ring_buffer.get_write_frame()
+        # samples waiting in the input buffer, close to its size means an overflow is near
+        avail_samples = daq.task.in_stream.avail_samp_per_chan
+        # absolute index of the first sample this read returns
+        first_sample = daq.task.in_stream.curr_read_pos
+        try:
+            daq.read_frame(chunk)
+        except Exception as error:
+            # e.g. input buffer overflow, the samples are gone and show up as a gap
+            daq.monitor.record_read_error(error)
+            print(f'read error: {error}')
+            return 0
+        daq.check_frame_continuity(first_sample)
+        sequence = ring_buffer.commit(
+            first_sample, time.monotonic_ns(), time.time_ns())
+        daq.chunk = chunk
 
         if daq.writer_switch_flag:
-            daq.writer.write(chunk=daq.chunk, transpose=True)
+            daq.background_writer.put(chunk, transpose=True, sequence=sequence,
+                                      tag=ring_buffer.get_frame_tag(sequence))
+        daq.notify_frame_listeners(sequence)
 
-        current_time = datetime.now().isoformat(timespec='milliseconds')
-        print(
-            f'run callback - Now time: {current_time} / Recording..., buffer size: {num_of_samples}')
+        if daq.print_callback_flag:
+            current_time = datetime.now().isoformat(timespec='milliseconds')
+            print(
+                f'run callback - Now time: {current_time} / Recording..., buffer size: {num_of_samples}, '
+                f'first sample: {first_sample}')
 
+        daq.monitor.record_callback(
+            avail_samples, start_time, time.perf_counter())
         return 0
 
 
 if __name__ == '__main__':
+    # keyboard demo, run from the repository root: python -m sdk.NIDAQ
+    from .sensor import read_channel_settings, add_channel_from_settings
+
     nidaq = NI9234(device_name='NI_9234')
     nidaq.create_task(task_name='myTask')
-    nidaq.add_accel_channel(0)
-    nidaq.add_microphone_channel(1)
+    add_channel_from_settings(nidaq, read_channel_settings('./models/sensors/352c33.json', 0))
+    add_channel_from_settings(nidaq, read_channel_settings('./models/sensors/130F20.json', 1))
     nidaq.set_sample_rate(12800)
     nidaq.set_frame_duration(100)
-
-    nidaq.ready_read(
-        callback_method=lambda task_handle, every_n_samples_event_type,
-        number_of_samples, callback_data: nidaq.callback_method(
-            nidaq.task._handle, nidaq.every_n_samples_event_type, nidaq.frame_size, callback_data=nidaq))
+    nidaq.ready_read()
+    nidaq.open_writer('segment', './record_data')
     nidaq.show_control_manual()
 
-    tasks = [nidaq.key_switch_event()]
-    asyncio.run(asyncio.wait(tasks))
+    asyncio.run(nidaq.key_switch_event())
+    nidaq.close_writer()
 
     print('Process done!')
@@ -0,0 +1,297 @@
+from typing import Optional
+import threading
+import multiprocessing
+from multiprocessing.connection import Connection
+
+from .ring_buffer import SharedFrameRingBuffer
+from .utils import get_func_name
+from debug_flags import PRINT_FUNC_NAME_FLAG
+
+
+# NI9234 methods the GUI process may call in the acquisition process
+ACQUISITION_COMMANDS = (
+    'create_task',
+    'add_accel_channel',
+    'add_microphone_channel',
+    'set_sample_rate',
+    'set_frame_duration',
+    'set_timing',
+    'show_daq_params',
+    'get_frame_layout',
+    'ready_read',
+    'get_channel_names',
+    'get_channel_count',
+    'start_task',
+    'stop_task',
+    'close_task',
+    'set_writer_queue_policy',
+    'set_buffer_size_policy',
+    'set_stream_sample_dtype',
+    'set_compression',
+    'get_pending_segments',
+    'set_read_unscaled',
+    'set_sample_dtype',
+    'get_sample_scaling',
+    'open_writer',
+    'close_writer',
+    'is_writer_open',
+    'set_writer_enable',
+    'set_writer_disable',
+    'get_writer_stats',
+    'get_writer_state',
+    'get_frame_stats',
+    'get_health_stats',
+)
+
+
+def run_acquisition_process(conn: Connection, device_name: str, simulate_device: bool = False,
+                            clock_mode: str = 'realtime') -> None:
+    '''
+    Entry of the acquisition process: own the NI9234, run its callback and writer,
+    and execute commands of `NI9234Process` until "exit".
+
+    Command: (method name, args, kwargs), reply: ("ok", result) or ("error", message).
+    '''
+    # import here, so only the acquisition process loads the driver
+    from .NIDAQ import NI9234
+    from .simulator import SimulatedNI9234
+
+    try:
+        if simulate_device:
+            nidaq = SimulatedNI9234(device_name=device_name, clock_mode=clock_mode)
+        else:
+            nidaq = NI9234(device_name=device_name)
+    except BaseException as e:
+        conn.send(('error', f'{type(e).__name__}: {e}'))
+        return
+    conn.send(('ok', None))
+
+    while True:
+        try:
+            command, args, kwargs = conn.recv()
+        except EOFError:
+            # GUI process is gone, clean up without reply
+            command, args, kwargs = None, (), {}
+        if command in ('exit', None):
+            if nidaq.task != None:
+                nidaq.close_writer()
+                nidaq.close_task()
+            if nidaq.ring_buffer != None and hasattr(nidaq.ring_buffer, 'close'):
+                nidaq.ring_buffer.close()
+            if command == 'exit':
+                conn.send(('ok', None))
+            break
+        if command not in ACQUISITION_COMMANDS:
+            conn.send(('error', f'Unknown acquisition command: {command}'))
+            continue
+        try:
+            if command == 'ready_read':
+                # attach the ring buffer to the block created by GUI process
+                if nidaq.ring_buffer != None and hasattr(nidaq.ring_buffer, 'close'):
+                    nidaq.ring_buffer.close()
+                nidaq.ring_buffer_name = args[0]
+                result = nidaq.ready_read()
+            else:
+                result = getattr(nidaq, command)(*args, **kwargs)
+            conn.send(('ok', result))
+        except BaseException as e:
+            conn.send(('error', f'{type(e).__name__}: {e}'))
+
+
+class NI9234Process:
+    '''
+    NI9234 running in a child process, with the `NI9234` methods `NIDAQModel` uses.
+
+    Frames come through a `SharedFrameRingBuffer` created here, so consumers read
+    them exactly like the `ring_buffer` of an in-process NI9234. Every other call is
+    a command over a `Pipe`, and raises `BaseException` if it failed in the child.
+    '''
+
+    def __init__(self, device_name: str, simulate_device: bool = False, clock_mode: str = 'realtime') -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        self.device_name = device_name
+        self.ring_buffer: Optional[SharedFrameRingBuffer] = None
+        self.writer_type: Optional[str] = None
+        self.writer_switch_flag = False
+        self.channel_names: list[str] = list()
+        # one command at a time on the pipe, retention calls from its own thread
+        self.lock = threading.Lock()
+        # spawn also on Linux, a forked Qt process is not safe
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=run_acquisition_process,
+            args=(child_conn, device_name, simulate_device, clock_mode),
+            name=f'{device_name}-acquisition',
+            daemon=True)
+        self.process.start()
+        child_conn.close()
+        try:
+            self.receive()
+        except BaseException:
+            self.process.join()
+            raise
+
+    def receive(self):
+        status, result = self.conn.recv()
+        if status == 'error':
+            raise BaseException(f'Acquisition process: {result}')
+        return result
+
+    def call(self, command: str, *args, **kwargs):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.call)} / {command}')
+
+        with self.lock:
+            if not self.process.is_alive():
+                raise BaseException('Acquisition process is not running.')
+            self.conn.send((command, args, kwargs))
+            return self.receive()
+
+    def create_task(self, task_name: str) -> None:
+        self.call('create_task', task_name)
+
+    def add_accel_channel(self, **kwargs) -> None:
+        self.call('add_accel_channel', **kwargs)
+
+    def add_microphone_channel(self, **kwargs) -> None:
+        self.call('add_microphone_channel', **kwargs)
+
+    def set_sample_rate(self, sample_rate: float) -> None:
+        self.call('set_sample_rate', sample_rate)
+
+    def set_frame_duration(self, frame_duration: int) -> None:
+        self.call('set_frame_duration', frame_duration)
+
+    def set_timing(self, sample_rate: float, frame_duration: int) -> None:
+        self.call('set_timing', sample_rate, frame_duration)
+
+    def show_daq_params(self) -> None:
+        # printed by the acquisition process
+        self.call('show_daq_params')
+
+    def ready_read(self, callback_method=None) -> None:
+        '''
+        Create the shared ring buffer and register the callback in the child,
+        `callback_method` is not used, the child runs `NI9234.callback_method`.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.ready_read)}')
+
+        layout = self.call('get_frame_layout')
+        ring_buffer = SharedFrameRingBuffer(
+            slot_count=layout['slot_count'],
+            channel_count=layout['channel_count'],
+            frame_size=layout['frame_size'],
+            dtype=layout['dtype'])
+        self.call('ready_read', ring_buffer.name)
+        if self.ring_buffer != None:
+            self.ring_buffer.close()
+        self.ring_buffer = ring_buffer
+        self.channel_names = self.call('get_channel_names')
+
+    def get_channel_names(self) -> list[str]:
+        return list(self.channel_names)
+
+    def get_channel_count(self) -> int:
+        return len(self.channel_names)
+
+    def start_task(self) -> None:
+        self.call('start_task')
+
+    def stop_task(self) -> None:
+        self.call('stop_task')
+
+    def close_task(self) -> None:
+        '''
+        Close the task, the acquisition process and its device stay for the next
+        `create_task()`, `shutdown()` ends them.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.close_task)}')
+
+        self.call('close_task')
+        self.writer_switch_flag = False
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def shutdown(self) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.shutdown)}')
+
+        if self.process.is_alive():
+            with self.lock:
+                self.conn.send(('exit', (), {}))
+                self.receive()
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.conn.close()
+        self.writer_switch_flag = False
+        if self.ring_buffer != None:
+            self.ring_buffer.close()
+            self.ring_buffer = None
+
+    def set_writer_queue_policy(self, policy: str) -> None:
+        self.call('set_writer_queue_policy', policy)
+
+    def set_buffer_size_policy(self, policy: str, stall_tolerance: Optional[int] = None,
+                               max_buffer_size: Optional[float] = None,
+                               retune: Optional[bool] = None) -> None:
+        self.call('set_buffer_size_policy', policy, stall_tolerance, max_buffer_size, retune)
+
+    def set_stream_sample_dtype(self, sample_dtype: str) -> None:
+        self.call('set_stream_sample_dtype', sample_dtype)
+
+    def set_compression(self, codec: Optional[str] = None, level: int = 6,
+                        filter: str = 'shuffle', workers: int = 2) -> None:
+        self.call('set_compression', codec, level, filter, workers)
+
+    def get_pending_segments(self) -> list[str]:
+        return self.call('get_pending_segments')
+
+    def set_read_unscaled(self, read_unscaled: bool) -> None:
+        self.call('set_read_unscaled', read_unscaled)
+
+    def set_sample_dtype(self, sample_dtype: str) -> None:
+        self.call('set_sample_dtype', sample_dtype)
+
+    def get_sample_scaling(self) -> Optional[dict]:
+        return self.call('get_sample_scaling')
+
+    def open_writer(self, writer_type: str, directory: str, file_name: Optional[str] = None,
+                    header: Optional[dict] = None, segment_period: float = 10.0,
+                    max_segment_bytes: int = 0, trigger: Optional[dict] = None) -> None:
+        self.call('open_writer', writer_type, directory, file_name, header,
+                  segment_period, max_segment_bytes, trigger)
+        self.writer_type = writer_type
+
+    def close_writer(self) -> None:
+        self.call('close_writer')
+        self.writer_switch_flag = False
+
+    def is_writer_open(self) -> bool:
+        return self.call('is_writer_open')
+
+    def set_writer_enable(self) -> None:
+        self.call('set_writer_enable')
+        self.writer_switch_flag = True
+
+    def set_writer_disable(self) -> None:
+        self.call('set_writer_disable')
+        self.writer_switch_flag = False
+
+    def get_writer_stats(self) -> dict:
+        return self.call('get_writer_stats')
+
+    def get_writer_state(self) -> dict:
+        return self.call('get_writer_state')
+
+    def get_frame_stats(self) -> dict:
+        return self.call('get_frame_stats')
+
+    def get_health_stats(self) -> dict:
+        return self.call('get_health_stats')
@@ -0,0 +1,269 @@
+from typing import Optional
+import os
+import zlib
+import lzma
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import numpy as np
+import numpy.typing as npt
+
+from .utils import get_func_name, pack_binary_header, read_binary_header
+from debug_flags import PRINT_FUNC_NAME_FLAG
+
+try:
+    import zstandard
+except ImportError:
+    # optional, only needed for codec "zstd"
+    zstandard = None
+
+
+# compressed segment: binary header like the stream file, then the compressed samples
+COMPRESSED_SEGMENT_EXTENSION = '.npyz'
+COMPRESSED_SEGMENT_MAGIC = b'MYDAQNPZ'
+COMPRESSED_SEGMENT_VERSION = 1
+COMPRESSION_CODECS = ('zlib', 'lzma', 'zstd')
+# shuffle: bytes grouped by significance, delta: sample differences then shuffle (integer samples)
+COMPRESSION_FILTERS = ('none', 'shuffle', 'delta')
+
+
+def check_compression(codec: str, level: int, filter: str) -> None:
+    if codec not in COMPRESSION_CODECS:
+        raise BaseException(f'Illegal compression codec: {codec}, {COMPRESSION_CODECS} required.')
+    if filter not in COMPRESSION_FILTERS:
+        raise BaseException(f'Illegal compression filter: {filter}, {COMPRESSION_FILTERS} required.')
+    if codec == 'zstd' and zstandard == None:
+        raise BaseException('Compression codec "zstd" requires the zstandard package.')
+    if codec in ('zlib', 'lzma') and not 0 <= level <= 9:
+        raise BaseException(f'Illegal {codec} level: {level}, 0 - 9 required.')
+
+
+def encode_samples(data: npt.NDArray, filter: str) -> tuple[bytes, str]:
+    '''
+    data: (samples, channels)
+    return: filtered bytes, filter applied ("delta" falls back to "shuffle" for
+    float samples, their differences are not lossless)
+    '''
+    data = np.ascontiguousarray(data)
+    if filter == 'delta' and not np.issubdtype(data.dtype, np.integer):
+        filter = 'shuffle'
+    if filter == 'delta':
+        # wraps around like the cumulative sum of `decode_samples()`
+        delta = data.copy()
+        delta[1:] -= data[:-1]
+        data = delta
+    if filter == 'none':
+        return data.tobytes(), filter
+    return data.view(np.uint8).reshape(-1, data.dtype.itemsize).T.tobytes(), filter
+
+
+def decode_samples(payload: bytes, shape: tuple, dtype: np.dtype, filter: str) -> npt.NDArray:
+    if filter == 'none':
+        return np.frombuffer(payload, dtype=dtype).reshape(shape)
+    data = np.frombuffer(payload, dtype=np.uint8).reshape(dtype.itemsize, -1).T.copy()
+    data = data.view(dtype).reshape(shape)
+    if filter == 'delta':
+        data = np.cumsum(data, axis=0, dtype=dtype)
+    return data
+
+
+def compress_bytes(data: bytes, codec: str, level: int) -> bytes:
+    if codec == 'zlib':
+        return zlib.compress(data, level)
+    if codec == 'lzma':
+        return lzma.compress(data, preset=level)
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def decompress_bytes(data: bytes, codec: str) -> bytes:
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    if codec == 'lzma':
+        return lzma.decompress(data)
+    if zstandard == None:
+        raise BaseException('Compression codec "zstd" requires the zstandard package.')
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def get_compressed_path(npy_path: str) -> str:
+    return os.path.splitext(npy_path)[0] + COMPRESSED_SEGMENT_EXTENSION
+
+
+def get_segment_path(npy_path: str) -> str:
+    '''
+    Path of segment `npy_path` as it is on disk, *.npy or its compressed *.npyz.
+    '''
+    if os.path.exists(npy_path):
+        return npy_path
+    compressed_path = get_compressed_path(npy_path)
+    if os.path.exists(compressed_path):
+        return compressed_path
+    return npy_path
+
+
+def compress_segment(npy_path: str, codec: str, level: int, filter: str = 'shuffle') -> Optional[tuple[int, int]]:
+    '''
+    Replace a closed *.npy segment by its compressed *.npyz, the *.npy is removed
+    only after the *.npyz is complete. A *.npy removed meanwhile (by retention)
+    leaves no *.npyz.
+    return: (*.npy size, *.npyz size) in bytes, `None` if the *.npy is gone
+    '''
+    try:
+        data = np.load(npy_path, mmap_mode='r')
+    except FileNotFoundError:
+        return None
+    npy_size = os.path.getsize(npy_path)
+    payload, filter = encode_samples(data, filter)
+    header = pack_binary_header(COMPRESSED_SEGMENT_MAGIC, {
+        'version': COMPRESSED_SEGMENT_VERSION,
+        'shape': list(data.shape),
+        'dtype': data.dtype.str,
+        'codec': codec,
+        'level': level,
+        'filter': filter,
+        # byte offset of the samples in the *.npy, offsets of the seek index refer to it
+        'npy_data_offset': int(data.offset),
+    })
+    del data
+    compressed_path = get_compressed_path(npy_path)
+    with open(f'{compressed_path}.tmp', mode='wb') as file:
+        file.write(header)
+        file.write(compress_bytes(payload, codec, level))
+        file.flush()
+        os.fsync(file.fileno())
+    if not os.path.exists(npy_path):
+        os.remove(f'{compressed_path}.tmp')
+        return None
+    os.replace(f'{compressed_path}.tmp', compressed_path)
+    try:
+        os.remove(npy_path)
+    except FileNotFoundError:
+        # removed between the check and the replace, the segment is gone
+        os.remove(compressed_path)
+        return None
+    return npy_size, os.path.getsize(compressed_path)
+
+
+def read_compressed_segment_header(file_path: str) -> dict:
+    return read_binary_header(file_path, COMPRESSED_SEGMENT_MAGIC)
+
+
+def load_compressed_segment(file_path: str) -> npt.NDArray:
+    '''
+    (samples, channels) of a *.npyz segment.
+    '''
+    header = read_compressed_segment_header(file_path)
+    with open(file_path, mode='rb') as file:
+        file.seek(header['data_offset'])
+        payload = decompress_bytes(file.read(), header['codec'])
+    return decode_samples(payload, tuple(header['shape']), np.dtype(header['dtype']), header['filter'])
+
+
+class SegmentCompressor:
+    '''
+    Compress closed segments of `NPYWriter` / `EventWriter` in a thread pool, off the
+    acquisition callback and the background writer. zlib, lzma and zstd release the
+    GIL while compressing, so `workers` segments are compressed in parallel.
+    '''
+
+    def __init__(self, codec: str = 'zlib', level: int = 6, filter: str = 'shuffle',
+                 workers: int = 2) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        check_compression(codec, level, filter)
+        self.codec = codec
+        self.level = level
+        self.filter = filter
+        self.workers = max(1, workers)
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.futures: set[Future] = set()
+        # *.npy paths submitted and not compressed yet
+        self.pending_paths: set[str] = set()
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.segment_count = 0
+        self.error_count = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        # sum of compression seconds of all workers
+        self.busy_time = 0.0
+
+    def submit(self, npy_path: str) -> None:
+        if self.executor == None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix='segment-compressor')
+        with self.lock:
+            self.pending_paths.add(npy_path)
+        future = self.executor.submit(self.compress, npy_path)
+        with self.lock:
+            self.futures.add(future)
+        future.add_done_callback(self.on_done)
+
+    def on_done(self, future: Future) -> None:
+        with self.lock:
+            self.futures.discard(future)
+
+    def compress(self, npy_path: str) -> None:
+        start_time = time.perf_counter()
+        try:
+            sizes = compress_segment(npy_path, self.codec, self.level, self.filter)
+        except BaseException as e:
+            # the *.npy stays, it is read as it is
+            print(f'compress {npy_path} failed: {type(e).__name__}: {e}')
+            with self.lock:
+                self.error_count += 1
+                self.pending_paths.discard(npy_path)
+            return
+        with self.lock:
+            self.pending_paths.discard(npy_path)
+            if sizes == None:
+                return
+            npy_size, compressed_size = sizes
+            self.segment_count += 1
+            self.raw_bytes += npy_size
+            self.compressed_bytes += compressed_size
+            self.busy_time += time.perf_counter() - start_time
+
+    def get_pending_paths(self) -> list[str]:
+        with self.lock:
+            return list(self.pending_paths)
+
+    def wait(self) -> None:
+        '''
+        Return after every submitted segment is compressed.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.wait)}')
+
+        with self.lock:
+            futures = list(self.futures)
+        for future in futures:
+            future.result()
+
+    def shutdown(self) -> None:
+        if self.executor != None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def get_stats(self) -> dict:
+        '''
+        ratio: *.npy bytes / *.npyz bytes, megabytes_per_second: *.npy MB per second
+        of a worker
+        '''
+        with self.lock:
+            return {
+                'codec': self.codec,
+                'level': self.level,
+                'filter': self.filter,
+                'segment_count': self.segment_count,
+                'pending_count': len(self.futures),
+                'error_count': self.error_count,
+                'raw_bytes': self.raw_bytes,
+                'compressed_bytes': self.compressed_bytes,
+                'ratio': self.raw_bytes / self.compressed_bytes if self.compressed_bytes else None,
+                'megabytes_per_second': self.raw_bytes / self.busy_time / 1e6 if self.busy_time else None,
+            }
@@ -0,0 +1,72 @@
+import numpy as np
+import numpy.typing as npt
+
+
+def get_envelope_len(sample_count: int, bucket_count: int) -> int:
+    '''
+    Number of points `minmax_envelope()` returns for `sample_count` samples.
+    '''
+    if bucket_count <= 0 or sample_count <= 2 * bucket_count:
+        return sample_count
+    return 2 * bucket_count
+
+
+def get_bucket_edges(sample_count: int, bucket_count: int) -> npt.NDArray:
+    '''
+    Start index of each bucket, buckets differ in size by at most one sample.
+    '''
+    return np.linspace(0, sample_count, bucket_count, endpoint=False).astype(np.int64)
+
+
+def minmax_envelope(data: npt.NDArray, bucket_count: int) -> npt.NDArray:
+    '''
+    Min/max decimation along the last axis for plotting.
+
+    data: (number of channels, samples)
+    return: (number of channels, `get_envelope_len()`), min and max of each bucket
+    in pairs, so a peak shorter than a bucket is still drawn. Data short enough to
+    draw as is are returned unchanged.
+    '''
+    sample_count = data.shape[-1]
+    if get_envelope_len(sample_count, bucket_count) == sample_count:
+        return data
+
+    edges = get_bucket_edges(sample_count, bucket_count)
+    envelope = np.empty(data.shape[:-1] + (2 * bucket_count,), dtype=data.dtype)
+    envelope[..., 0::2] = np.minimum.reduceat(data, edges, axis=-1)
+    envelope[..., 1::2] = np.maximum.reduceat(data, edges, axis=-1)
+    return envelope
+
+
+class SampleScaler:
+    '''
+    Vectorized conversion of unscaled (raw ADC) samples to engineering units.
+
+    coeffs: (number of channels, n), ascending polynomial from raw code to volt,
+    `ai_dev_scaling_coeff` of every channel
+    gains: (number of channels,), engineering units per volt of every sensor
+    '''
+
+    def __init__(self, coeffs, gains, dtype=np.float64) -> None:
+        self.dtype = np.dtype(dtype)
+        coeffs = np.asarray(coeffs, dtype=np.float64) * \
+            np.asarray(gains, dtype=np.float64)[:, np.newaxis]
+        # drop zero high order terms, a linear scale is a single multiply-add
+        order = coeffs.shape[1]
+        while order > 1 and not np.any(coeffs[:, order - 1]):
+            order -= 1
+        self.coeffs = coeffs[:, :order, np.newaxis].astype(self.dtype)
+
+    def __call__(self, raw: npt.NDArray, out: npt.NDArray = None) -> npt.NDArray:
+        '''
+        raw: (number of channels, samples), return scaled samples in `out` if given
+        '''
+        x = raw.astype(self.dtype)
+        if out is None:
+            out = np.empty_like(x)
+        # Horner's method, one pass per polynomial order
+        out[:] = self.coeffs[:, -1]
+        for k in range(self.coeffs.shape[1] - 2, -1, -1):
+            out *= x
+            out += self.coeffs[:, k]
+        return out
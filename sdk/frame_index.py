@@ -0,0 +1,176 @@
+import os
+import re
+
+import numpy as np
+
+from .utils import (get_func_name, read_binary_header, read_binary_stream_header,
+                    build_frame_index_header, FRAME_INDEX_FILE_NAME, FRAME_INDEX_MAGIC,
+                    FRAME_INDEX_DTYPE, FRAME_TAG_FILE_NAME, FRAME_TAG_COLUMNS)
+from .reader import (load_task_params, list_segment_files, guess_writer_type, read_segment_header,
+                     read_frame_tags)
+from .compression import get_segment_path
+from debug_flags import PRINT_FUNC_NAME_FLAG
+
+
+class FrameIndex:
+    '''
+    Seek index of a recording, `FRAME_INDEX_FILE_NAME` written by the writers or
+    `rebuild_frame_index()`. One record (`FRAME_INDEX_DTYPE`) per written frame:
+
+        frame        : frame number in the recording, row of `frame_tags.csv`
+        file         : file number, `get_file_name()` gives the file
+        offset       : byte offset of the first sample of the frame in its file, in the
+                       *.npy of a segment compressed to *.npyz
+        sample       : first sample of the frame in the recording, `RecordingReader` index
+        first_sample : first sample since task start, -1 if unknown
+        wall_ns      : wall clock ns the frame was read, -1 if unknown
+
+    Records are memory-mapped, lookups are `searchsorted`, O(log n) in frames.
+    A record torn by a crash at the end of the file is ignored.
+    '''
+
+    def __init__(self, record_dir: str) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        self.record_dir = record_dir
+        self.index_path = os.path.join(record_dir, FRAME_INDEX_FILE_NAME)
+        self.header = read_binary_header(self.index_path, FRAME_INDEX_MAGIC)
+        self.writer_type: str = self.header['writer_type']
+        self.file_pattern: str = self.header['file_pattern']
+        record_count = (os.path.getsize(self.index_path) - self.header['data_offset']) \
+            // FRAME_INDEX_DTYPE.itemsize
+        if record_count > 0:
+            self.records = np.memmap(self.index_path, dtype=FRAME_INDEX_DTYPE, mode='r',
+                                     offset=self.header['data_offset'], shape=(record_count,))
+        else:
+            self.records = np.zeros(0, dtype=FRAME_INDEX_DTYPE)
+
+    def __len__(self) -> int:
+        return self.records.shape[0]
+
+    def get_file_name(self, file_number: int) -> str:
+        return self.file_pattern.format(file_number)
+
+    def get_file_path(self, row: int) -> str:
+        return os.path.join(self.record_dir, self.get_file_name(int(self.records['file'][row])))
+
+    def find(self, column: str, value: int) -> int:
+        '''
+        Row of the last frame whose `column` is at most `value`, 0 for a value before
+        the first frame. `column` must not decrease from frame to frame.
+        '''
+        if len(self) == 0:
+            raise BaseException(f'{self.index_path} has no frames.')
+        row = int(np.searchsorted(self.records[column], value, side='right')) - 1
+        return max(0, row)
+
+    def find_sample(self, sample: int) -> int:
+        '''
+        Row of the frame holding `sample` of the recording.
+        '''
+        return self.find('sample', sample)
+
+    def find_first_sample(self, first_sample: int) -> int:
+        '''
+        Row of the frame holding sample `first_sample` since task start.
+        '''
+        return self.find('first_sample', first_sample)
+
+    def find_wall_time(self, wall_ns: int) -> int:
+        '''
+        Row of the frame holding the moment `wall_ns`, the first frame read at or after
+        it, `len()` after the last frame. Assumes the wall clock was not set back
+        during the recording.
+        '''
+        return int(np.searchsorted(self.records['wall_ns'], wall_ns, side='left'))
+
+
+def rebuild_frame_index(record_dir: str, cfg_file_name: str = 'cfg.json') -> int:
+    '''
+    Write `FRAME_INDEX_FILE_NAME` of a recording from its files, `cfg_file_name`
+    and `FRAME_TAG_FILE_NAME`, replacing the old one at once.
+    return: number of indexed frames
+    '''
+    if PRINT_FUNC_NAME_FLAG:
+        print(f'run function - {get_func_name(rebuild_frame_index)}')
+
+    task_params = load_task_params(record_dir, cfg_file_name)
+    file_names = sorted(os.listdir(record_dir))
+    writer_type = task_params.get('writer_type') or guess_writer_type(file_names)
+    frame_len = int(task_params['sample_rate'] * task_params['frame_duration'] * 0.001)
+    # (frame number, file number, byte offset) of every frame
+    locations = list()
+    if writer_type in ('segment', 'event'):
+        prefix = 'event_' if writer_type == 'event' else ''
+        file_pattern = f'{prefix}{{}}.npy'
+        if 'segments' in task_params:
+            segments = task_params['segments']
+        else:
+            segments = [{'file_name': segment_name, 'frame_count': 0}
+                        for segment_name in list_segment_files(file_names, prefix)]
+        frame_number = 0
+        for segment in segments:
+            file_number = int(re.match(rf'^{prefix}(\d+)\.npy$', segment['file_name']).group(1))
+            segment_path = get_segment_path(os.path.join(record_dir, segment['file_name']))
+            if not os.path.exists(segment_path):
+                # removed by retention, its frames keep their numbers
+                frame_number += segment['frame_count']
+                continue
+            shape, dtype, data_offset = read_segment_header(segment_path)
+            frame_bytes = frame_len * shape[1] * dtype.itemsize
+            locations += [(frame_number + i, file_number, data_offset + i * frame_bytes)
+                          for i in range(shape[0] // frame_len)]
+            frame_number += shape[0] // frame_len
+    elif writer_type == 'stream':
+        file_name = [file_name for file_name in file_names if file_name.endswith('.bin')][0]
+        file_pattern = file_name.replace('{', '{{').replace('}', '}}')
+        header = read_binary_stream_header(os.path.join(record_dir, file_name))
+        frame_bytes = frame_len * header['channel_count'] * np.dtype(header['dtype']).itemsize
+        data_size = os.path.getsize(os.path.join(record_dir, file_name)) - header['data_offset']
+        locations = [(i, 0, header['data_offset'] + i * frame_bytes)
+                     for i in range(data_size // frame_bytes)]
+    else:
+        file_name = [file_name for file_name in file_names
+                     if file_name.endswith('.csv') and file_name != FRAME_TAG_FILE_NAME][0]
+        file_pattern = file_name.replace('{', '{{').replace('}', '}}')
+        offset = 0
+        with open(os.path.join(record_dir, file_name), mode='rb') as file:
+            for row, line in enumerate(file):
+                if row % frame_len == 0:
+                    locations.append((row // frame_len, 0, offset))
+                offset += len(line)
+        # a last frame cut short is not indexed
+        if len(locations) and (row + 1) % frame_len:
+            locations.pop()
+
+    records = np.zeros(len(locations), dtype=FRAME_INDEX_DTYPE)
+    if len(locations):
+        records['frame'], records['file'], records['offset'] = np.asarray(locations, dtype=np.int64).T
+    records['sample'] = records['frame'] * frame_len
+    records['first_sample'] = -1
+    records['wall_ns'] = -1
+    tags = read_frame_tags(record_dir)
+    if tags is not None:
+        tagged = records['frame'] < len(tags)
+        frames = records['frame'][tagged]
+        records['first_sample'][tagged] = tags[frames, FRAME_TAG_COLUMNS.index('first_sample')]
+        records['wall_ns'][tagged] = tags[frames, FRAME_TAG_COLUMNS.index('wall_ns')]
+
+    index_path = os.path.join(record_dir, FRAME_INDEX_FILE_NAME)
+    with open(f'{index_path}.tmp', mode='wb') as file:
+        file.write(build_frame_index_header(writer_type, file_pattern))
+        file.write(records.tobytes())
+    os.replace(f'{index_path}.tmp', index_path)
+    return len(records)
+
+
+if __name__ == '__main__':
+    # rebuild the seek index of every recording below the given directories:
+    # python -m sdk.frame_index ./record_data
+    import sys
+
+    for root_dir in sys.argv[1:]:
+        for record_dir, _, file_names in os.walk(root_dir):
+            if 'cfg.json' in file_names or any(file_name.endswith('.bin') for file_name in file_names):
+                print(f'{record_dir}: {rebuild_frame_index(record_dir)} frames')
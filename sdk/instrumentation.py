@@ -0,0 +1,195 @@
+from typing import Optional
+import bisect
+
+
+# DAQmx error code of an input buffer overflow, samples were overwritten before read
+DAQMX_OVERFLOW_ERROR_CODE = -200279
+
+# bin edges, millisecond
+DURATION_EDGES_MS = (0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0,
+                     100.0, 200.0, 500.0, 1000.0, 2000.0, 5000.0)
+JITTER_EDGES_MS = (-100.0, -50.0, -20.0, -10.0, -5.0, -2.0, -1.0, -0.5,
+                   0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0, 1000.0)
+# bin edges, ratio of the DAQmx input buffer in use
+FILL_RATIO_EDGES = tuple(i / 20 for i in range(1, 20))
+
+
+class FixedHistogram:
+    '''
+    Counts of values in fixed bins, memory and `add()` cost do not grow with run time.
+
+    Bin `i` counts values in [edges[i - 1], edges[i]), bin 0 and the last bin count
+    values below the first edge and from the last edge on.
+    '''
+
+    def __init__(self, edges, unit: str = '') -> None:
+        self.edges = list(edges)
+        self.unit = unit
+        self.reset()
+
+    def reset(self) -> None:
+        self.counts = [0] * (len(self.edges) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float) -> None:
+        self.counts[bisect.bisect_right(self.edges, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min == None or value < self.min:
+            self.min = value
+        if self.max == None or value > self.max:
+            self.max = value
+
+    def get_mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def get_percentile(self, percent: float) -> Optional[float]:
+        '''
+        Upper edge of the bin holding the `percent` percentile, an upper bound of
+        the exact value. Values past the last edge report the max.
+        '''
+        if self.count == 0:
+            return None
+        rank = percent / 100 * self.count
+        cumulative = 0
+        for i, bin_count in enumerate(self.counts):
+            cumulative += bin_count
+            if cumulative >= rank and bin_count:
+                if i == len(self.edges):
+                    return self.max
+                return min(self.edges[i], self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'unit': self.unit,
+            'edges': list(self.edges),
+            'counts': list(self.counts),
+            'count': self.count,
+            'mean': self.get_mean(),
+            'min': self.min,
+            'max': self.max,
+            'p50': self.get_percentile(50),
+            'p99': self.get_percentile(99),
+        }
+
+
+class AcquisitionMonitor:
+    '''
+    Health of the acquisition, fed by the every N samples callback and the writer thread.
+
+    buffer_fill: samples waiting in the DAQmx input buffer when the callback runs,
+    as a ratio of the buffer size
+    callback_time: millisecond the callback takes
+    callback_jitter: millisecond between callbacks minus the frame duration
+    writer_latency: millisecond from queueing a frame to having written it
+    '''
+
+    def __init__(self) -> None:
+        self.buffer_size = 0
+        self.frame_duration = 0  # millisecond
+        self.buffer_fill = FixedHistogram(FILL_RATIO_EDGES, unit='ratio')
+        self.callback_time = FixedHistogram(DURATION_EDGES_MS, unit='ms')
+        self.callback_jitter = FixedHistogram(JITTER_EDGES_MS, unit='ms')
+        self.writer_latency = FixedHistogram(DURATION_EDGES_MS, unit='ms')
+        self.reset()
+
+    def configure(self, buffer_size: int, frame_duration: int) -> None:
+        '''
+        buffer_size: samples per channel of the DAQmx input buffer
+        frame_duration: millisecond
+        '''
+        self.buffer_size = buffer_size
+        self.frame_duration = frame_duration
+        self.reset()
+
+    def reset(self) -> None:
+        self.buffer_fill.reset()
+        self.callback_time.reset()
+        self.callback_jitter.reset()
+        self.writer_latency.reset()
+        self.max_avail_samples = 0
+        self.last_callback_start: Optional[float] = None
+        self.read_error_count = 0
+        self.overflow_count = 0
+        self.last_error: Optional[str] = None
+
+    def record_callback(self, avail_samples: int, start_time: float, end_time: float) -> None:
+        '''
+        avail_samples: `in_stream.avail_samp_per_chan` before the read
+        start_time, end_time: `time.perf_counter()` second
+        '''
+        if avail_samples > self.max_avail_samples:
+            self.max_avail_samples = avail_samples
+        if self.buffer_size > 0:
+            self.buffer_fill.add(avail_samples / self.buffer_size)
+        self.callback_time.add((end_time - start_time) * 1e3)
+        if self.last_callback_start != None:
+            self.callback_jitter.add(
+                (start_time - self.last_callback_start) * 1e3 - self.frame_duration)
+        self.last_callback_start = start_time
+
+    def record_writer_latency(self, latency: float) -> None:
+        '''
+        latency: second
+        '''
+        self.writer_latency.add(latency * 1e3)
+
+    def record_read_error(self, error: BaseException) -> None:
+        self.read_error_count += 1
+        if getattr(error, 'error_code', None) == DAQMX_OVERFLOW_ERROR_CODE:
+            self.overflow_count += 1
+        self.last_error = f'{type(error).__name__}: {error}'
+
+    def get_callback_latency(self) -> float:
+        '''
+        Millisecond, p99 of callback lateness plus p99 of callback time, the time
+        samples wait in the input buffer on top of a frame. 0 without callbacks.
+        '''
+        if self.callback_time.count == 0:
+            return 0.0
+        latency = self.callback_time.get_percentile(99)
+        if self.callback_jitter.count:
+            latency += max(0.0, self.callback_jitter.get_percentile(99))
+        return latency
+
+    def get_stats(self) -> dict:
+        return {
+            'buffer_size': self.buffer_size,
+            'frame_duration': self.frame_duration,
+            'max_avail_samples': self.max_avail_samples,
+            'buffer_fill': self.buffer_fill.to_dict(),
+            'callback_time': self.callback_time.to_dict(),
+            'callback_jitter': self.callback_jitter.to_dict(),
+            'writer_latency': self.writer_latency.to_dict(),
+            'callback_latency': self.get_callback_latency(),
+            'read_error_count': self.read_error_count,
+            'overflow_count': self.overflow_count,
+            'last_error': self.last_error,
+        }
+
+
+def format_health_stats(stats: dict) -> str:
+    '''
+    Multi-line text of `AcquisitionMonitor.get_stats()`.
+    '''
+    def format_histogram(name: str, histogram: dict, scale: float = 1.0, unit: str = 'ms') -> str:
+        if histogram['count'] == 0:
+            return f'{name}: -'
+        return (f'{name}: mean {histogram["mean"] * scale:.1f} / p99 <= {histogram["p99"] * scale:.1f} '
+                f'/ max {histogram["max"] * scale:.1f} {unit}')
+
+    lines = [
+        format_histogram('buffer fill', stats['buffer_fill'], scale=100, unit='%'),
+        format_histogram('callback time', stats['callback_time']),
+        format_histogram('callback jitter', stats['callback_jitter']),
+        format_histogram('writer latency', stats['writer_latency']),
+        f'max available samples: {stats["max_avail_samples"]} / {stats["buffer_size"]}',
+        f'read errors: {stats["read_error_count"]}, overflows: {stats["overflow_count"]}',
+    ]
+    if stats['last_error'] != None:
+        lines.append(f'last error: {stats["last_error"]}')
+    return '\n'.join(lines)
@@ -0,0 +1,495 @@
+from typing import Optional, Union, Iterator
+from collections import OrderedDict
+import os
+import re
+import json
+from datetime import datetime
+
+import numpy as np
+import numpy.typing as npt
+
+from .dsp import SampleScaler
+from .recording import merge_progress_log
+from .compression import (get_segment_path, read_compressed_segment_header, load_compressed_segment,
+                          COMPRESSED_SEGMENT_EXTENSION)
+from .utils import (get_func_name, open_binary_stream, read_binary_stream_header,
+                    FRAME_TAG_FILE_NAME, FRAME_TAG_COLUMNS, FRAME_INDEX_FILE_NAME)
+from debug_flags import PRINT_FUNC_NAME_FLAG
+
+
+# rows between indexed line offsets of a csv stream, a read parses at most this many extra rows
+CSV_INDEX_STEP = 1024
+
+
+def read_npy_header(file_path: str) -> tuple:
+    '''
+    (shape, dtype, data offset) of a *.npy file.
+    '''
+    with open(file_path, mode='rb') as file:
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+        return shape, dtype, file.tell()
+
+
+def read_segment_header(file_path: str) -> tuple:
+    '''
+    (shape, dtype, data offset in the *.npy) of a *.npy or compressed *.npyz segment.
+    '''
+    if file_path.endswith(COMPRESSED_SEGMENT_EXTENSION):
+        header = read_compressed_segment_header(file_path)
+        return tuple(header['shape']), np.dtype(header['dtype']), header['npy_data_offset']
+    return read_npy_header(file_path)
+
+
+def read_frame_tags(record_dir: str) -> Optional[npt.NDArray[np.int64]]:
+    '''
+    (frames, columns) of `FRAME_TAG_FILE_NAME`, columns `FRAME_TAG_COLUMNS`,
+    `None` for recordings without it.
+    '''
+    tag_path = os.path.join(record_dir, FRAME_TAG_FILE_NAME)
+    if not os.path.exists(tag_path):
+        return None
+    return np.loadtxt(tag_path, delimiter=',', dtype=np.int64, skiprows=1,
+                      ndmin=2).reshape(-1, len(FRAME_TAG_COLUMNS))
+
+
+class NPYSource:
+    '''
+    One *.npy segment of (samples, channels), memory-mapped on first read.
+    '''
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        shape, dtype, _ = read_npy_header(file_path)
+        self.sample_count = shape[0]
+        self.channel_count = shape[1]
+        self.dtype = dtype
+        self.data: Optional[np.memmap] = None
+
+    def read(self, start: int, stop: int) -> npt.NDArray:
+        if self.data is None:
+            self.data = np.load(self.file_path, mmap_mode='r')
+        return self.data[start:stop]
+
+    def close(self) -> None:
+        self.data = None
+
+
+class CompressedNPYSource:
+    '''
+    One *.npyz segment of `SegmentCompressor`, decompressed on read. The last
+    `cache_size` decompressed segments of all sources are kept.
+    '''
+
+    cache_size = 2
+    # file path -> (samples, channels)
+    cache: OrderedDict = OrderedDict()
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        shape, dtype, _ = read_segment_header(file_path)
+        self.sample_count = shape[0]
+        self.channel_count = shape[1]
+        self.dtype = dtype
+
+    def read(self, start: int, stop: int) -> npt.NDArray:
+        cache = CompressedNPYSource.cache
+        if self.file_path in cache:
+            cache.move_to_end(self.file_path)
+        else:
+            cache[self.file_path] = load_compressed_segment(self.file_path)
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return cache[self.file_path][start:stop]
+
+    def close(self) -> None:
+        CompressedNPYSource.cache.pop(self.file_path, None)
+
+
+def open_segment_source(npy_path: str) -> Union[NPYSource, CompressedNPYSource]:
+    '''
+    Source of segment `npy_path`, or of its *.npyz once it is compressed.
+    '''
+    file_path = get_segment_path(npy_path)
+    if file_path.endswith(COMPRESSED_SEGMENT_EXTENSION):
+        return CompressedNPYSource(file_path)
+    return NPYSource(file_path)
+
+
+class BinarySource:
+    '''
+    A *.bin stream file of `BinaryStreamWriter`, memory-mapped.
+    '''
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self.header = read_binary_stream_header(file_path)
+        self.dtype = np.dtype(self.header['dtype'])
+        self.channel_count = self.header['channel_count']
+        self.data: Optional[npt.NDArray] = open_binary_stream(file_path)
+        self.sample_count = self.data.shape[0]
+
+    def read(self, start: int, stop: int) -> npt.NDArray:
+        if self.data is None:
+            self.data = open_binary_stream(self.file_path)
+        return self.data[start:stop]
+
+    def close(self) -> None:
+        self.data = None
+
+
+class CSVSource:
+    '''
+    A *.csv stream file of `CSVStreamWriter`. Opening counts the rows and keeps the
+    byte offset of every `CSV_INDEX_STEP`-th row, a read parses only the rows it needs.
+    '''
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self.row_offsets: list[int] = list()
+        self.sample_count = 0
+        offset = 0
+        with open(file_path, mode='rb') as file:
+            for line in file:
+                if self.sample_count % CSV_INDEX_STEP == 0:
+                    self.row_offsets.append(offset)
+                offset += len(line)
+                self.sample_count += 1
+        self.channel_count = 0
+        if self.sample_count > 0:
+            self.channel_count = self.read(0, 1).shape[1]
+        self.dtype = np.dtype(np.float64)
+
+    def read(self, start: int, stop: int) -> npt.NDArray:
+        stop = min(stop, self.sample_count)
+        if stop <= start:
+            return np.zeros((0, self.channel_count), dtype=np.float64)
+        block = start // CSV_INDEX_STEP
+        with open(self.file_path, mode='rb') as file:
+            file.seek(self.row_offsets[block])
+            rows = np.loadtxt(file, delimiter=',', dtype=np.float64, ndmin=2,
+                              skiprows=start - block * CSV_INDEX_STEP, max_rows=stop - start)
+        return rows
+
+    def close(self) -> None:
+        pass
+
+
+def load_task_params(record_dir: str, cfg_file_name: str = 'cfg.json') -> dict:
+    '''
+    Task params of a recording: its `cfg_file_name`, or the header of its *.bin stream,
+    with its progress log if it did not stop cleanly.
+    '''
+    cfg_path = os.path.join(record_dir, cfg_file_name)
+    if os.path.exists(cfg_path):
+        with open(cfg_path) as cfg_file:
+            return merge_progress_log(json.load(cfg_file), record_dir)
+    for file_name in sorted(os.listdir(record_dir)):
+        if file_name.endswith('.bin'):
+            return merge_progress_log(
+                read_binary_stream_header(os.path.join(record_dir, file_name))['task_params'], record_dir)
+    raise BaseException(f'No {cfg_file_name} or stream file in {record_dir}.')
+
+
+def list_segment_files(file_names: list[str], prefix: str = '') -> list[str]:
+    '''
+    `{prefix}N.npy` segment names of `file_names`, in N order, a compressed
+    `{prefix}N.npyz` is listed by its *.npy name.
+    '''
+    pattern = re.compile(rf'^{re.escape(prefix)}(\d+)\.npyz?$')
+    numbers = set()
+    for file_name in file_names:
+        match = pattern.match(file_name)
+        if match:
+            numbers.add(int(match.group(1)))
+    return [f'{prefix}{number}.npy' for number in sorted(numbers)]
+
+
+def guess_writer_type(file_names: list[str]) -> str:
+    '''
+    Writer type of a recording without "writer_type" in its task params.
+    '''
+    if any(file_name.endswith('.bin') for file_name in file_names):
+        return 'stream'
+    if any(file_name.endswith('.csv') and file_name != FRAME_TAG_FILE_NAME for file_name in file_names):
+        return 'csv'
+    if len(list_segment_files(file_names, 'event_')):
+        return 'event'
+    return 'segment'
+
+
+class RecordingReader:
+    '''
+    A recording directory as one (channels, samples) array, without loading it.
+
+    Works on the record directory of every writer: `N.npy` segments, `event_N.npy`
+    event segments, a `*.bin` stream or a `*.csv` stream. Segments are memory-mapped
+    and concatenated on read, csv rows are parsed on read. Samples of an unscaled
+    recording are converted to g / Pa with its `sample_scaling`, unless `scaled=False`.
+
+        reader = RecordingReader('record_data/task/20231116T165728')
+        reader[:, 0:1000]                      # all channels, samples 0 ~ 999
+        reader['NI_9234-ch0-env_sound', ::2]   # one channel by name
+        reader.read_time(1.5, 2.0)             # second 1.5 ~ 2.0
+        for first_sample, chunk in reader.iter_chunks(): ...
+
+    event: event recordings only, read the segments of this event index instead of
+    all events back to back. Sample index and time count from the first read sample,
+    so they jump over the gaps between events.
+    '''
+
+    def __init__(self, record_dir: str, scaled: bool = True, event: Optional[int] = None,
+                 cfg_file_name: str = 'cfg.json') -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        self.record_dir = record_dir
+        self.cfg_file_name = cfg_file_name
+        self.task_params = load_task_params(record_dir, cfg_file_name)
+        self.writer_type: Optional[str] = self.task_params.get('writer_type')
+        self.sample_rate: float = self.task_params['sample_rate']
+        self.channel_names: list[str] = list(self.task_params.get('channel_names') or list())
+        self.sample_scaling: Optional[dict] = self.task_params.get('sample_scaling')
+        self.scaled = scaled
+        self.events: list[dict] = list(self.task_params.get('events') or list())
+        self.event = event
+        # samples of the oldest segments removed by retention, see `open_sources()`
+        self.removed_sample_count = 0
+        self.sources = self.open_sources()
+        # first sample of every source, for `searchsorted`
+        self.source_starts = np.cumsum(
+            [0] + [source.sample_count for source in self.sources], dtype=np.int64)
+        self.sample_count = int(self.source_starts[-1])
+        if len(self.sources):
+            self.channel_count = self.sources[0].channel_count
+            self.raw_dtype = self.sources[0].dtype
+        else:
+            self.channel_count = len(self.channel_names)
+            self.raw_dtype = np.dtype(np.float64)
+        if len(self.channel_names) != self.channel_count:
+            self.channel_names = [f'ch{i}' for i in range(self.channel_count)]
+        self.frame_tags: Optional[npt.NDArray[np.int64]] = None
+        self.frame_index = None
+
+    def open_sources(self) -> list:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.open_sources)}')
+
+        file_names = sorted(os.listdir(self.record_dir))
+        if self.writer_type == None:
+            self.writer_type = guess_writer_type(file_names)
+        if self.writer_type == 'stream':
+            return [BinarySource(os.path.join(self.record_dir, file_name))
+                    for file_name in file_names if file_name.endswith('.bin')]
+        if self.writer_type == 'csv':
+            return [CSVSource(os.path.join(self.record_dir, file_name))
+                    for file_name in file_names
+                    if file_name.endswith('.csv') and file_name != FRAME_TAG_FILE_NAME]
+
+        if self.event != None:
+            segment_names = self.events[self.event]['segments']
+        elif 'segments' in self.task_params:
+            # closed segments only, the one being written is still preallocated
+            segment_names = [segment['file_name'] for segment in self.task_params['segments']]
+        else:
+            # recordings from before the manifest
+            segment_names = list_segment_files(
+                file_names, 'event_' if self.writer_type == 'event' else '')
+        sample_counts = {segment['file_name']: segment['sample_count']
+                         for segment in self.task_params.get('segments') or list()}
+        sources = list()
+        for segment_name in segment_names:
+            if not os.path.exists(get_segment_path(os.path.join(self.record_dir, segment_name))):
+                # removed by retention, oldest first, the recording starts at the first kept one
+                if len(sources) == 0:
+                    self.removed_sample_count += sample_counts.get(segment_name, 0)
+                continue
+            sources.append(open_segment_source(os.path.join(self.record_dir, segment_name)))
+        return sources
+
+    def close(self) -> None:
+        '''
+        Release the memory maps, they are opened again on the next read.
+        '''
+        for source in self.sources:
+            source.close()
+
+    def __enter__(self) -> 'RecordingReader':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.sample_count
+
+    @property
+    def shape(self) -> tuple:
+        return (self.channel_count, self.sample_count)
+
+    @property
+    def dtype(self) -> np.dtype:
+        if self.scaled and self.sample_scaling != None:
+            return np.dtype(np.float64)
+        return self.raw_dtype
+
+    @property
+    def duration(self) -> float:
+        '''
+        second
+        '''
+        return self.sample_count / self.sample_rate
+
+    def get_channel_indexes(self, channels=None) -> list[int]:
+        '''
+        channels: `None` for all, an index / name, a slice, or a list of indexes / names
+        '''
+        if channels is None:
+            return list(range(self.channel_count))
+        if isinstance(channels, slice):
+            return list(range(self.channel_count))[channels]
+        if isinstance(channels, (int, np.integer, str)):
+            channels = [channels]
+        indexes = list()
+        for channel in channels:
+            if isinstance(channel, str):
+                if channel not in self.channel_names:
+                    raise BaseException(
+                        f'Unknown channel name: {channel}. Channels : {self.channel_names}')
+                indexes.append(self.channel_names.index(channel))
+            else:
+                indexes.append(range(self.channel_count)[channel])
+        return indexes
+
+    def time_to_sample(self, seconds: float) -> int:
+        return int(round(seconds * self.sample_rate))
+
+    def read(self, start: int = 0, stop: Optional[int] = None, channels=None) -> npt.NDArray:
+        '''
+        Samples [start, stop) of `channels`, (number of channels, samples).
+        '''
+        start, stop, _ = slice(start, stop).indices(self.sample_count)
+        stop = max(start, stop)
+        indexes = self.get_channel_indexes(channels)
+        raw = np.empty((len(indexes), stop - start), dtype=self.raw_dtype)
+        position = start
+        i = int(np.searchsorted(self.source_starts, start, side='right')) - 1
+        while position < stop:
+            source_start = int(self.source_starts[i])
+            rows = self.sources[i].read(
+                position - source_start, min(stop, int(self.source_starts[i + 1])) - source_start)
+            raw[:, position - start:position - start + rows.shape[0]] = rows[:, indexes].T
+            position += rows.shape[0]
+            i += 1
+        return self.scale(raw, indexes)
+
+    def read_time(self, start_time: float = 0.0, end_time: Optional[float] = None,
+                  channels=None) -> npt.NDArray:
+        '''
+        start_time, end_time: second from the first sample
+        '''
+        return self.read(self.time_to_sample(start_time),
+                         None if end_time == None else self.time_to_sample(end_time), channels)
+
+    def scale(self, raw: npt.NDArray, indexes: list[int]) -> npt.NDArray:
+        if not self.scaled or self.sample_scaling == None:
+            return raw
+        scaler = SampleScaler(
+            coeffs=np.asarray(self.sample_scaling['coeffs'])[indexes],
+            gains=np.asarray(self.sample_scaling['gains'])[indexes])
+        return scaler(raw)
+
+    def __getitem__(self, key) -> npt.NDArray:
+        '''
+        reader[samples] or reader[channels, samples], channels as in `get_channel_indexes()`
+        '''
+        channels = None
+        if isinstance(key, tuple):
+            channels, key = key
+        if isinstance(key, (int, np.integer)):
+            index = range(self.sample_count)[key]
+            return self.read(index, index + 1, channels)[:, 0]
+        if not isinstance(key, slice):
+            raise BaseException('Samples are indexed by an int or a slice.')
+        start, stop, step = key.indices(self.sample_count)
+        if step < 0:
+            return self.read(stop + 1, start + 1, channels)[:, ::-1][:, ::-step]
+        return self.read(start, stop, channels)[:, ::step]
+
+    def iter_chunks(self, chunk_size: Optional[int] = None, start: int = 0, stop: Optional[int] = None,
+                    channels=None) -> Iterator[tuple[int, npt.NDArray]]:
+        '''
+        (first sample, (number of channels, samples)) of consecutive chunks,
+        `chunk_size` samples, default one second.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.iter_chunks)}')
+
+        if chunk_size == None:
+            chunk_size = max(1, int(self.sample_rate))
+        start, stop, _ = slice(start, stop).indices(self.sample_count)
+        for first_sample in range(start, stop, chunk_size):
+            yield first_sample, self.read(first_sample, min(first_sample + chunk_size, stop), channels)
+
+    def get_frame_tags(self) -> Optional[npt.NDArray[np.int64]]:
+        if self.frame_tags is None:
+            self.frame_tags = read_frame_tags(self.record_dir)
+        return self.frame_tags
+
+    def get_frame_index(self):
+        '''
+        `FrameIndex` of the recording, rebuilt first if the recording has none.
+        '''
+        # imported here, sdk.frame_index builds on this module
+        from .frame_index import FrameIndex, rebuild_frame_index
+
+        if self.frame_index == None:
+            if not os.path.exists(os.path.join(self.record_dir, FRAME_INDEX_FILE_NAME)):
+                rebuild_frame_index(self.record_dir, self.cfg_file_name)
+            self.frame_index = FrameIndex(self.record_dir)
+        return self.frame_index
+
+    def wall_time_to_sample(self, wall_time: Union[int, datetime]) -> int:
+        '''
+        Sample acquired at `wall_time` (ns since epoch or datetime), found in the seek
+        index in O(log n). A time between recorded frames gives the next frame.
+        '''
+        if self.event != None:
+            raise BaseException('Wall clock seek needs the reader of all events.')
+        if isinstance(wall_time, datetime):
+            wall_time = int(wall_time.timestamp() * 1e9)
+        frame_index = self.get_frame_index()
+        row = frame_index.find_wall_time(wall_time)
+        if row == len(frame_index):
+            return self.sample_count
+        record = frame_index.records[row]
+        sample = int(record['sample']) - self.removed_sample_count
+        frame_len = int(self.sample_rate * self.task_params['frame_duration'] * 0.001)
+        # wall_ns is taken right after the frame was read, at its end
+        remaining = int(round((int(record['wall_ns']) - wall_time) * 1e-9 * self.sample_rate))
+        return max(0, sample, sample + frame_len - remaining)
+
+    def read_wall_time(self, start_time: Union[int, datetime], end_time: Union[int, datetime],
+                       channels=None) -> npt.NDArray:
+        '''
+        Samples read from `start_time` to `end_time`, ns since epoch or datetime.
+        '''
+        return self.read(self.wall_time_to_sample(start_time),
+                         self.wall_time_to_sample(end_time), channels)
+
+
+if __name__ == '__main__':
+    # summary of a recording: python -m sdk.reader record_data/task/20231116T165728
+    import sys
+
+    reader = RecordingReader(sys.argv[1])
+    print(f'writer type: {reader.writer_type}')
+    print(f'shape: {reader.shape}, dtype: {reader.dtype}, sample rate: {reader.sample_rate} Hz, '
+          f'duration: {reader.duration:.3f} s, files: {len(reader.sources)}')
+    for i, channel_name in enumerate(reader.channel_names):
+        print(f'  {i}: {channel_name}')
+    for first_sample, chunk in reader.iter_chunks():
+        print(f'  {first_sample / reader.sample_rate:8.3f} s  rms {np.sqrt(np.mean(np.square(chunk), axis=1))}')
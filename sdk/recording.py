@@ -0,0 +1,401 @@
+from typing import Optional
+import os
+import json
+import time
+import threading
+from datetime import datetime
+
+from .utils import get_func_name, FRAME_TAG_FILE_NAME, FRAME_TAG_COLUMNS, PROGRESS_LOG_FILE_NAME
+from .sensor import read_channel_settings, add_channel_from_settings, load_sensor_cfg
+from debug_flags import PRINT_FUNC_NAME_FLAG
+
+
+def load_record_cfg(record_cfg_path: str) -> dict:
+    '''
+    Read a record config (see `./models/record_cfg.json`), sensor config paths are
+    resolved against the directory of the record config.
+    '''
+    if PRINT_FUNC_NAME_FLAG:
+        print(f'run function - {get_func_name(load_record_cfg)}')
+
+    with open(record_cfg_path) as record_cfg_file:
+        record_cfg = json.load(record_cfg_file)
+    record_cfg_dir = os.path.dirname(os.path.abspath(record_cfg_path))
+    record_cfg['sensor_cfg'] = [
+        os.path.normpath(os.path.join(record_cfg_dir, sensor_cfg_path))
+        for sensor_cfg_path in record_cfg['sensor_cfg']]
+    return record_cfg
+
+
+def get_record_cfg_write_file_dir(record_cfg: dict) -> str:
+    # same layout as the "Import config" button of the GUI
+    return os.path.join(record_cfg['target_storage'], record_cfg['machine_ID'], 'rawdata')
+
+
+def make_record_dir(write_file_directory: str, task_name: str, start_record_time: str) -> str:
+    '''
+    Create and return `write_file_directory/task_name/start_record_time`.
+    '''
+    if PRINT_FUNC_NAME_FLAG:
+        print(f'run function - {get_func_name(make_record_dir)}')
+
+    record_dir = os.path.join(write_file_directory, task_name, start_record_time)
+    os.makedirs(record_dir, exist_ok=True)
+    return record_dir
+
+
+def build_task_params(machine_name: str, task_name: str, start_record_time: str, frame_count: int,
+                      sample_rate: float, frame_duration: int, channels: list, channel_names: list,
+                      writer_type: Optional[str], sensor_cfg_paths: list, segments: list,
+                      sample_scaling: Optional[dict], frame_stats: dict,
+                      trigger: Optional[dict] = None, events: Optional[list] = None) -> dict:
+    '''
+    Task params exported as `cfg.json` of a recording and stored in stream file headers.
+    '''
+    if PRINT_FUNC_NAME_FLAG:
+        print(f'run function - {get_func_name(build_task_params)}')
+
+    task_params = {
+        'machine_ID':   machine_name,
+        'task_name':   task_name,
+        'start_time':   start_record_time,
+        'frame_count':   frame_count,
+        'sample_rate':   sample_rate,
+        'frame_duration':   frame_duration,
+        'chunk_len':   int(sample_rate * frame_duration * 0.001),
+        'channels':   channels,
+        'channel_names':   channel_names,
+        'writer_type':   writer_type,
+        'sensor_cfgs':   list(),
+        'segments':   list(segments),
+        # unscaled samples: engineering units = gain * polynomial(coeffs, raw code)
+        'sample_scaling':   sample_scaling,
+        # first sample index and monotonic / wall clock ns of every written frame
+        'frame_tags_file':   FRAME_TAG_FILE_NAME,
+        'frame_tag_columns':   list(FRAME_TAG_COLUMNS),
+        # gaps, lost samples, duplicates and read errors since task start
+        'frame_stats':   frame_stats,
+    }
+    if writer_type == 'event':
+        task_params['trigger'] = trigger
+        task_params['events'] = list(events or list())
+
+    for sensor_cfg_path in sensor_cfg_paths:
+        task_params['sensor_cfgs'].append(dict(load_sensor_cfg(sensor_cfg_path)))
+    return task_params
+
+
+def write_task_params(export_path: str, task_params: dict) -> None:
+    '''
+    Replace `export_path` at once, a power loss leaves the old or the new file,
+    never a truncated one.
+    '''
+    temp_path = f'{export_path}.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(task_params, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, export_path)
+
+
+class ProgressLog:
+    '''
+    Append-only progress of a recording, `PROGRESS_LOG_FILE_NAME` next to its
+    `cfg.json`, which is written only at start and stop.
+
+    One JSON line per update with changes: frame count, frame stats, segments closed
+    and events started or changed since the previous line. `merge_progress_log()`
+    adds them to `cfg.json` of a recording that did not stop cleanly, a line torn
+    by a crash is ignored.
+    '''
+
+    def __init__(self, record_dir: str) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        self.path = os.path.join(record_dir, PROGRESS_LOG_FILE_NAME)
+        self.file = open(self.path, mode='a')
+        self.frame_count = 0
+        self.segment_count = 0
+        # event number -> event as last logged
+        self.logged_events: dict[int, dict] = dict()
+
+    def append(self, writer_state: dict, frame_stats: dict) -> bool:
+        '''
+        Log `writer_state` (see `NI9234.get_writer_state()`) if it changed.
+        return: True if a line was written
+        '''
+        segments = writer_state['segments'][self.segment_count:]
+        events = [event for event in writer_state['events']
+                  if self.logged_events.get(event['event']) != event]
+        if writer_state['frame_count'] == self.frame_count and not segments and not events:
+            return False
+        self.file.write(json.dumps({
+            'frame_count': writer_state['frame_count'],
+            'frame_stats': frame_stats,
+            'segments': segments,
+            'events': events,
+        }) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.frame_count = writer_state['frame_count']
+        self.segment_count += len(segments)
+        for event in events:
+            self.logged_events[event['event']] = dict(event)
+        return True
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.file.close()
+
+
+def merge_progress_log(task_params: dict, record_dir: str) -> dict:
+    '''
+    Add the `ProgressLog` of `record_dir` to `task_params` read from its `cfg.json`,
+    entries already in `task_params` are kept.
+    '''
+    progress_path = os.path.join(record_dir, PROGRESS_LOG_FILE_NAME)
+    if not os.path.exists(progress_path):
+        return task_params
+    segment_names = set(segment['file_name'] for segment in task_params.get('segments') or list())
+    events = {event['event']: event for event in task_params.get('events') or list()}
+    with open(progress_path) as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # last line torn by a crash
+                break
+            if entry['frame_count'] > (task_params.get('frame_count') or 0):
+                task_params['frame_count'] = entry['frame_count']
+                task_params['frame_stats'] = entry['frame_stats']
+            for segment in entry['segments']:
+                if segment['file_name'] not in segment_names:
+                    task_params.setdefault('segments', list()).append(segment)
+                    segment_names.add(segment['file_name'])
+            for event in entry['events']:
+                if event['event'] not in events or event['frame_count'] >= events[event['event']]['frame_count']:
+                    events[event['event']] = event
+    if 'events' in task_params or len(events):
+        task_params['events'] = [events[number] for number in sorted(events)]
+    return task_params
+
+
+class Recorder:
+    '''
+    Headless acquisition and recording of a record config, without Qt.
+
+    Runs the same NI9234 callback, ring buffer and background writer as the GUI,
+    with the per frame callback print off. `settings` are the defaults of
+    `./models/cfg_ni9234.json`.
+    '''
+
+    def __init__(self, record_cfg: dict, settings: dict, writer_type: str = 'segment',
+                 write_file_directory: Optional[str] = None, simulate_device: Optional[bool] = None) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        self.record_cfg = record_cfg
+        self.settings = settings
+        self.writer_type = writer_type
+        self.write_file_directory = write_file_directory
+        if self.write_file_directory == None:
+            self.write_file_directory = get_record_cfg_write_file_dir(record_cfg)
+        self.simulate_device = settings['simulate_device'] if simulate_device == None else simulate_device
+        self.machine_name = record_cfg['machine_ID']
+        self.task_name = record_cfg['task_name']
+        self.channels = list(record_cfg['channels'])
+        self.sensor_cfg_paths = list(record_cfg['sensor_cfg'])
+        self.sample_rate = record_cfg['sample_rate']
+        self.frame_duration = record_cfg['frame_duration']
+        self.export_cfg_file_name = record_cfg.get('export_cfg_file_name', 'cfg.json')
+        self.nidaq = None
+        self.sample_scaling: Optional[dict] = None
+        self.record_dir: Optional[str] = None
+        self.export_path: Optional[str] = None
+        self.task_params: Optional[dict] = None
+        self.progress_log: Optional[ProgressLog] = None
+        self.retention_manager = None
+        self.start_record_time = 'time_not_set'
+        self.writer_state = {'frame_count': 0, 'segments': list(), 'events': list()}
+        self.last_stats_time = 0.0
+        self.last_written_count = 0
+
+    def create(self) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.create)}')
+
+        settings = self.settings
+        if self.simulate_device:
+            from .simulator import SimulatedNI9234
+            self.nidaq = SimulatedNI9234(
+                device_name=settings['device_name'], clock_mode=settings['simulate_clock'])
+        else:
+            from .NIDAQ import NI9234
+            self.nidaq = NI9234(device_name=settings['device_name'])
+        self.nidaq.print_callback_flag = False
+        self.nidaq.set_writer_queue_policy(settings['writer_queue_policy'])
+        self.nidaq.set_buffer_size_policy(
+            settings['buffer_size_policy'], stall_tolerance=settings['buffer_stall_tolerance'],
+            max_buffer_size=settings['max_input_buffer_size'], retune=settings['buffer_retune'])
+        self.nidaq.set_stream_sample_dtype(settings['stream_sample_dtype'])
+        self.nidaq.set_compression(**settings['compression'])
+        self.nidaq.set_sample_dtype(settings['sample_dtype'])
+        self.nidaq.set_read_unscaled(settings['read_unscaled'])
+        self.nidaq.create_task(task_name=self.task_name)
+        for physical_channel, sensor_cfg_path in zip(self.channels, self.sensor_cfg_paths):
+            add_channel_from_settings(
+                self.nidaq, read_channel_settings(sensor_cfg_path, physical_channel))
+        self.nidaq.set_sample_rate(self.sample_rate)
+        self.nidaq.set_frame_duration(self.frame_duration)
+        self.nidaq.show_daq_params()
+        self.nidaq.ready_read()
+        self.sample_scaling = self.nidaq.get_sample_scaling()
+
+    def build_task_params(self) -> dict:
+        return build_task_params(
+            machine_name=self.machine_name,
+            task_name=self.task_name,
+            start_record_time=self.start_record_time,
+            frame_count=self.writer_state['frame_count'],
+            sample_rate=self.sample_rate,
+            frame_duration=self.frame_duration,
+            channels=self.channels,
+            channel_names=self.nidaq.get_channel_names(),
+            writer_type=self.writer_type,
+            sensor_cfg_paths=self.sensor_cfg_paths,
+            segments=self.writer_state['segments'],
+            sample_scaling=self.sample_scaling,
+            frame_stats=self.nidaq.get_frame_stats(),
+            trigger=self.settings['trigger'],
+            events=self.writer_state['events'])
+
+    def start(self) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.start)}')
+
+        self.start_record_time = datetime.now().strftime('%Y%m%dT%H%M%S')
+        self.record_dir = make_record_dir(
+            self.write_file_directory, self.task_name, self.start_record_time)
+        self.export_path = os.path.join(self.record_dir, self.export_cfg_file_name)
+        print(f'record path: {self.record_dir}')
+        self.writer_state = {'frame_count': 0, 'segments': list(), 'events': list()}
+        # built once, sensor configs are not read again while recording
+        self.task_params = self.build_task_params()
+        self.nidaq.open_writer(
+            self.writer_type, self.record_dir,
+            file_name=f'{self.task_name}_{self.start_record_time}',
+            header=self.task_params,
+            segment_period=self.settings['segment_period'],
+            max_segment_bytes=int(self.settings['max_segment_size'] * 1024 * 1024),
+            trigger=self.settings['trigger'] if self.writer_type == 'event' else None)
+        write_task_params(self.export_path, self.task_params)
+        self.progress_log = ProgressLog(self.record_dir)
+        # imported here, sdk.retention reads recordings with sdk.reader, which builds on this module
+        from .retention import RetentionManager
+        self.retention_manager = RetentionManager(
+            os.path.join(self.write_file_directory, self.task_name), **self.settings['retention'],
+            pending_segments=self.nidaq.get_pending_segments)
+        self.retention_manager.set_active_record_dir(self.record_dir)
+        self.retention_manager.start()
+        self.nidaq.set_writer_enable()
+        self.nidaq.start_task()
+        self.last_stats_time = time.perf_counter()
+        self.last_written_count = 0
+
+    def update_task_params(self, final: bool = False) -> None:
+        '''
+        Append the writer state to the progress log, `final` also writes it to `cfg.json`.
+        '''
+        self.writer_state = self.nidaq.get_writer_state()
+        frame_stats = self.nidaq.get_frame_stats()
+        self.progress_log.append(self.writer_state, frame_stats)
+        if final:
+            self.task_params.update(
+                frame_count=self.writer_state['frame_count'],
+                segments=list(self.writer_state['segments']),
+                frame_stats=frame_stats)
+            if self.writer_type == 'event':
+                self.task_params['events'] = list(self.writer_state['events'])
+            write_task_params(self.export_path, self.task_params)
+            self.progress_log.close()
+
+    def report_stats(self) -> dict:
+        '''
+        Print and return throughput since the last report.
+        '''
+        now = time.perf_counter()
+        elapsed = max(now - self.last_stats_time, 1e-9)
+        writer_stats = self.nidaq.get_writer_stats()
+        frame_stats = self.nidaq.get_frame_stats()
+        health_stats = self.nidaq.get_health_stats()
+        written_count = writer_stats['written_count']
+        frame_bytes = self.nidaq.ring_buffer.frames[0].nbytes
+        frame_rate = (written_count - self.last_written_count) / elapsed
+        stats = {
+            'frames_per_second': frame_rate,
+            'samples_per_second': frame_rate * self.nidaq.frame_size,
+            'megabytes_per_second': frame_rate * frame_bytes / 1e6,
+            'written_count': written_count,
+            'queue_depth': writer_stats['queue_depth'],
+            'dropped_count': writer_stats['dropped_count'],
+            'gap_count': frame_stats['gap_count'],
+            'overflow_count': health_stats['overflow_count'],
+            'callback_p99_ms': health_stats['callback_time']['p99'],
+            'compression': writer_stats.get('compression'),
+        }
+        self.last_stats_time = now
+        self.last_written_count = written_count
+        callback_p99 = stats['callback_p99_ms']
+        print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} '
+              f'written {written_count} frames, {stats["samples_per_second"] / 1e3:.1f} kS/s per channel, '
+              f'{stats["megabytes_per_second"]:.2f} MB/s, queue {stats["queue_depth"]}, '
+              f'dropped {stats["dropped_count"]}, gaps {stats["gap_count"]}, '
+              f'overflows {stats["overflow_count"]}, callback p99 '
+              f'{"-" if callback_p99 == None else f"{callback_p99:.1f}"} ms')
+        compression = stats['compression']
+        if compression != None and compression['ratio'] != None:
+            print(f'compressed {compression["segment_count"]} segments, ratio {compression["ratio"]:.2f}, '
+                  f'{compression["megabytes_per_second"]:.1f} MB/s per worker, '
+                  f'pending {compression["pending_count"]}, errors {compression["error_count"]}')
+        return stats
+
+    def stop(self) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.stop)}')
+
+        self.nidaq.stop_task()
+        self.nidaq.close_writer()
+        self.update_task_params(final=True)
+        self.nidaq.close_task()
+        self.retention_manager.stop()
+
+    def run(self, duration: float = 0.0, stats_interval: float = 10.0,
+            stop_event: Optional[threading.Event] = None) -> None:
+        '''
+        Record until `duration` seconds passed (0 for no limit) or `stop_event` is set,
+        report throughput and append to the progress log every `stats_interval` seconds.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.run)}')
+
+        if stop_event == None:
+            stop_event = threading.Event()
+        self.create()
+        self.start()
+        start_time = time.perf_counter()
+        try:
+            while True:
+                timeout = stats_interval
+                if duration > 0:
+                    timeout = min(timeout, duration - (time.perf_counter() - start_time))
+                if timeout <= 0 or stop_event.wait(timeout):
+                    break
+                self.report_stats()
+                self.update_task_params()
+        finally:
+            self.stop()
+            # average over the whole run
+            self.last_stats_time = start_time
+            self.last_written_count = 0
+            self.report_stats()
@@ -0,0 +1,297 @@
+from typing import Optional, Callable
+import os
+import re
+import time
+import shutil
+import threading
+
+from .reader import load_task_params, guess_writer_type
+from .utils import get_func_name, FRAME_TAG_FILE_NAME
+from debug_flags import PRINT_FUNC_NAME_FLAG
+
+
+# N.npy / event_N.npy segment, or its compressed *.npyz
+SEGMENT_FILE_PATTERN = re.compile(r'^(event_)?(\d+)\.npyz?$')
+
+
+def get_dir_size(directory: str) -> int:
+    size = 0
+    for root_dir, _, file_names in os.walk(directory):
+        for file_name in file_names:
+            try:
+                size += os.path.getsize(os.path.join(root_dir, file_name))
+            except OSError:
+                # removed meanwhile
+                pass
+    return size
+
+
+def get_removable_event_segments(task_params: dict, kept_events: set) -> set:
+    '''
+    Segment numbers of an event recording that may be removed: segments of recorded
+    events neither protected nor in `kept_events`. Segments of an event still
+    recording, or not listed yet (the manifest of an active recording lags behind),
+    are kept.
+    '''
+    removable = set()
+    for event in task_params.get('events') or list():
+        if event.get('protected', False) or event['event'] in kept_events:
+            continue
+        for segment_name in event.get('segments') or list():
+            removable.add(int(SEGMENT_FILE_PATTERN.match(segment_name).group(2)))
+    return removable
+
+
+class RetentionManager:
+    '''
+    Keep a task directory (`write_file_directory/task_name`, one record directory
+    per recording) under `max_size` MB and `max_age` hours in a background thread.
+
+    Every `interval` seconds the oldest data files are deleted, or moved to the same
+    layout under `archive_dir`, one at a time until the limits hold again: closed
+    segments (*.npy / *.npyz) first, stream and csv files of finished recordings as
+    a whole. A record directory left without data is removed with its metadata.
+
+    Never touched: the record directory being written (`set_active_record_dir()`)
+    except its closed segments, segments still waiting for `pending_segments()`
+    (paths of `SegmentCompressor`), and of event recordings the segments of protected
+    events (fired by a trigger condition with "protect") and of the newest
+    `keep_events` events of the task directory. 0 turns a limit off.
+    '''
+
+    def __init__(self, task_dir: str, max_size: float = 0, max_age: float = 0,
+                 interval: float = 60.0, archive_dir: Optional[str] = None, keep_events: int = 0,
+                 pending_segments: Optional[Callable[[], list]] = None) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        self.task_dir = task_dir
+        self.max_bytes = int(max_size * 1024 * 1024)
+        self.max_age = max_age * 3600
+        self.interval = interval
+        self.archive_dir = archive_dir
+        self.keep_events = keep_events
+        self.pending_segments = pending_segments
+        self.active_record_dir: Optional[str] = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.removed_count = 0
+        self.removed_bytes = 0
+        self.error_count = 0
+        self.task_size = 0
+        # size limit not reached because only active or protected data is left
+        self.blocked = False
+
+    def is_enabled(self) -> bool:
+        return self.max_bytes > 0 or self.max_age > 0
+
+    def set_active_record_dir(self, record_dir: Optional[str]) -> None:
+        with self.lock:
+            self.active_record_dir = None if record_dir == None else os.path.abspath(record_dir)
+
+    def start(self) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.start)}')
+
+        if not self.is_enabled() or (self.thread != None and self.thread.is_alive()):
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(
+            target=self.run, name='retention-manager', daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.stop)}')
+
+        self.stop_event.set()
+        if self.thread != None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self) -> None:
+        while not self.stop_event.is_set():
+            try:
+                self.enforce()
+            except BaseException as e:
+                print(f'retention of {self.task_dir} failed: {type(e).__name__}: {e}')
+                self.error_count += 1
+            self.stop_event.wait(self.interval)
+
+    def get_kept_events(self, record_dirs: list[str]) -> dict:
+        '''
+        Record directory -> numbers of its events among the newest `keep_events`
+        events of `record_dirs` (oldest first).
+        '''
+        kept_events = dict()
+        remaining = self.keep_events
+        for record_dir in reversed(record_dirs):
+            if remaining <= 0:
+                break
+            try:
+                events = load_task_params(record_dir).get('events') or list()
+            except BaseException:
+                continue
+            numbers = [event['event'] for event in events][-remaining:]
+            kept_events[record_dir] = set(numbers)
+            remaining -= len(numbers)
+        return kept_events
+
+    def get_pending_paths(self) -> set:
+        if self.pending_segments == None:
+            return set()
+        return set(os.path.abspath(path) for path in self.pending_segments())
+
+    def list_record_units(self, record_dir: str, active: bool, kept_events: Optional[set] = None,
+                          pending_paths: Optional[set] = None) -> tuple[list, bool]:
+        '''
+        Removable data of a record directory, oldest first: (file paths, newest
+        modification time) per unit.
+        kept_events: event numbers kept by `keep_events`
+        pending_paths: absolute *.npy paths not compressed yet
+        return: units, True if the directory holds data that is never removed
+        '''
+        file_names = sorted(os.listdir(record_dir))
+        try:
+            task_params = load_task_params(record_dir)
+            writer_type = task_params.get('writer_type') or guess_writer_type(file_names)
+        except BaseException:
+            # not a recording
+            return list(), True
+
+        units = list()
+        kept = False
+        if writer_type in ('stream', 'csv'):
+            data_names = [file_name for file_name in file_names
+                          if file_name.endswith(('.bin', '.csv')) and file_name != FRAME_TAG_FILE_NAME]
+            if active:
+                return list(), len(data_names) > 0
+            if len(data_names):
+                units.append([os.path.join(record_dir, file_name) for file_name in data_names])
+        else:
+            segments: dict[int, list] = dict()
+            for file_name in file_names:
+                match = SEGMENT_FILE_PATTERN.match(file_name)
+                if match:
+                    segments.setdefault(int(match.group(2)), list()).append(
+                        os.path.join(record_dir, file_name))
+            closed = set(int(SEGMENT_FILE_PATTERN.match(segment['file_name']).group(2))
+                         for segment in task_params.get('segments') or list())
+            # the writer only writes the newest segment, older ones are closed before the
+            # progress log lists them
+            if len(segments):
+                closed.update(number for number in segments if number < max(segments))
+            removable = None
+            if writer_type == 'event':
+                removable = get_removable_event_segments(task_params, kept_events or set())
+            prefix = 'event_' if writer_type == 'event' else ''
+            for number in sorted(segments):
+                pending = os.path.abspath(os.path.join(
+                    record_dir, f'{prefix}{number}.npy')) in (pending_paths or set())
+                if removable != None and number not in removable:
+                    kept = True
+                    continue
+                if pending or (active and number not in closed):
+                    # the reader takes removed segments as the oldest ones, a newer segment
+                    # compressed first waits for this one
+                    kept = True
+                    break
+                units.append(segments[number])
+        timed_units = list()
+        for paths in units:
+            try:
+                timed_units.append((paths, max(os.path.getmtime(path) for path in paths)))
+            except OSError:
+                # a segment replaced by its *.npyz meanwhile, the next pass takes it
+                pass
+        return timed_units, kept
+
+    def remove_file(self, file_path: str) -> int:
+        size = os.path.getsize(file_path)
+        if self.archive_dir == None:
+            os.remove(file_path)
+        else:
+            archive_path = os.path.join(
+                self.archive_dir, os.path.relpath(file_path, os.path.dirname(self.task_dir)))
+            os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+            shutil.move(file_path, archive_path)
+        return size
+
+    def remove_record_dir(self, record_dir: str, kept_events: Optional[set] = None) -> None:
+        '''
+        Remove a record directory left without data, with its metadata.
+        '''
+        units, kept = self.list_record_units(record_dir, False, kept_events, self.get_pending_paths())
+        if len(units) or kept:
+            # a segment compressed meanwhile
+            return
+        for file_name in os.listdir(record_dir):
+            file_path = os.path.join(record_dir, file_name)
+            if os.path.isfile(file_path):
+                self.task_size -= self.remove_file(file_path)
+        os.rmdir(record_dir)
+        print(f'retention: removed {record_dir}')
+
+    def enforce(self) -> dict:
+        '''
+        One pass over the task directory, called every `interval` by the thread.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.enforce)}')
+
+        if not os.path.isdir(self.task_dir):
+            return self.get_stats()
+        with self.lock:
+            active_record_dir = self.active_record_dir
+        self.task_size = get_dir_size(self.task_dir)
+        now = time.time()
+        self.blocked = False
+        # record directories are named by start time, oldest first
+        record_dirs = [os.path.join(self.task_dir, record_name)
+                       for record_name in sorted(os.listdir(self.task_dir))]
+        record_dirs = [record_dir for record_dir in record_dirs if os.path.isdir(record_dir)]
+        kept_events = self.get_kept_events(record_dirs)
+        pending_paths = self.get_pending_paths()
+        for record_dir in record_dirs:
+            if self.stop_event.is_set():
+                break
+            active = os.path.abspath(record_dir) == active_record_dir
+            units, kept = self.list_record_units(
+                record_dir, active, kept_events.get(record_dir), pending_paths)
+            removed_count = 0
+            for paths, modified_time in units:
+                over_size = self.max_bytes > 0 and self.task_size > self.max_bytes
+                too_old = self.max_age > 0 and now - modified_time > self.max_age
+                if self.stop_event.is_set() or not (over_size or too_old):
+                    break
+                for file_path in paths:
+                    try:
+                        size = self.remove_file(file_path)
+                    except FileNotFoundError:
+                        # a segment replaced by its *.npyz meanwhile, the next pass takes it
+                        continue
+                    except OSError as e:
+                        print(f'retention: {file_path} not removed: {e}')
+                        self.error_count += 1
+                        continue
+                    self.task_size -= size
+                    self.removed_bytes += size
+                self.removed_count += 1
+                removed_count += 1
+            if not active and not kept and removed_count == len(units) and removed_count > 0:
+                self.remove_record_dir(record_dir, kept_events.get(record_dir))
+        self.blocked = self.max_bytes > 0 and self.task_size > self.max_bytes
+        if self.blocked:
+            print(f'retention: {self.task_dir} is {self.task_size / 1024 / 1024:.1f} MB, '
+                  f'only active or protected data left')
+        return self.get_stats()
+
+    def get_stats(self) -> dict:
+        return {
+            'task_size': self.task_size,
+            'removed_count': self.removed_count,
+            'removed_bytes': self.removed_bytes,
+            'error_count': self.error_count,
+            'blocked': self.blocked,
+        }
@@ -0,0 +1,292 @@
+from typing import Optional, Iterator
+from multiprocessing import shared_memory
+
+import numpy as np
+import numpy.typing as npt
+
+from .utils import get_func_name
+from debug_flags import PRINT_FUNC_NAME_FLAG
+
+
+# columns of `FrameRingBuffer.frame_tags`, -1 for unknown
+FRAME_TAG_FIELDS = ('first_sample', 'monotonic_ns', 'wall_ns')
+
+
+class FrameRingBuffer:
+    '''
+    Preallocated single producer / multiple consumer frame ring.
+
+    The producer fills the slot returned by `get_write_frame()` in place and
+    publishes it with `commit()`. Every consumer keeps its own read cursor, so it
+    gets every frame exactly once as a view into the ring (no copy). No lock is
+    taken: a frame is published by a single int assignment after the slot is
+    filled. A consumer falling more than `slot_count - 1` frames behind skips to
+    the oldest frame still in the ring and counts an overrun. Every slot carries
+    the tag of its frame, see `FRAME_TAG_FIELDS`.
+    '''
+
+    def __init__(self, slot_count: int, channel_count: int, frame_size: int, dtype=np.float64) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        if slot_count < 2:
+            raise BaseException('Ring buffer needs at least 2 slots.')
+        self.slot_count = slot_count
+        self.channel_count = channel_count
+        self.frame_size = frame_size
+        self.frames = np.zeros((slot_count, channel_count, frame_size), dtype=dtype)
+        # sequence number of the frame held in each slot, -1 for empty slot
+        self.slot_sequences = np.full(slot_count, -1, dtype=np.int64)
+        self.frame_tags = np.full(
+            (slot_count, len(FRAME_TAG_FIELDS)), -1, dtype=np.int64)
+        # sequence number of the next frame to be written
+        self.write_sequence = 0
+        self.consumers: dict[str, RingBufferConsumer] = dict()
+
+    def get_write_frame(self) -> npt.NDArray:
+        return self.frames[self.write_sequence % self.slot_count]
+
+    def commit(self, first_sample: int = -1, monotonic_ns: int = -1, wall_ns: int = -1) -> int:
+        '''
+        Publish the frame written into `get_write_frame()` with its tag, return its sequence number.
+
+        first_sample: absolute index of the first sample of frame since task start
+        '''
+        sequence = self.write_sequence
+        slot = sequence % self.slot_count
+        tag = self.frame_tags[slot]
+        tag[0] = first_sample
+        tag[1] = monotonic_ns
+        tag[2] = wall_ns
+        self.slot_sequences[slot] = sequence
+        self.write_sequence = sequence + 1
+        return sequence
+
+    def register_consumer(self, name: str, from_latest: bool = True) -> 'RingBufferConsumer':
+        '''
+        from_latest: start from the next committed frame, otherwise from the oldest frame in ring
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.register_consumer)}')
+
+        if from_latest:
+            start_sequence = self.write_sequence
+        else:
+            start_sequence = max(0, self.write_sequence - self.slot_count + 1)
+        consumer = RingBufferConsumer(self, name, start_sequence)
+        self.consumers[name] = consumer
+        return consumer
+
+    def unregister_consumer(self, name: str) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.unregister_consumer)}')
+
+        self.consumers.pop(name, None)
+
+    def is_available(self, sequence: int) -> bool:
+        '''
+        `True` while the frame of `sequence` is committed and not being overwritten.
+        '''
+        return self.write_sequence - self.slot_count < sequence < self.write_sequence
+
+    def get_frame_tag(self, sequence: int) -> npt.NDArray:
+        '''
+        Copy of the tag of frame `sequence`, valid while `is_available(sequence)`.
+        '''
+        return self.frame_tags[sequence % self.slot_count].copy()
+
+    def latest(self) -> Optional[tuple[int, npt.NDArray]]:
+        if self.write_sequence == 0:
+            return None
+        sequence = self.write_sequence - 1
+        return sequence, self.frames[sequence % self.slot_count]
+
+
+class SharedFrameRingBuffer(FrameRingBuffer):
+    '''
+    `FrameRingBuffer` in a `multiprocessing.shared_memory` block, for a producer
+    and consumers in different processes.
+
+    name: `None` to create (and own) a new block, otherwise attach to the block
+    created with the same layout. Block layout: write sequence (int64), slot
+    sequences (int64 x slot count), frame tags (int64 x slot count x tag fields),
+    frames. The owner unlinks the block in `close()`.
+    '''
+
+    def __init__(self, slot_count: int, channel_count: int, frame_size: int,
+                 dtype=np.float64, name: Optional[str] = None) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        if slot_count < 2:
+            raise BaseException('Ring buffer needs at least 2 slots.')
+        self.slot_count = slot_count
+        self.channel_count = channel_count
+        self.frame_size = frame_size
+        dtype = np.dtype(dtype)
+        tag_count = slot_count * len(FRAME_TAG_FIELDS)
+        header_size = 8 * (1 + slot_count + tag_count)
+        frames_size = slot_count * channel_count * frame_size * dtype.itemsize
+        self.is_owner = name == None
+        if self.is_owner:
+            self.shm = shared_memory.SharedMemory(
+                create=True, size=header_size + frames_size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.sequences = np.ndarray(
+            (1 + slot_count + tag_count,), dtype=np.int64, buffer=self.shm.buf)
+        self.slot_sequences = self.sequences[1:1 + slot_count]
+        self.frame_tags = self.sequences[1 + slot_count:].reshape(
+            slot_count, len(FRAME_TAG_FIELDS))
+        self.frames = np.ndarray((slot_count, channel_count, frame_size), dtype=dtype,
+                                 buffer=self.shm.buf, offset=header_size)
+        if self.is_owner:
+            self.sequences[0] = 0
+            self.slot_sequences[:] = -1
+            self.frame_tags[:] = -1
+        self.consumers: dict[str, RingBufferConsumer] = dict()
+
+    @property
+    def write_sequence(self) -> int:
+        return int(self.sequences[0])
+
+    @write_sequence.setter
+    def write_sequence(self, sequence: int) -> None:
+        self.sequences[0] = sequence
+
+    def get_layout(self) -> dict:
+        '''
+        Arguments to attach to this block from another process.
+        '''
+        return {
+            'slot_count': self.slot_count,
+            'channel_count': self.channel_count,
+            'frame_size': self.frame_size,
+            'dtype': self.frames.dtype.str,
+            'name': self.name,
+        }
+
+    def close(self) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.close)}')
+
+        if self.shm == None:
+            return
+        self.consumers.clear()
+        # views into the block have to be released before closing it
+        self.sequences = None
+        self.slot_sequences = None
+        self.frame_tags = None
+        self.frames = None
+        self.shm.close()
+        if self.is_owner:
+            self.shm.unlink()
+        self.shm = None
+
+
+class RingBufferConsumer:
+
+    def __init__(self, ring_buffer: FrameRingBuffer, name: str, start_sequence: int) -> None:
+        self.ring_buffer = ring_buffer
+        self.name = name
+        self.read_sequence = start_sequence
+        self.overrun_count = 0
+        self.lost_frame_count = 0
+
+    def available(self) -> int:
+        return self.ring_buffer.write_sequence - self.read_sequence
+
+    def read(self) -> Optional[tuple[int, npt.NDArray]]:
+        '''
+        Return (sequence number, frame view) of the next unread frame, or `None`.
+        The view stays valid while `ring_buffer.is_available(sequence)`.
+        '''
+        ring_buffer = self.ring_buffer
+        write_sequence = ring_buffer.write_sequence
+        if self.read_sequence >= write_sequence:
+            return None
+
+        # slot of `write_sequence` may be filling now, so it is not readable
+        oldest_sequence = write_sequence - ring_buffer.slot_count + 1
+        if self.read_sequence < oldest_sequence:
+            self.overrun_count += 1
+            self.lost_frame_count += oldest_sequence - self.read_sequence
+            self.read_sequence = oldest_sequence
+
+        sequence = self.read_sequence
+        self.read_sequence += 1
+        return sequence, ring_buffer.frames[sequence % ring_buffer.slot_count]
+
+    def read_all(self) -> Iterator[tuple[int, npt.NDArray]]:
+        while True:
+            item = self.read()
+            if item is None:
+                return
+            yield item
+
+    def skip_to_latest(self) -> None:
+        self.read_sequence = self.ring_buffer.write_sequence
+
+
+class CircularBuffer:
+    '''
+    Fixed-length history along axis 1 of a (channels, length, ...) array.
+
+    `write()` copies only the new block at the write index, `ordered()` unwraps
+    the history from oldest to newest on read. With `track_sum` the sum along
+    axis 1 is kept up to date per block, and recomputed once per wrap to stop
+    floating point drift.
+    '''
+
+    def __init__(self, channel_count: int, length: int, tail_shape: tuple = (),
+                 dtype=np.float64, track_sum: bool = False) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        self.length = length
+        self.data = np.zeros((channel_count, length) + tuple(tail_shape), dtype=dtype)
+        self.write_index = 0
+        self.track_sum = track_sum
+        self.sum = np.zeros((channel_count,) + tuple(tail_shape), dtype=dtype)
+
+    def clear(self) -> None:
+        self.data[:] = 0
+        self.sum[:] = 0
+        self.write_index = 0
+
+    def write(self, block: npt.NDArray) -> None:
+        '''
+        block: (channels, n, ...), the newest n entries
+        '''
+        count = block.shape[1]
+        if count > self.length:
+            block = block[:, -self.length:]
+            count = self.length
+        start = self.write_index
+        first = min(count, self.length - start)
+        second = count - first
+
+        if self.track_sum:
+            self.sum -= self.data[:, start:start + first].sum(axis=1)
+            if second > 0:
+                self.sum -= self.data[:, :second].sum(axis=1)
+        self.data[:, start:start + first] = block[:, :first]
+        if second > 0:
+            self.data[:, :second] = block[:, first:]
+        self.write_index = (start + count) % self.length
+
+        if self.track_sum:
+            if start + count >= self.length:
+                self.sum = self.data.sum(axis=1)
+            else:
+                self.sum += block.sum(axis=1)
+
+    def ordered(self) -> npt.NDArray:
+        '''
+        Copy of the history, oldest entry first.
+        '''
+        if self.write_index == 0:
+            return self.data.copy()
+        return np.concatenate(
+            (self.data[:, self.write_index:], self.data[:, :self.write_index]), axis=1)
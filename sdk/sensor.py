@@ -1,18 +1,37 @@
 from typing import Optional, Union
+import os
 import json
 
 from sdk.utils import get_func_name
 from debug_flags import PRINT_FUNC_NAME_FLAG
 
 
+# absolute sensor config path -> (modification time ns, config), see `load_sensor_cfg()`
+sensor_cfg_cache: dict = dict()
+
+
+def load_sensor_cfg(sensor_cfg_path) -> dict:
+    '''
+    Sensor config of `sensor_cfg_path`, parsed again only when the file changed.
+    The returned dict is shared, do not modify it.
+    '''
+    path = os.path.abspath(sensor_cfg_path)
+    modified_time = os.stat(path).st_mtime_ns
+    cached = sensor_cfg_cache.get(path)
+    if cached == None or cached[0] != modified_time:
+        with open(path) as sensor_cfg_file:
+            cached = (modified_time, json.load(sensor_cfg_file))
+        sensor_cfg_cache[path] = cached
+    return cached[1]
+
+
 class AccelerometerChannelSettings:
 
     def __init__(self, sensor_cfg_path, physical_channel) -> None:
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.__init__)}')
 
-        self.sensor_cfg_file = open(sensor_cfg_path)
-        self.sensor_cfg = json.load(self.sensor_cfg_file)
+        self.sensor_cfg = load_sensor_cfg(sensor_cfg_path)
         self.physical_channel = physical_channel
         self.name_to_assign_to_channel = self.sensor_cfg['name_to_assign_to_channel']
         self.terminal_config = self.sensor_cfg['terminal_config']
@@ -25,8 +44,6 @@ class AccelerometerChannelSettings:
         self.current_excit_val = self.sensor_cfg['current_excit_val']
         self.custom_scale_name = self.sensor_cfg['custom_scale_name']
         self.sensor_type = self.sensor_cfg['sensor_type']
-        
-        self.sensor_cfg_file.close()
 
     def paramters_checker(self):
         # TODO: 根據Sensor種類、使用的API來限制設定檔內容
@@ -39,8 +56,7 @@ class MicrophoneChannelSettings:
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.__init__)}')
 
-        self.sensor_cfg_file = open(sensor_cfg_path)
-        self.sensor_cfg = json.load(self.sensor_cfg_file)
+        self.sensor_cfg = load_sensor_cfg(sensor_cfg_path)
         self.physical_channel = physical_channel
         self.name_to_assign_to_channel = self.sensor_cfg['name_to_assign_to_channel']
         self.terminal_config = self.sensor_cfg['terminal_config']
@@ -52,12 +68,57 @@ class MicrophoneChannelSettings:
         self.custom_scale_name = self.sensor_cfg['custom_scale_name']
         self.sensor_type = self.sensor_cfg['sensor_type']
 
-        self.sensor_cfg_file.close()
-
     def paramters_checker(self):
         # TODO: 根據Sensor種類、使用的API來限制設定檔內容
         pass
 
+def read_channel_settings(sensor_cfg_path, physical_channel) -> Union[AccelerometerChannelSettings, MicrophoneChannelSettings]:
+    '''
+    Channel settings of a sensor config, by its "sensor_type".
+    '''
+    if PRINT_FUNC_NAME_FLAG:
+        print(f'run function - {get_func_name(read_channel_settings)}')
+
+    sensor_type = load_sensor_cfg(sensor_cfg_path)['sensor_type']
+    if sensor_type == 'accelerometer':
+        return AccelerometerChannelSettings(sensor_cfg_path, physical_channel)
+    if sensor_type == 'microphone':
+        return MicrophoneChannelSettings(sensor_cfg_path, physical_channel)
+    raise BaseException(f'Unsupported sensor type: {sensor_type} ({sensor_cfg_path})')
+
+
+def add_channel_from_settings(nidaq, channel_settings: Union[AccelerometerChannelSettings, MicrophoneChannelSettings]) -> None:
+    '''
+    Add the channel of `channel_settings` to the task of `nidaq` (NI9234 or NI9234Process).
+    '''
+    if PRINT_FUNC_NAME_FLAG:
+        print(f'run function - {get_func_name(add_channel_from_settings)}')
+
+    if isinstance(channel_settings, AccelerometerChannelSettings):
+        nidaq.add_accel_channel(
+            physical_channel=channel_settings.physical_channel,
+            name_to_assign_to_channel=channel_settings.name_to_assign_to_channel,
+            terminal_config=channel_settings.terminal_config,
+            min_val=channel_settings.min_val,
+            max_val=channel_settings.max_val,
+            units=channel_settings.units,
+            sensitivity=channel_settings.sensitivity,
+            sensitivity_units=channel_settings.sensitivity_units,
+            current_excit_source=channel_settings.current_excit_source,
+            current_excit_val=channel_settings.current_excit_val,
+            custom_scale_name=channel_settings.custom_scale_name)
+    else:
+        nidaq.add_microphone_channel(
+            physical_channel=channel_settings.physical_channel,
+            name_to_assign_to_channel=channel_settings.name_to_assign_to_channel,
+            terminal_config=channel_settings.terminal_config,
+            units=channel_settings.units,
+            mic_sensitivity=channel_settings.mic_sensitivity,
+            current_excit_source=channel_settings.current_excit_source,
+            current_excit_val=channel_settings.current_excit_val,
+            custom_scale_name=channel_settings.custom_scale_name)
+
+
 if __name__ == '__main__':
     sensor_cfg_file = './352C33.json'
     accel_setting = AccelerometerChannelSettings(sensor_cfg_file)
@@ -0,0 +1,515 @@
+from typing import Optional, Callable
+import dataclasses
+import threading
+import time
+
+import numpy as np
+import numpy.typing as npt
+
+from .NIDAQ import NI9234
+from .utils import get_func_name
+from debug_flags import PRINT_FUNC_NAME_FLAG
+
+
+# NI-DAQmx error code of "Attempted to read samples that are no longer available"
+SIMULATED_OVERFLOW_ERROR_CODE = -200279
+SIMULATED_VOLTS_PER_CODE = 5.0 / 2**23
+
+
+class SimulatedDaqError(Exception):
+
+    def __init__(self, message: str, error_code: int) -> None:
+        super(SimulatedDaqError, self).__init__(message)
+        self.error_code = error_code
+
+
+@dataclasses.dataclass
+class ToneComponent:
+    '''
+    frequency: Hz
+    harmonics: amplitude ratio of 2nd, 3rd, ... harmonic to the fundamental
+    '''
+    frequency: float
+    amplitude: float
+    phase: float = 0.0
+    harmonics: tuple = ()
+
+
+@dataclasses.dataclass
+class BurstComponent:
+    '''
+    Exponentially decaying sine burst, repeats every `period` seconds.
+    period / duration / start: second
+    '''
+    frequency: float
+    amplitude: float
+    period: float = 2.0
+    duration: float = 0.05
+    decay: float = 80.0
+    start: float = 0.5
+
+
+@dataclasses.dataclass
+class ChannelSignal:
+    tones: list = dataclasses.field(default_factory=list)
+    bursts: list = dataclasses.field(default_factory=list)
+    noise_std: float = 0.0
+    offset: float = 0.0
+
+
+def default_accelerometer_signal() -> ChannelSignal:
+    # rotating machinery: shaft tone with harmonics, a bearing tone and impacts
+    return ChannelSignal(
+        tones=[ToneComponent(frequency=120.0, amplitude=0.05, harmonics=(0.5, 0.25, 0.1)),
+               ToneComponent(frequency=1130.0, amplitude=0.01, phase=0.3)],
+        bursts=[BurstComponent(frequency=3200.0, amplitude=0.3)],
+        noise_std=0.005)
+
+
+def default_microphone_signal() -> ChannelSignal:
+    return ChannelSignal(
+        tones=[ToneComponent(frequency=440.0, amplitude=0.1, harmonics=(0.3, 0.1))],
+        bursts=[BurstComponent(frequency=1800.0, amplitude=0.4, period=3.0, duration=0.1,
+                               decay=40.0, start=1.0)],
+        noise_std=0.02)
+
+
+class SignalGenerator:
+    '''
+    Deterministic multi-channel signal source.
+
+    Tones and bursts are computed from the absolute sample index, so frames are
+    continuous whatever the frame size. Noise comes from one seeded generator per
+    channel, so the same seed and read sequence always gives the same data.
+    '''
+
+    def __init__(self, sample_rate: float, channel_signals: list[ChannelSignal], seed: int = 0) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        self.sample_rate = sample_rate
+        self.channel_signals = channel_signals
+        self.seed = seed
+        self.rngs = [np.random.default_rng(seed + i)
+                     for i in range(len(channel_signals))]
+
+    def generate(self, first_sample: int, out: npt.NDArray) -> npt.NDArray:
+        '''
+        Fill `out` (channels, samples) with the signal starting at `first_sample`.
+        '''
+        t = (first_sample + np.arange(out.shape[1])) / self.sample_rate
+        for i, signal in enumerate(self.channel_signals):
+            row = np.full(out.shape[1], signal.offset)
+            for tone in signal.tones:
+                row += tone.amplitude * \
+                    np.sin(2 * np.pi * tone.frequency * t + tone.phase)
+                for order, ratio in enumerate(tone.harmonics, start=2):
+                    row += ratio * tone.amplitude * \
+                        np.sin(2 * np.pi * order * tone.frequency * t + tone.phase)
+            for burst in signal.bursts:
+                elapsed = np.mod(t - burst.start, burst.period)
+                active = (t >= burst.start) & (elapsed < burst.duration)
+                if np.any(active):
+                    row[active] += burst.amplitude * \
+                        np.exp(-burst.decay * elapsed[active]) * \
+                        np.sin(2 * np.pi * burst.frequency * elapsed[active])
+            if signal.noise_std > 0:
+                row += self.rngs[i].normal(0.0, signal.noise_std, out.shape[1])
+            out[i] = row
+        return out
+
+
+class SimulatedDevice:
+
+    def __init__(self, device_name: str) -> None:
+        self.name = device_name
+        self.compact_daq_chassis_device = 'Simulated-cDAQ-9171'
+        self.ai_physical_chans = [f'{device_name}/ai{i}' for i in range(4)]
+        self.ai_min_rate = 1651.6129
+        self.ai_max_single_chan_rate = 51200.0
+
+    def reset_device(self) -> None:
+        pass
+
+
+class SimulatedChannel:
+
+    def __init__(self, name: str, sensor_type: str, **kwargs) -> None:
+        self.name = name
+        self.sensor_type = sensor_type
+        self.settings = kwargs
+        # 24-bit ADC over +-5 V, raw code to volt
+        self.ai_dev_scaling_coeff = [0.0, SIMULATED_VOLTS_PER_CODE, 0.0, 0.0]
+
+
+class SimulatedChannelCollection:
+
+    def __init__(self) -> None:
+        self.channels: list[SimulatedChannel] = list()
+
+    @property
+    def channel_names(self) -> list[str]:
+        return [channel.name for channel in self.channels]
+
+    def __len__(self) -> int:
+        return len(self.channels)
+
+    def __getitem__(self, index) -> SimulatedChannel:
+        return self.channels[index]
+
+    def add_ai_accel_chan(self, physical_channel, name_to_assign_to_channel='', **kwargs) -> SimulatedChannel:
+        channel = SimulatedChannel(name_to_assign_to_channel or physical_channel,
+                                   'accelerometer', physical_channel=physical_channel, **kwargs)
+        self.channels.append(channel)
+        return channel
+
+    def add_ai_microphone_chan(self, physical_channel, name_to_assign_to_channel='', **kwargs) -> SimulatedChannel:
+        channel = SimulatedChannel(name_to_assign_to_channel or physical_channel,
+                                   'microphone', physical_channel=physical_channel, **kwargs)
+        self.channels.append(channel)
+        return channel
+
+
+class SimulatedTiming:
+
+    def __init__(self) -> None:
+        self.samp_clk_rate: Optional[float] = None
+        self.samp_quant_samp_mode = None
+
+    def cfg_samp_clk_timing(self, rate, sample_mode=None, **kwargs) -> None:
+        self.samp_clk_rate = float(rate)
+        self.samp_quant_samp_mode = sample_mode
+
+
+class SimulatedInStream:
+    '''
+    Bookkeeping of the simulated DAQmx input buffer.
+
+    `total_samp_per_chan_acquired` is advanced by the sample clock, `curr_read_pos`
+    by the reader. Falling behind by more than `input_buf_size` samples overflows
+    the buffer, the next read then raises like DAQmx does.
+    '''
+
+    def __init__(self) -> None:
+        self.input_buf_size: int = 0
+        # bytes of a raw sample in the buffer, NI9234 codes are 24-bit in 32
+        self.raw_data_width: int = 4
+        self.total_samp_per_chan_acquired: int = 0
+        self.curr_read_pos: int = 0
+        self.overflowed: bool = False
+        self.condition = threading.Condition()
+
+    @property
+    def avail_samp_per_chan(self) -> int:
+        return self.total_samp_per_chan_acquired - self.curr_read_pos
+
+    def reset(self) -> None:
+        with self.condition:
+            self.total_samp_per_chan_acquired = 0
+            self.curr_read_pos = 0
+            self.overflowed = False
+
+    def acquire(self, number_of_samples: int) -> None:
+        with self.condition:
+            self.total_samp_per_chan_acquired += number_of_samples
+            if self.input_buf_size > 0 and self.avail_samp_per_chan > self.input_buf_size:
+                self.overflowed = True
+            self.condition.notify_all()
+
+
+class SimulatedTask:
+    '''
+    Stand-in of `nidaqmx.task.Task` with a software sample clock.
+
+    clock_mode:
+        "realtime" : every-N-samples event fires at the configured sample rate,
+                     a slow callback overflows the input buffer like hardware does
+        "fast"     : event fires as soon as the previous callback returned
+    '''
+
+    clock_modes: tuple = ('realtime', 'fast')
+
+    def __init__(self, new_task_name: str = '', clock_mode: str = 'realtime') -> None:
+        if clock_mode not in self.clock_modes:
+            raise BaseException(
+                f'Illegal clock mode. Legal clock mode : {self.clock_modes}')
+
+        self.name = new_task_name
+        self.clock_mode = clock_mode
+        self.ai_channels = SimulatedChannelCollection()
+        self.timing = SimulatedTiming()
+        self.in_stream = SimulatedInStream()
+        self._handle = id(self)
+        self.sample_interval: Optional[int] = None
+        self.callback_method: Optional[Callable] = None
+        self.running = False
+        self.closed = False
+        self._stop_event = threading.Event()
+        self._pending_events = threading.Semaphore(0)
+        self._clock_thread: Optional[threading.Thread] = None
+        self._dispatch_thread: Optional[threading.Thread] = None
+
+    @property
+    def number_of_channels(self) -> int:
+        return len(self.ai_channels)
+
+    @property
+    def channel_names(self) -> list[str]:
+        return self.ai_channels.channel_names
+
+    def register_every_n_samples_acquired_into_buffer_event(self, sample_interval, callback_method) -> None:
+        self.sample_interval = sample_interval
+        self.callback_method = callback_method
+
+    def start(self) -> None:
+        if self.running:
+            return
+        if self.timing.samp_clk_rate is None or self.sample_interval is None:
+            raise BaseException(
+                'Sample clock and every N samples event must be set before start.')
+
+        self.in_stream.reset()
+        self._stop_event.clear()
+        self._pending_events = threading.Semaphore(0)
+        self.running = True
+        if self.clock_mode == 'realtime':
+            self._clock_thread = threading.Thread(
+                target=self._realtime_clock_loop, name=f'{self.name}-clock', daemon=True)
+            self._dispatch_thread = threading.Thread(
+                target=self._dispatch_loop, name=f'{self.name}-dispatch', daemon=True)
+            self._dispatch_thread.start()
+        else:
+            self._clock_thread = threading.Thread(
+                target=self._fast_clock_loop, name=f'{self.name}-clock', daemon=True)
+        self._clock_thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._pending_events.release()
+        with self.in_stream.condition:
+            self.in_stream.condition.notify_all()
+        for thread in (self._clock_thread, self._dispatch_thread):
+            if thread is not None and thread is not threading.current_thread():
+                thread.join()
+        self._clock_thread = None
+        self._dispatch_thread = None
+        self.running = False
+
+    def close(self) -> None:
+        if self.running:
+            self.stop()
+        self.closed = True
+
+    def _fire_event(self) -> None:
+        if self.callback_method is not None:
+            self.callback_method(self._handle, None, self.sample_interval, None)
+
+    def _realtime_clock_loop(self) -> None:
+        frame_period = self.sample_interval / self.timing.samp_clk_rate
+        start_time = time.perf_counter()
+        frame_index = 0
+        while not self._stop_event.is_set():
+            frame_index += 1
+            delay = start_time + frame_index * frame_period - time.perf_counter()
+            if delay > 0 and self._stop_event.wait(delay):
+                break
+            self.in_stream.acquire(self.sample_interval)
+            self._pending_events.release()
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            self._pending_events.acquire()
+            if self._stop_event.is_set():
+                break
+            self._fire_event()
+
+    def _fast_clock_loop(self) -> None:
+        while not self._stop_event.is_set():
+            self.in_stream.acquire(self.sample_interval)
+            self._fire_event()
+
+
+class SimulatedStreamReader:
+    '''
+    Same reading surface as `nidaqmx.stream_readers.AnalogMultiChannelReader`.
+    '''
+
+    def __init__(self, in_stream: SimulatedInStream, generator: SignalGenerator,
+                 sample_scaling: Optional[dict] = None) -> None:
+        self._in_stream = in_stream
+        self.generator = generator
+        # engineering units to raw code, for `read_int32`
+        if sample_scaling != None:
+            coeffs = np.asarray(sample_scaling['coeffs'])
+            self.code_offsets = (-coeffs[:, 0] / coeffs[:, 1])[:, np.newaxis]
+            self.codes_per_unit = (
+                1.0 / (coeffs[:, 1] * np.asarray(sample_scaling['gains'])))[:, np.newaxis]
+        self.scratch: Optional[npt.NDArray[np.float64]] = None
+
+    def read_int32(self, data: npt.NDArray[np.int32],
+                   number_of_samples_per_channel: int = -1, timeout: float = 10.0) -> int:
+        '''
+        Same as `AnalogUnscaledReader.read_int32`, the signal quantized to raw ADC codes.
+        '''
+        if number_of_samples_per_channel < 0:
+            number_of_samples_per_channel = data.shape[1]
+        if self.scratch is None or self.scratch.shape != (data.shape[0], number_of_samples_per_channel):
+            self.scratch = np.empty(
+                (data.shape[0], number_of_samples_per_channel), dtype=np.float64)
+        self.read_many_sample(self.scratch, number_of_samples_per_channel, timeout)
+        self.scratch *= self.codes_per_unit
+        self.scratch += self.code_offsets
+        np.rint(self.scratch, out=self.scratch)
+        np.clip(self.scratch, -2**23, 2**23 - 1, out=self.scratch)
+        data[:, :number_of_samples_per_channel] = self.scratch
+        return number_of_samples_per_channel
+
+    def read_many_sample(self, data: npt.NDArray[np.float64],
+                         number_of_samples_per_channel: int = -1, timeout: float = 10.0) -> int:
+        if number_of_samples_per_channel < 0:
+            number_of_samples_per_channel = data.shape[1]
+        in_stream = self._in_stream
+        with in_stream.condition:
+            if not in_stream.condition.wait_for(
+                    lambda: in_stream.avail_samp_per_chan >= number_of_samples_per_channel,
+                    timeout=timeout):
+                raise SimulatedDaqError(
+                    'Simulated read timed out before the requested samples were acquired.', -200284)
+            if in_stream.overflowed:
+                raise SimulatedDaqError(
+                    'Attempted to read samples that are no longer available. '
+                    'The simulated input buffer overflowed.', SIMULATED_OVERFLOW_ERROR_CODE)
+            first_sample = in_stream.curr_read_pos
+            in_stream.curr_read_pos += number_of_samples_per_channel
+        self.generator.generate(
+            first_sample, data[:, :number_of_samples_per_channel])
+        return number_of_samples_per_channel
+
+
+class SimulatedNI9234(NI9234):
+    '''
+    Hardware-free NI9234. Everything except the device, task and stream reader is
+    inherited, so the same callback, writers and model code paths are exercised.
+    '''
+
+    def __init__(self, device_name, clock_mode: str = 'realtime', seed: int = 0) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        self.clock_mode = clock_mode
+        self.seed = seed
+        self.channel_signals: dict[int, ChannelSignal] = dict()
+        self.signal_generator: Optional[SignalGenerator] = None
+        super(SimulatedNI9234, self).__init__(device_name=device_name)
+
+    def connect_device(self) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.connect_device)}')
+
+        self.device = SimulatedDevice(self.device_name)
+        self.system = None
+
+    def show_driver_version(self) -> None:
+        print('Driver version: simulated')
+
+    def create_task(self, task_name: str) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.create_task)}')
+
+        if self.task != None:
+            self.close_task()
+        self.task = SimulatedTask(
+            new_task_name=task_name, clock_mode=self.clock_mode)
+        self.channel_gains = list()
+        self.frame_event_registered = False
+        self.sample_clock_rate = None
+
+    def set_channel_signal(self, channel_index: int, channel_signal: ChannelSignal) -> None:
+        '''
+        Override the generated signal of the `channel_index`-th channel in task.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.set_channel_signal)}')
+
+        self.channel_signals[channel_index] = channel_signal
+
+    def build_signal_generator(self) -> SignalGenerator:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.build_signal_generator)}')
+
+        channel_signals = list()
+        for i, channel in enumerate(self.task.ai_channels):
+            if i in self.channel_signals:
+                channel_signals.append(self.channel_signals[i])
+            elif channel.sensor_type == 'microphone':
+                channel_signals.append(default_microphone_signal())
+            else:
+                channel_signals.append(default_accelerometer_signal())
+        return SignalGenerator(self.sample_rate, channel_signals, seed=self.seed)
+
+    def ready_read(self, callback_method=None) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.ready_read)}')
+
+        if callback_method == None:
+            callback_method = self.build_callback()
+        self.register_frame_event(callback_method)
+
+        self.allocate_frame_buffers()
+        self.signal_generator = self.build_signal_generator()
+        self.stream_reader = SimulatedStreamReader(
+            self.task.in_stream, self.signal_generator, self.get_sample_scaling())
+
+
+if __name__ == '__main__':
+    # throughput benchmark: 4 channels at 51.2 kS/s on the "fast" clock
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the acquisition pipeline with a simulated NI9234.')
+    parser.add_argument('--sample-rate', type=float, default=51200)
+    parser.add_argument('--frame-duration', type=int, default=100,
+                        help='millisecond')
+    parser.add_argument('--channels', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5.0,
+                        help='wall time to run the benchmark')
+    parser.add_argument('--clock', choices=SimulatedTask.clock_modes, default='fast')
+    parser.add_argument('--sample-dtype', choices=NI9234.sample_dtypes, default='float64')
+    parser.add_argument('--unscaled', action='store_true',
+                        help='read raw int32 codes')
+    args = parser.parse_args()
+
+    nidaq = SimulatedNI9234(device_name='NI_9234', clock_mode=args.clock)
+    nidaq.create_task(task_name='benchmark')
+    for channel in range(args.channels):
+        nidaq.add_accel_channel(
+            physical_channel=channel, name_to_assign_to_channel='sim',
+            terminal_config='default', min_val=-50.0, max_val=50.0, units='g',
+            sensitivity=100.0, sensitivity_units='millivolts_per_g',
+            current_excit_source='internal', current_excit_val=0.004, custom_scale_name='')
+    nidaq.set_sample_rate(args.sample_rate)
+    nidaq.set_frame_duration(args.frame_duration)
+    nidaq.set_sample_dtype(args.sample_dtype)
+    nidaq.set_read_unscaled(args.unscaled)
+
+    frame_count = 0
+
+    def benchmark_callback(task_handle, every_n_samples_event_type, number_of_samples, callback_data):
+        global frame_count
+        nidaq.read_frame(nidaq.ring_buffer.get_write_frame())
+        nidaq.ring_buffer.commit()
+        frame_count += 1
+        return 0
+
+    nidaq.ready_read(callback_method=benchmark_callback)
+    start_time = time.perf_counter()
+    nidaq.start_task()
+    time.sleep(args.seconds)
+    nidaq.stop_task()
+    elapsed = time.perf_counter() - start_time
+    samples = frame_count * nidaq.frame_size
+    print(f'frames: {frame_count}, samples per channel: {samples}, elapsed: {elapsed:.2f} s')
+    print(f'throughput: {samples / elapsed / 1e3:.1f} kS/s per channel, '
+          f'{samples * args.channels / elapsed / 1e6:.2f} MS/s total '
+          f'({samples / elapsed / args.sample_rate:.1f}x real time)')
+    nidaq.close_task()
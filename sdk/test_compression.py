@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pytest
+
+from sdk.compression import (compress_segment, load_compressed_segment, read_compressed_segment_header,
+                             get_compressed_path, COMPRESSION_CODECS, COMPRESSION_FILTERS, zstandard)
+
+
+def make_samples(dtype: str) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    if np.issubdtype(np.dtype(dtype), np.integer):
+        data = np.cumsum(rng.integers(-1000, 1000, (12800, 4)), axis=0).astype(dtype)
+        # differences of the extremes wrap around
+        data[5, 0] = np.iinfo(dtype).max
+        data[6, 0] = np.iinfo(dtype).min
+        return data
+    return (np.sin(np.arange(12800 * 4).reshape(12800, 4) / 50)
+            + rng.normal(0, 1e-3, (12800, 4))).astype(dtype)
+
+
+@pytest.mark.parametrize('dtype', ['int32', 'float32', 'float64'])
+@pytest.mark.parametrize('filter', COMPRESSION_FILTERS)
+@pytest.mark.parametrize('codec', COMPRESSION_CODECS)
+def test_compress_segment_round_trip(tmp_path, codec, filter, dtype):
+    if codec == 'zstd' and zstandard == None:
+        pytest.skip('zstandard is not installed')
+    data = make_samples(dtype)
+    npy_path = str(tmp_path / '0.npy')
+    np.save(npy_path, data)
+    npy_size = os.path.getsize(npy_path)
+
+    sizes = compress_segment(npy_path, codec, 6, filter)
+
+    compressed_path = get_compressed_path(npy_path)
+    assert not os.path.exists(npy_path)
+    assert sizes == (npy_size, os.path.getsize(compressed_path))
+    header = read_compressed_segment_header(compressed_path)
+    # delta falls back to shuffle for float samples
+    expected_filter = 'shuffle' if filter == 'delta' and dtype != 'int32' else filter
+    assert header['filter'] == expected_filter
+    assert header['codec'] == codec
+    samples = load_compressed_segment(compressed_path)
+    assert samples.dtype == data.dtype
+    assert np.array_equal(samples, data)
+
+
+def test_compress_segment_missing_source(tmp_path):
+    # removed by retention before its turn in the compressor
+    assert compress_segment(str(tmp_path / '0.npy'), 'zlib', 6) == None
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+import pytest
+
+from sdk.frame_index import FrameIndex, rebuild_frame_index
+from sdk.reader import RecordingReader
+from sdk.compression import compress_segment
+from sdk.utils import FRAME_INDEX_FILE_NAME
+
+
+def read_index_file(record_dir: str) -> bytes:
+    with open(os.path.join(record_dir, FRAME_INDEX_FILE_NAME), mode='rb') as file:
+        return file.read()
+
+
+@pytest.mark.parametrize('writer_type', ['segment', 'stream', 'csv', 'event'])
+def test_rebuild_frame_index(record, writer_type):
+    record_dir = record(writer_type)
+    written = read_index_file(record_dir)
+    assert len(FrameIndex(record_dir)) > 0
+
+    frame_count = rebuild_frame_index(record_dir)
+
+    assert frame_count == len(FrameIndex(record_dir))
+    assert read_index_file(record_dir) == written
+
+
+@pytest.mark.parametrize('writer_type', ['segment', 'stream'])
+def test_frame_index_offsets(record, writer_type):
+    record_dir = record(writer_type)
+    frame_index = FrameIndex(record_dir)
+    with RecordingReader(record_dir, scaled=False) as reader:
+        frame_bytes = reader.channel_count * reader.raw_dtype.itemsize
+        for row in range(len(frame_index)):
+            with open(frame_index.get_file_path(row), mode='rb') as file:
+                file.seek(int(frame_index.records['offset'][row]))
+                first = np.frombuffer(file.read(frame_bytes), dtype=reader.raw_dtype)
+            assert np.array_equal(first, reader[:, int(frame_index.records['sample'][row])])
+        assert frame_index.find_sample(2 * 1280 + 5) == 2
+        wall_ns = int(frame_index.records['wall_ns'][3])
+        assert reader.wall_time_to_sample(wall_ns) == int(frame_index.records['sample'][3]) + 1280
+
+
+def test_rebuild_frame_index_compressed(record):
+    record_dir = record('segment')
+    written = read_index_file(record_dir)
+    for name in sorted(os.listdir(record_dir)):
+        if name.endswith('.npy'):
+            compress_segment(os.path.join(record_dir, name), 'zlib', 6, 'shuffle')
+
+    rebuild_frame_index(record_dir)
+
+    # offsets refer to the *.npy of a compressed segment
+    assert read_index_file(record_dir) == written
+    assert np.all(np.diff(FrameIndex(record_dir).records['sample']) == 1280)
@@ -0,0 +1,68 @@
+import asyncio
+
+import numpy as np
+
+
+def get_frame_consumers(nidaq) -> list:
+    return [name for name in nidaq.ring_buffer.consumers if name.startswith('frames-')]
+
+
+def test_frames_end_on_stop(nidaq):
+    nidaq.ready_read()
+
+    async def record() -> list:
+        frames = list()
+
+        async def collect():
+            async for sequence, frame, tag in nidaq.frames():
+                frames.append((sequence, frame, tag))
+                if len(frames) == 10:
+                    await nidaq.async_stop_task()
+
+        await nidaq.async_start_task()
+        await asyncio.wait_for(collect(), timeout=10)
+        return frames
+
+    frames = asyncio.run(record())
+
+    assert len(frames) >= 10
+    sequences = [sequence for sequence, _, _ in frames]
+    assert sequences == sorted(set(sequences))
+    for sequence, frame, tag in frames:
+        assert frame.shape == (2, nidaq.frame_size)
+        assert tag[0] == sequence * nidaq.frame_size
+    # copies, not ring slots
+    assert not np.shares_memory(frames[0][1], nidaq.ring_buffer.frames)
+    assert nidaq.frame_listeners == []
+    assert get_frame_consumers(nidaq) == []
+
+
+def test_frames_cleanup_on_cancel(nidaq):
+    nidaq.ready_read()
+
+    async def record() -> int:
+        received = asyncio.Event()
+        frame_count = 0
+
+        async def collect():
+            nonlocal frame_count
+            async for _ in nidaq.frames(copy=False):
+                frame_count += 1
+                received.set()
+
+        await nidaq.async_start_task()
+        task = asyncio.create_task(collect())
+        await asyncio.wait_for(received.wait(), timeout=10)
+        assert len(nidaq.frame_listeners) == 1
+        assert len(get_frame_consumers(nidaq)) == 1
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await nidaq.async_stop_task()
+        return frame_count
+
+    assert asyncio.run(record()) > 0
+    assert nidaq.frame_listeners == []
+    assert get_frame_consumers(nidaq) == []
@@ -0,0 +1,135 @@
+import time
+
+import numpy as np
+
+from sdk.frame_index import FrameIndex
+from sdk.utils import open_binary_stream, FRAME_TAG_FILE_NAME
+
+
+def refuse_second_registration(task, monkeypatch) -> list:
+    '''
+    Make the simulated task refuse a second every N samples callback like DAQmx,
+    return the list of registered sample intervals, `None` for an unregistration.
+    '''
+    register = task.register_every_n_samples_acquired_into_buffer_event
+    registrations = list()
+
+    def strict_register(sample_interval, callback_method) -> None:
+        if callback_method != None and task.callback_method != None:
+            raise BaseException('Every N samples event is already registered.')
+        registrations.append(None if callback_method == None else sample_interval)
+        register(sample_interval, callback_method)
+
+    monkeypatch.setattr(task, 'register_every_n_samples_acquired_into_buffer_event', strict_register)
+    return registrations
+
+
+def run_frames(nidaq, frame_count: int = 5) -> np.ndarray:
+    '''
+    Acquire at least `frame_count` frames, return the tags of the frames in ring.
+    '''
+    nidaq.start_task()
+    while nidaq.ring_buffer.write_sequence < frame_count:
+        time.sleep(0.01)
+    nidaq.stop_task()
+    sequences = range(max(0, nidaq.ring_buffer.write_sequence - nidaq.ring_buffer.slot_count + 1),
+                      nidaq.ring_buffer.write_sequence)
+    return np.array([nidaq.ring_buffer.get_frame_tag(sequence) for sequence in sequences])
+
+
+def test_set_timing_reregisters_frame_event(nidaq, monkeypatch):
+    registrations = refuse_second_registration(nidaq.task, monkeypatch)
+    nidaq.ready_read()
+    tags = run_frames(nidaq)
+    assert np.all(np.diff(tags[:, 0]) == 1280)
+
+    # new sample rate: the clock is reconfigured, the frame event follows the frame size
+    nidaq.set_timing(25600, 100)
+    nidaq.ready_read()
+    assert nidaq.task.timing.samp_clk_rate == 25600
+    assert nidaq.ring_buffer.frames.shape[1:] == (2, 2560)
+    tags = run_frames(nidaq)
+    assert np.all(np.diff(tags[:, 0]) == 2560)
+
+    # new frame duration only
+    nidaq.set_timing(25600, 200)
+    nidaq.ready_read()
+    assert nidaq.ring_buffer.frames.shape[1:] == (2, 5120)
+    tags = run_frames(nidaq)
+    assert np.all(np.diff(tags[:, 0]) == 5120)
+    assert nidaq.get_frame_stats()['gap_count'] == 0
+
+    assert registrations == [1280, None, 2560, None, 5120]
+
+
+def test_ready_read_twice(nidaq, monkeypatch):
+    registrations = refuse_second_registration(nidaq.task, monkeypatch)
+    nidaq.ready_read()
+    nidaq.ready_read()
+    run_frames(nidaq)
+    assert registrations == [1280, None, 1280]
+
+
+def test_set_timing_fresh_task(nidaq):
+    # a new task at the rate of the task before it still needs its sample clock
+    nidaq.create_task(task_name='again')
+    for channel in range(2):
+        nidaq.add_accel_channel(
+            physical_channel=channel, name_to_assign_to_channel='sim',
+            terminal_config='default', min_val=-50.0, max_val=50.0, units='g',
+            sensitivity=100.0, sensitivity_units='millivolts_per_g',
+            current_excit_source='internal', current_excit_val=0.004, custom_scale_name='')
+    nidaq.set_timing(12800, 100)
+    nidaq.ready_read()
+    assert nidaq.task.timing.samp_clk_rate == 12800
+    tags = run_frames(nidaq)
+    assert np.all(np.diff(tags[:, 0]) == 1280)
+
+
+def write_frames(nidaq, frame_count: int) -> None:
+    '''
+    Queue `frame_count` frames to the writer like the callback does.
+    '''
+    ring_buffer = nidaq.ring_buffer
+    for _ in range(frame_count):
+        chunk = ring_buffer.get_write_frame()
+        sequence = ring_buffer.commit(ring_buffer.write_sequence * nidaq.frame_size, 0, 0)
+        nidaq.background_writer.put(chunk, transpose=True, sequence=sequence,
+                                    tag=ring_buffer.get_frame_tag(sequence))
+
+
+def test_close_writer_on_segment_boundary(nidaq, tmp_path):
+    nidaq.ready_read()
+    for name, frame_count in (('first', 10), ('second', 3)):
+        record_dir = tmp_path / name
+        record_dir.mkdir()
+        # 5 frames per segment, the first recording stops right after closing a segment
+        nidaq.open_writer('segment', str(record_dir), segment_period=0.5)
+        nidaq.set_writer_enable()
+        write_frames(nidaq, frame_count)
+        nidaq.background_writer.flush()
+        # between segments the recording is still open
+        assert nidaq.is_writer_open()
+        nidaq.close_writer()
+        assert not nidaq.is_writer_open()
+
+    for name, frame_count in (('first', 10), ('second', 3)):
+        record_dir = tmp_path / name
+        with open(record_dir / FRAME_TAG_FILE_NAME) as file:
+            assert len(file.readlines()) == frame_count + 1
+        assert len(FrameIndex(str(record_dir))) == frame_count
+
+
+def test_unscaled_stream_on_reused_task(nidaq, tmp_path):
+    nidaq.set_read_unscaled(True)
+    nidaq.ready_read()
+    # a reused task is not made ready again, its stream settings are applied anyway
+    nidaq.set_stream_sample_dtype('float32')
+    nidaq.open_writer('stream', str(tmp_path), file_name='stream', header=dict())
+    nidaq.set_writer_enable()
+    write_frames(nidaq, 3)
+    nidaq.close_writer()
+
+    samples = open_binary_stream(str(tmp_path / 'stream.bin'))
+    assert samples.dtype == np.dtype('<i4')
+    assert samples.shape == (3 * nidaq.frame_size, 2)
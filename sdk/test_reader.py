@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pytest
+
+from sdk.reader import RecordingReader
+from sdk.utils import open_binary_stream, FRAME_TAG_FILE_NAME
+from sdk.dsp import SampleScaler
+from sdk.compression import compress_segment, get_compressed_path, load_compressed_segment
+
+
+def load_samples(record_dir: str, writer_type: str) -> np.ndarray:
+    '''
+    (channels, samples) of the files of a recording, read without `RecordingReader`.
+    '''
+    file_names = sorted(os.listdir(record_dir))
+    if writer_type in ('segment', 'event'):
+        with RecordingReader(record_dir) as reader:
+            names = [segment['file_name'] for segment in reader.task_params['segments']]
+        return np.concatenate([np.load(os.path.join(record_dir, name)) for name in names]).T
+    if writer_type == 'stream':
+        name, = [name for name in file_names if name.endswith('.bin')]
+        return np.asarray(open_binary_stream(os.path.join(record_dir, name))).T
+    name, = [name for name in file_names if name.endswith('.csv') and name != FRAME_TAG_FILE_NAME]
+    return np.loadtxt(os.path.join(record_dir, name), delimiter=',', ndmin=2).T
+
+
+@pytest.mark.parametrize('writer_type, read_unscaled', [
+    ('segment', False), ('segment', True), ('stream', False), ('stream', True), ('csv', False), ('event', False)])
+def test_reader(record, writer_type, read_unscaled):
+    record_dir = record(writer_type, read_unscaled=read_unscaled)
+    samples = load_samples(record_dir, writer_type)
+
+    with RecordingReader(record_dir) as reader:
+        if read_unscaled:
+            assert reader.raw_dtype == np.dtype(np.int32)
+            samples = SampleScaler(**reader.sample_scaling)(samples)
+        assert reader.shape == samples.shape
+        assert np.array_equal(reader[:, :], samples)
+        start, stop = reader.sample_count // 3 + 7, 2 * reader.sample_count // 3 + 11
+        assert np.array_equal(reader[reader.channel_names[1], start:stop], samples[1:2, start:stop])
+        assert np.array_equal(reader[[1, 0], start:stop:3], samples[[1, 0], start:stop:3])
+        assert np.array_equal(reader[::-1, 5], samples[::-1, 5])
+        assert np.array_equal(reader.read_time(0.25, 0.5), samples[:, 3200:6400])
+        chunks = [chunk for _, chunk in reader.iter_chunks(chunk_size=1000)]
+        assert np.array_equal(np.concatenate(chunks, axis=1), samples)
+
+
+def test_reader_event(record):
+    record_dir = record('event')
+    with RecordingReader(record_dir) as reader:
+        events = reader.events
+        samples = reader[:, :]
+    assert len(events) > 0
+    start = 0
+    for event in events:
+        with RecordingReader(record_dir, event=event['event']) as reader:
+            assert reader.shape == (2, event['frame_count'] * 1280)
+            assert np.array_equal(reader[:, :], samples[:, start:start + reader.sample_count])
+            start += reader.sample_count
+    assert start == samples.shape[1]
+
+
+@pytest.mark.parametrize('writer_type', ['segment', 'event'])
+def test_reader_compressed_segments(record, writer_type):
+    record_dir = record(writer_type)
+    samples = load_samples(record_dir, writer_type)
+    names = [name for name in sorted(os.listdir(record_dir)) if name.endswith('.npy')]
+    assert len(names) > 1
+
+    # compressed and uncompressed segments in one recording
+    for name in names[::2]:
+        compress_segment(os.path.join(record_dir, name), 'zlib', 6, 'shuffle')
+        assert os.path.exists(get_compressed_path(os.path.join(record_dir, name)))
+    with RecordingReader(record_dir) as reader:
+        assert np.array_equal(reader[:, :], samples)
+        assert np.array_equal(reader[:, 1000:9000], samples[:, 1000:9000])
+        chunks = [chunk for _, chunk in reader.iter_chunks(chunk_size=1000)]
+        assert np.array_equal(np.concatenate(chunks, axis=1), samples)
+
+    for name in names[1::2]:
+        compress_segment(os.path.join(record_dir, name), 'lzma', 6, 'delta')
+    with RecordingReader(record_dir) as reader:
+        assert np.array_equal(reader[:, :], samples)
+
+
+def test_reader_compressed_recording(record):
+    record_dir = record('segment', compression={'codec': 'zlib', 'level': 6, 'filter': 'shuffle', 'workers': 2})
+    with RecordingReader(record_dir) as reader:
+        names = [segment['file_name'] for segment in reader.task_params['segments']]
+        assert not any(os.path.exists(os.path.join(record_dir, name)) for name in names)
+        samples = np.concatenate([load_compressed_segment(get_compressed_path(os.path.join(record_dir, name)))
+                                  for name in names]).T
+        assert reader.shape == samples.shape == (2, reader.task_params['frame_count'] * 1280)
+        assert np.array_equal(reader[:, :], samples)
+        assert np.array_equal(reader[1, 3000:5000], samples[1:2, 3000:5000])
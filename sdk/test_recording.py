@@ -0,0 +1,90 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+from sdk.utils import open_binary_stream, FRAME_TAG_FILE_NAME, PROGRESS_LOG_FILE_NAME
+from sdk.recording import ProgressLog, merge_progress_log
+
+
+def load_cfg(record_dir: str) -> dict:
+    with open(os.path.join(record_dir, 'cfg.json')) as file:
+        return json.load(file)
+
+
+def count_samples(record_dir: str, writer_type: str) -> int:
+    file_names = sorted(os.listdir(record_dir))
+    if writer_type in ('segment', 'event'):
+        return sum(np.load(os.path.join(record_dir, name), mmap_mode='r').shape[0]
+                   for name in file_names if name.endswith('.npy'))
+    if writer_type == 'stream':
+        name, = [name for name in file_names if name.endswith('.bin')]
+        return open_binary_stream(os.path.join(record_dir, name)).shape[0]
+    name, = [name for name in file_names if name.endswith('.csv') and name != FRAME_TAG_FILE_NAME]
+    return np.loadtxt(os.path.join(record_dir, name), delimiter=',', ndmin=2).shape[0]
+
+
+@pytest.mark.parametrize('writer_type', ['segment', 'stream', 'csv', 'event'])
+def test_recorder_run(record, writer_type):
+    record_dir = record(writer_type, duration=1.0)
+
+    task_params = load_cfg(record_dir)
+    assert task_params['writer_type'] == writer_type
+    assert task_params['frame_count'] > 0
+    assert count_samples(record_dir, writer_type) == task_params['frame_count'] * 1280
+    with open(os.path.join(record_dir, FRAME_TAG_FILE_NAME)) as file:
+        assert len(file.readlines()) == task_params['frame_count'] + 1
+
+
+def make_writer_state(frame_count: int, segment_count: int) -> dict:
+    return {
+        'frame_count': frame_count,
+        'segments': [{'file_name': f'{number}.npy', 'frame_count': 5} for number in range(segment_count)],
+        'events': [{'event': 0, 'first_segment': 0, 'frame_count': frame_count, 'segments': list()}],
+    }
+
+
+def test_merge_progress_log(tmp_path):
+    progress_log = ProgressLog(str(tmp_path))
+    assert progress_log.append(make_writer_state(5, 1), {'lost': 0})
+    assert not progress_log.append(make_writer_state(5, 1), {'lost': 0})
+    assert progress_log.append(make_writer_state(12, 2), {'lost': 1})
+    progress_log.close()
+
+    task_params = merge_progress_log({'frame_count': 0, 'segments': list(), 'events': list()}, str(tmp_path))
+
+    assert task_params['frame_count'] == 12
+    assert task_params['frame_stats'] == {'lost': 1}
+    assert [segment['file_name'] for segment in task_params['segments']] == ['0.npy', '1.npy']
+    assert [event['frame_count'] for event in task_params['events']] == [12]
+
+
+def test_merge_progress_log_torn_line(tmp_path):
+    progress_log = ProgressLog(str(tmp_path))
+    progress_log.append(make_writer_state(5, 1), {'lost': 0})
+    progress_log.close()
+    line = json.dumps({'frame_count': 20, 'frame_stats': {'lost': 0}, 'segments': list(), 'events': list()})
+    with open(os.path.join(tmp_path, PROGRESS_LOG_FILE_NAME), mode='a') as file:
+        # crash in the middle of a line
+        file.write(line[:len(line) // 2])
+
+    task_params = merge_progress_log({'frame_count': 0}, str(tmp_path))
+
+    assert task_params['frame_count'] == 5
+    assert [segment['file_name'] for segment in task_params['segments']] == ['0.npy']
+    assert len(task_params['events']) == 1
+
+
+def test_merge_progress_log_keeps_cfg(tmp_path):
+    progress_log = ProgressLog(str(tmp_path))
+    progress_log.append(make_writer_state(5, 1), {'lost': 0})
+    progress_log.close()
+    segment = {'file_name': '0.npy', 'frame_count': 5}
+
+    task_params = merge_progress_log({'frame_count': 10, 'frame_stats': {'lost': 2}, 'segments': [segment]},
+                                     str(tmp_path))
+
+    assert task_params['frame_count'] == 10
+    assert task_params['frame_stats'] == {'lost': 2}
+    assert task_params['segments'] == [segment]
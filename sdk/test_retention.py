@@ -0,0 +1,170 @@
+import os
+import json
+
+import numpy as np
+
+from sdk.retention import RetentionManager, get_dir_size
+from sdk.reader import RecordingReader
+from sdk.utils import PROGRESS_LOG_FILE_NAME
+from sdk.compression import get_segment_path, load_compressed_segment
+
+
+MB = 1024 * 1024
+UNPROTECTED_TRIGGER = {'pre_trigger': 0.2, 'post_trigger': 0.3,
+                       'conditions': [{'channel': 0, 'metric': 'peak', 'threshold': 0.25}]}
+
+
+def list_segments(record_dir: str) -> list[str]:
+    return sorted((name for name in os.listdir(record_dir) if name.endswith(('.npy', '.npyz'))),
+                  key=lambda name: int(name.split('.')[0].split('_')[-1]))
+
+
+def edit_cfg(record_dir: str, **task_params) -> None:
+    '''
+    Overwrite `task_params` in cfg.json, without the progress log adding them back.
+    '''
+    cfg_path = os.path.join(record_dir, 'cfg.json')
+    with open(cfg_path) as file:
+        cfg = json.load(file)
+    cfg.update(task_params)
+    with open(cfg_path, mode='w') as file:
+        json.dump(cfg, file)
+    if os.path.exists(os.path.join(record_dir, PROGRESS_LOG_FILE_NAME)):
+        os.remove(os.path.join(record_dir, PROGRESS_LOG_FILE_NAME))
+
+
+def test_retention_removes_oldest_segments(record):
+    record_dir = record('segment')
+    task_dir = os.path.dirname(record_dir)
+    names = list_segments(record_dir)
+    segment_size = os.path.getsize(os.path.join(record_dir, names[0]))
+    retention = RetentionManager(task_dir, max_size=(get_dir_size(task_dir) - 2.5 * segment_size) / MB)
+
+    stats = retention.enforce()
+
+    assert stats['removed_count'] == 3
+    assert list_segments(record_dir) == names[3:]
+    assert not stats['blocked']
+    with RecordingReader(record_dir) as reader:
+        assert reader.removed_sample_count == 3 * np.load(
+            os.path.join(record_dir, names[3]), mmap_mode='r').shape[0]
+
+
+def test_retention_archive(record, tmp_path):
+    record_dir = record('segment')
+    task_dir = os.path.dirname(record_dir)
+    names = list_segments(record_dir)
+    archive_dir = str(tmp_path / 'archive')
+    retention = RetentionManager(task_dir, max_size=1e-6, archive_dir=archive_dir)
+
+    retention.enforce()
+
+    # a finished recording left without data is removed with its metadata
+    assert not os.path.exists(record_dir)
+    archived_dir = os.path.join(archive_dir, os.path.relpath(record_dir, os.path.dirname(task_dir)))
+    assert list_segments(archived_dir) == names
+    assert os.path.exists(os.path.join(archived_dir, 'cfg.json'))
+
+
+def test_retention_keeps_active_segment(record):
+    record_dir = record('segment')
+    task_dir = os.path.dirname(record_dir)
+    names = list_segments(record_dir)
+    # cfg.json of a recording just started, its newest segment may be written
+    edit_cfg(record_dir, segments=list(), frame_count=0)
+    retention = RetentionManager(task_dir, max_size=1e-6)
+    retention.set_active_record_dir(record_dir)
+
+    stats = retention.enforce()
+
+    assert list_segments(record_dir) == names[-1:]
+    assert stats['blocked']
+    retention.set_active_record_dir(None)
+    retention.enforce()
+    assert not os.path.exists(record_dir)
+
+
+def test_retention_keeps_protected_events(record):
+    record_dir = record('event')
+    task_dir = os.path.dirname(record_dir)
+    names = list_segments(record_dir)
+    with RecordingReader(record_dir) as reader:
+        events = reader.events
+    assert len(events) > 1
+    # fired by the peak condition of ./models/cfg_ni9234.json, which has "protect"
+    assert all(event['protected'] for event in events)
+    retention = RetentionManager(task_dir, max_size=1e-6)
+
+    stats = retention.enforce()
+
+    assert list_segments(record_dir) == names
+    assert stats['blocked']
+
+    events[0]['protected'] = False
+    edit_cfg(record_dir, events=events)
+    retention.enforce()
+    assert list_segments(record_dir) == [name for name in names if name not in events[0]['segments']]
+
+
+def test_retention_keeps_newest_events(record):
+    record_dir = record('event', trigger=UNPROTECTED_TRIGGER)
+    task_dir = os.path.dirname(record_dir)
+    with RecordingReader(record_dir) as reader:
+        events = reader.events
+    assert len(events) > 2
+    assert not any(event['protected'] for event in events)
+    retention = RetentionManager(task_dir, max_size=1e-6, keep_events=2)
+
+    stats = retention.enforce()
+
+    assert list_segments(record_dir) == events[-2]['segments'] + events[-1]['segments']
+    assert stats['blocked']
+
+
+def test_retention_keeps_unlisted_event_segments(record):
+    record_dir = record('event', trigger=UNPROTECTED_TRIGGER)
+    task_dir = os.path.dirname(record_dir)
+    names = list_segments(record_dir)
+    # the manifest of a recording lags behind its event segments
+    edit_cfg(record_dir, segments=list(), events=list())
+    retention = RetentionManager(task_dir, max_size=1e-6)
+
+    stats = retention.enforce()
+
+    assert list_segments(record_dir) == names
+    assert stats['blocked']
+
+
+def test_retention_skips_pending_segments(record):
+    record_dir = record('segment')
+    task_dir = os.path.dirname(record_dir)
+    names = list_segments(record_dir)
+    pending_paths = [os.path.join(record_dir, names[0]), os.path.join(record_dir, names[2])]
+    retention = RetentionManager(task_dir, max_size=1e-6, pending_segments=lambda: pending_paths)
+
+    stats = retention.enforce()
+
+    # no gap behind the pending oldest segment
+    assert list_segments(record_dir) == names
+    assert stats['blocked']
+
+    pending_paths.remove(os.path.join(record_dir, names[0]))
+    retention.enforce()
+    assert list_segments(record_dir) == names[2:]
+
+
+def test_retention_while_recording(record):
+    retention = {'max_size': 0.3, 'max_age': 0, 'interval': 0.05, 'archive_dir': None, 'keep_events': 0}
+    record_dir = record('segment', duration=2.0, retention=retention,
+                        compression={'codec': 'zlib', 'level': 1, 'filter': 'shuffle', 'workers': 2})
+
+    with RecordingReader(record_dir) as reader:
+        segments = reader.task_params['segments']
+        assert reader.removed_sample_count > 0
+        # the last segment was open when the recording stopped
+        last_path = get_segment_path(os.path.join(record_dir, segments[-1]['file_name']))
+        last_segment = load_compressed_segment(last_path)
+        assert last_segment.shape[0] == segments[-1]['sample_count']
+        assert reader.sample_count == sum(segment['sample_count'] for segment in segments) \
+            - reader.removed_sample_count
+        assert np.array_equal(reader[:, -1280:], last_segment[-1280:].T)
@@ -0,0 +1,73 @@
+import time
+
+import numpy as np
+
+from sdk.ring_buffer import FrameRingBuffer
+
+
+def commit_frames(ring_buffer: FrameRingBuffer, count: int) -> None:
+    for _ in range(count):
+        # every sample of a frame holds its sequence number
+        ring_buffer.get_write_frame()[:] = ring_buffer.write_sequence
+        ring_buffer.commit()
+
+
+def test_consumer_reads_every_frame_once():
+    ring_buffer = FrameRingBuffer(slot_count=4, channel_count=2, frame_size=8)
+    consumer = ring_buffer.register_consumer('test')
+    for expected in range(10):
+        commit_frames(ring_buffer, 1)
+        sequence, frame = consumer.read()
+        assert sequence == expected
+        assert np.all(frame == expected)
+        assert consumer.read() == None
+    assert consumer.overrun_count == 0
+    assert consumer.lost_frame_count == 0
+
+
+def test_consumer_overrun_accounting():
+    ring_buffer = FrameRingBuffer(slot_count=4, channel_count=2, frame_size=8)
+    lagging = ring_buffer.register_consumer('lagging')
+    following = ring_buffer.register_consumer('following')
+    for _ in range(10):
+        commit_frames(ring_buffer, 1)
+        assert following.read()[0] == ring_buffer.write_sequence - 1
+
+    # the slot after the newest frame may be filling, 3 of 4 slots are readable
+    sequences = [sequence for sequence, frame in lagging.read_all() if np.all(frame == sequence)]
+    assert sequences == [7, 8, 9]
+    assert lagging.overrun_count == 1
+    assert lagging.lost_frame_count == 7
+    assert following.overrun_count == 0
+
+    commit_frames(ring_buffer, 2)
+    assert [sequence for sequence, _ in lagging.read_all()] == [10, 11]
+    assert lagging.overrun_count == 1
+    assert lagging.lost_frame_count == 7
+
+
+def test_consumer_from_oldest():
+    ring_buffer = FrameRingBuffer(slot_count=4, channel_count=2, frame_size=8)
+    commit_frames(ring_buffer, 6)
+    consumer = ring_buffer.register_consumer('test', from_latest=False)
+    assert [sequence for sequence, _ in consumer.read_all()] == [3, 4, 5]
+    assert consumer.overrun_count == 0
+
+
+def test_simulated_overrun_accounting(nidaq):
+    def callback(task_handle, every_n_samples_event_type, number_of_samples, callback_data):
+        nidaq.stream_reader.read_many_sample(nidaq.ring_buffer.get_write_frame())
+        nidaq.ring_buffer.commit()
+        return 0
+
+    nidaq.ready_read(callback_method=callback)
+    consumer = nidaq.ring_buffer.register_consumer('test')
+    nidaq.start_task()
+    while nidaq.ring_buffer.write_sequence < 3 * nidaq.ring_buffer.slot_count:
+        time.sleep(0.01)
+    nidaq.stop_task()
+
+    sequences = [sequence for sequence, _ in consumer.read_all()]
+    assert consumer.overrun_count == 1
+    assert consumer.lost_frame_count + len(sequences) == nidaq.ring_buffer.write_sequence
+    assert sequences == list(range(sequences[0], nidaq.ring_buffer.write_sequence))
@@ -0,0 +1,78 @@
+import os
+import time
+
+import numpy as np
+
+from sdk.trigger import TriggerEngine, EventWriter
+from sdk.utils import FRAME_TAG_FILE_NAME
+
+
+def read_tag_rows(directory) -> np.ndarray:
+    # frame, sequence, first_sample, monotonic_ns, wall_ns
+    return np.loadtxt(os.path.join(directory, FRAME_TAG_FILE_NAME), delimiter=',',
+                      skiprows=1, dtype=np.int64, ndmin=2)
+
+
+def test_event_writer_framing(tmp_path):
+    writer = EventWriter(directory=str(tmp_path))
+    writer.reset_write_file_count()
+    engine = TriggerEngine([{'channel': 0, 'metric': 'peak', 'threshold': 100.0}], sample_rate=80)
+    # 2 pre-trigger and 3 post-trigger frames of 100 ms
+    writer.configure(engine, pre_trigger=0.2, post_trigger=0.3, frame_duration=100)
+    firing = (5, 12, 14)
+    for sequence in range(20):
+        # (channels, samples) as queued by the callback, samples hold the sequence number
+        chunk = np.full((2, 8), 1000.0 + sequence if sequence in firing else sequence)
+        writer.write(chunk, transpose=True)
+        writer.write_tag(sequence, (sequence * 8, sequence, 1000 + sequence))
+    writer.close_file()
+
+    first, second = writer.events
+    assert (first['first_frame'], first['frame_count'], first['pre_trigger_frame_count']) == (0, 6, 2)
+    assert (first['trigger_frame'], first['trigger_count']) == (5, 1)
+    assert (first['trigger_first_sample'], first['trigger_wall_ns']) == (40, 1005)
+    assert first['segments'] == ['event_0.npy']
+    # re-triggered by frame 14, its post-trigger window ends with frame 17
+    assert (second['first_frame'], second['frame_count'], second['pre_trigger_frame_count']) == (6, 8, 2)
+    assert (second['trigger_frame'], second['trigger_count']) == (12, 2)
+    assert (second['trigger_first_sample'], second['trigger_wall_ns']) == (96, 1012)
+    assert second['segments'] == ['event_1.npy', 'event_2.npy']
+
+    recorded = [3, 4, 5, 6, 7, 8, 10, 11, 12, 13, 14, 15, 16, 17]
+    samples = np.concatenate([np.load(os.path.join(tmp_path, f'event_{number}.npy')) for number in range(3)])
+    assert samples.shape == (len(recorded) * 8, 2)
+    assert np.array_equal(samples[::8, 0] % 1000, recorded)
+    rows = read_tag_rows(tmp_path)
+    assert rows[:, 0].tolist() == list(range(len(recorded)))
+    assert rows[:, 1].tolist() == recorded
+    assert np.array_equal(rows[:, 2], rows[:, 1] * 8)
+    assert np.array_equal(rows[:, 4], rows[:, 1] + 1000)
+
+
+def test_simulated_event_recording(nidaq, tmp_path):
+    nidaq.ready_read()
+    nidaq.open_writer('event', str(tmp_path), trigger={
+        'conditions': [{'channel': 0, 'metric': 'peak', 'threshold': 0.25}],
+        'pre_trigger': 0.2, 'post_trigger': 0.3})
+    nidaq.set_writer_enable()
+    nidaq.start_task()
+    deadline = time.perf_counter() + 10
+    while len(nidaq.get_writer_state()['events']) < 3 and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    nidaq.stop_task()
+    nidaq.close_writer()
+
+    events = nidaq.get_writer_state()['events']
+    assert len(events) >= 3
+    rows = read_tag_rows(tmp_path)
+    for event in events:
+        event_rows = rows[event['first_frame']:event['first_frame'] + event['frame_count']]
+        assert event['frame_count'] > event['pre_trigger_frame_count']
+        # the frames of an event are consecutive, the pre-trigger frames come first
+        assert np.all(np.diff(event_rows[:, 1]) == 1)
+        assert np.all(np.diff(event_rows[:, 2]) == nidaq.frame_size)
+        trigger_row = event_rows[event['pre_trigger_frame_count']]
+        assert trigger_row[2] == event['trigger_first_sample']
+        sample_count = sum(np.load(os.path.join(tmp_path, name), mmap_mode='r').shape[0]
+                           for name in event['segments'])
+        assert sample_count == event['frame_count'] * nidaq.frame_size
@@ -0,0 +1,36 @@
+import os
+
+import numpy as np
+import pytest
+
+from sdk.utils import BinaryStreamWriter, open_binary_stream, read_binary_stream_header
+
+
+def open_stream_writer(directory, header: dict) -> BinaryStreamWriter:
+    writer = BinaryStreamWriter(directory=str(directory))
+    writer.set_file_name('stream.bin')
+    writer.set_header(header)
+    writer.open_file()
+    return writer
+
+
+def test_binary_stream_channel_count(tmp_path):
+    # task params listing more channels than the frames hold
+    writer = open_stream_writer(tmp_path, {'channels': [0, 1, 2]})
+    frames = np.arange(2 * 2 * 8, dtype=np.float32).reshape(2, 2, 8)
+    for frame in frames:
+        writer.write(frame, transpose=True)
+    writer.close_file()
+
+    path = os.path.join(tmp_path, 'stream.bin')
+    assert read_binary_stream_header(path)['channel_count'] == 2
+    assert np.array_equal(open_binary_stream(path), np.concatenate([frame.T for frame in frames]))
+
+
+def test_binary_stream_without_frames(tmp_path):
+    open_stream_writer(tmp_path, {'channels': [0, 1]}).close_file()
+    assert open_binary_stream(os.path.join(tmp_path, 'stream.bin')).shape == (0, 2)
+
+    open_stream_writer(tmp_path, {'channels': list()}).close_file()
+    with pytest.raises(BaseException, match='no channels'):
+        open_binary_stream(os.path.join(tmp_path, 'stream.bin'))
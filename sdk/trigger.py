@@ -0,0 +1,263 @@
+from typing import Optional
+import dataclasses
+import math
+
+import numpy as np
+import numpy.typing as npt
+
+from .dsp import SampleScaler
+from .utils import StorageTools, NPYWriter, get_func_name
+from debug_flags import PRINT_FUNC_NAME_FLAG
+
+
+TRIGGER_METRICS = ('rms', 'peak', 'band')
+
+
+@dataclasses.dataclass
+class TriggerCondition:
+    '''
+    channel: index of the channel in task
+    metric: "rms", "peak" (max absolute value) or "band" (RMS within `band`) of a frame
+    threshold: engineering units, g / Pa
+    band: (low, high) Hz, "band" metric only
+    protect: events fired by this condition are never removed by retention
+    '''
+    channel: int
+    metric: str
+    threshold: float
+    band: tuple = (0.0, 0.0)
+    protect: bool = False
+
+    def __post_init__(self):
+        if self.metric not in TRIGGER_METRICS:
+            raise BaseException(
+                f'Illegal trigger metric. Legal metric : {TRIGGER_METRICS}')
+        self.band = tuple(self.band)
+
+
+class TriggerEngine:
+    '''
+    Evaluate trigger conditions on a frame, the frame fires when any condition
+    reaches its threshold.
+
+    conditions: `TriggerCondition` or its fields as dict
+    scaler: for frames of unscaled samples
+    '''
+
+    def __init__(self, conditions: list, sample_rate: float, scaler: Optional[SampleScaler] = None) -> None:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        self.conditions: list[TriggerCondition] = [
+            condition if isinstance(condition, TriggerCondition) else TriggerCondition(**condition)
+            for condition in conditions]
+        if len(self.conditions) == 0:
+            raise BaseException('At least one trigger condition is required.')
+        self.sample_rate = sample_rate
+        self.scaler = scaler
+        # (band, frame size) -> rfft bins within band
+        self.band_masks: dict = dict()
+
+    def get_band_mask(self, band: tuple, sample_count: int) -> npt.NDArray[np.bool_]:
+        key = (band, sample_count)
+        if key not in self.band_masks:
+            freqs = np.fft.rfftfreq(sample_count, 1 / self.sample_rate)
+            self.band_masks[key] = (freqs >= band[0]) & (freqs <= band[1])
+        return self.band_masks[key]
+
+    def measure(self, samples: npt.NDArray, condition: TriggerCondition) -> float:
+        '''
+        samples: one channel of a frame
+        '''
+        if condition.metric == 'rms':
+            return float(np.sqrt(np.mean(np.square(samples, dtype=np.float64))))
+        if condition.metric == 'peak':
+            return float(np.max(np.abs(samples)))
+        # Parseval on the one-sided spectrum: RMS of the band
+        spectrum = np.fft.rfft(samples)[self.get_band_mask(
+            condition.band, samples.shape[-1])]
+        return float(np.sqrt(2 * np.sum(np.square(np.abs(spectrum)))) / samples.shape[-1])
+
+    def evaluate(self, frame: npt.NDArray) -> Optional[tuple]:
+        '''
+        frame: (number of channels, samples)
+        return: (condition index, measured value) of the first condition reached,
+        `None` if no condition is reached
+        '''
+        if self.scaler != None:
+            frame = self.scaler(frame)
+        for i, condition in enumerate(self.conditions):
+            value = self.measure(frame[condition.channel], condition)
+            if value >= condition.threshold:
+                return i, value
+        return None
+
+
+class EventWriter(NPYWriter):
+    '''
+    Record only around trigger events, frames laid out as (samples, channels).
+
+    The last `pre_trigger` seconds of frames are kept in memory. A firing frame
+    starts an event: the kept frames, the firing frame and `post_trigger` seconds
+    of following frames go to `event_N.npy` segments. A frame firing within the
+    post-trigger window extends the event. `events` is the manifest of events,
+    those fired by a condition with `protect` are protected from retention.
+    '''
+
+    segment_prefix = 'event_'
+
+    def __init__(self, directory: str):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        super(EventWriter, self).__init__(directory=directory)
+        self.writer_type = 'event'
+        self.engine: Optional[TriggerEngine] = None
+        self.pre_frame_count = 0
+        self.post_frame_count = 1
+        # pre-trigger frames and their (sequence, first sample, monotonic ns, wall ns)
+        self.history: Optional[npt.NDArray] = None
+        self.history_tags: Optional[npt.NDArray[np.int64]] = None
+        self.history_index = 0
+        self.history_count = 0
+        self.event: Optional[dict] = None
+        self.remaining_frame_count = 0
+        # whether the frame of the next `write_tag()` was recorded
+        self.frame_recorded = False
+        self.trigger_pending = False
+        self.received_frame_count = 0
+        self.events: list[dict] = list()
+
+    def configure(self, engine: TriggerEngine, pre_trigger: float, post_trigger: float,
+                  frame_duration: int, max_segment_bytes: int = 0):
+        '''
+        pre_trigger, post_trigger: second
+        frame_duration: millisecond
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.configure)}')
+
+        self.engine = engine
+        self.pre_frame_count = math.ceil(pre_trigger * 1000 / frame_duration)
+        self.post_frame_count = max(
+            1, math.ceil(post_trigger * 1000 / frame_duration))
+        # one segment per event unless it is extended
+        self.frames_per_segment = self.pre_frame_count + 1 + self.post_frame_count
+        self.max_segment_bytes = max_segment_bytes
+        self.history = None
+        self.history_tags = None
+
+    def reset_write_file_count(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.reset_write_file_count)}')
+
+        self.end_event()
+        super(EventWriter, self).reset_write_file_count()
+        self.history_index = 0
+        self.history_count = 0
+        self.received_frame_count = 0
+        self.events = list()
+
+    def close_file(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.close_file)}')
+
+        self.end_event()
+        super(EventWriter, self).close_file()
+        self.engine = None
+
+    def push_history(self, frame: npt.NDArray):
+        if self.pre_frame_count == 0:
+            return
+        if self.history is None:
+            self.history = np.empty(
+                (self.pre_frame_count,) + frame.shape, dtype=frame.dtype)
+            self.history_tags = np.full(
+                (self.pre_frame_count, 4), -1, dtype=np.int64)
+        self.history[self.history_index] = frame
+        self.history_tags[self.history_index] = -1
+        self.history_index = (self.history_index + 1) % self.pre_frame_count
+        self.history_count = min(self.history_count + 1, self.pre_frame_count)
+
+    def start_event(self, condition_index: int, value: float):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.start_event)}')
+
+        self.event = {
+            'event': len(self.events),
+            'first_frame': self.frame_count,
+            'frame_count': 0,
+            'pre_trigger_frame_count': self.history_count,
+            'trigger_frame': self.received_frame_count - 1,
+            'condition': condition_index,
+            'value': value,
+            'trigger_count': 0,
+            'first_segment': self.write_file_count,
+            'segments': list(),
+            'protected': self.engine.conditions[condition_index].protect,
+        }
+        self.events.append(self.event)
+        print(f'trigger event {self.event["event"]}: condition {condition_index}, value {value:.4g}')
+        # flush pre-trigger frames, oldest first
+        for i in range(self.history_count):
+            index = (self.history_index - self.history_count + i) % self.pre_frame_count
+            NPYWriter.write(self, self.history[index])
+            sequence, *tag = self.history_tags[index].tolist()
+            if sequence >= 0:
+                StorageTools.write_tag(self, sequence, tag)
+        self.event['frame_count'] = self.history_count
+        self.history_count = 0
+
+    def end_event(self):
+        if self.event == None:
+            return
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.end_event)}')
+
+        self.close_segment()
+        self.event['segments'] = [segment['file_name']
+                                  for segment in self.segments[self.event['first_segment']:]]
+        print(f'trigger event {self.event["event"]} recorded: {self.event["frame_count"]} frames')
+        self.event = None
+        self.remaining_frame_count = 0
+
+    def write(self, chunk, transpose=False):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.write)}')
+
+        frame = np.transpose(chunk) if transpose else chunk
+        self.received_frame_count += 1
+        fired = self.engine.evaluate(chunk if transpose else np.transpose(chunk))
+        self.trigger_pending = fired != None
+        if self.event == None and fired == None:
+            self.push_history(frame)
+            self.frame_recorded = False
+            return
+        if self.event == None:
+            self.start_event(*fired)
+
+        NPYWriter.write(self, frame)
+        self.frame_recorded = True
+        self.event['frame_count'] += 1
+        if fired != None:
+            self.event['trigger_count'] += 1
+            # a protected condition extending the event protects all of it
+            if self.engine.conditions[fired[0]].protect:
+                self.event['protected'] = True
+            self.remaining_frame_count = self.post_frame_count
+        else:
+            self.remaining_frame_count -= 1
+            if self.remaining_frame_count == 0:
+                self.end_event()
+
+    def write_tag(self, sequence: int, tag):
+        '''
+        Tags of recorded frames go to the tag file, others wait with their frame in history.
+        '''
+        if self.trigger_pending and self.event != None and 'trigger_wall_ns' not in self.event:
+            self.event['trigger_first_sample'] = int(tag[0])
+            self.event['trigger_wall_ns'] = int(tag[2])
+        if self.frame_recorded:
+            super(EventWriter, self).write_tag(sequence, tag)
+        elif self.history_count > 0:
+            self.history_tags[(self.history_index - 1) % self.pre_frame_count] = (sequence, *tag)
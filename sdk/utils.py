@@ -1,10 +1,35 @@
+import io
 import os
 import sys
+import time
+import queue
+import threading
 import numpy as np
+import json
+import struct
 import inspect
 from datetime import datetime
 from debug_flags import PRINT_FUNC_NAME_FLAG
 
+# binary stream file: magic | uint32 data offset | JSON header padded to 64 bytes | samples
+BINARY_STREAM_MAGIC = b'MYDAQBIN'
+BINARY_STREAM_VERSION = 1
+BINARY_STREAM_ALIGN = 64
+# per frame tags of a recording, one CSV row per written frame
+FRAME_TAG_FILE_NAME = 'frame_tags.csv'
+FRAME_TAG_COLUMNS = ('frame', 'sequence', 'first_sample', 'monotonic_ns', 'wall_ns')
+# append-only progress of a recording next to its cfg.json, one JSON line per update
+PROGRESS_LOG_FILE_NAME = 'progress.jsonl'
+# seek index of a recording, binary header like the stream file, then one record per written frame:
+# frame, file number, byte offset of the frame in its file, first sample in the recording,
+# first sample since task start, wall clock ns, see `sdk.frame_index`
+FRAME_INDEX_FILE_NAME = 'frame_index.idx'
+FRAME_INDEX_MAGIC = b'MYDAQIDX'
+FRAME_INDEX_VERSION = 1
+FRAME_INDEX_DTYPE = np.dtype([('frame', '<i8'), ('file', '<i4'), ('offset', '<i8'),
+                              ('sample', '<i8'), ('first_sample', '<i8'), ('wall_ns', '<i8')])
+FRAME_INDEX_RECORD = struct.Struct('<qiqqqq')
+
 
 class StorageTools:
 
@@ -17,6 +42,15 @@ class StorageTools:
         self.file_path = None
         self.file = None
         self.writer_type = None
+        self.header = None
+        self.tag_file = None
+        self.tag_count = 0
+        self.index_file = None
+        # recording between `NI9234.open_writer()` and `close_file()`, a segment writer has
+        # no open file between segments
+        self.recording = False
+        # (file number, byte offset, first sample in recording) of the frame just written
+        self.frame_location = None
 
     def set_directory(self, directory):
         if PRINT_FUNC_NAME_FLAG:
@@ -32,16 +66,72 @@ class StorageTools:
         self.check_file_extension()
         self.file_path = os.path.join(self.directory, self.file_name)
 
+    def set_header(self, header: dict):
+        '''
+        header: task params of the recording, writers with a file header embed it
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.set_header)}')
+
+        self.header = header
+
+    def is_open(self) -> bool:
+        return self.file != None and not self.file.closed
+
+    def get_file_pattern(self) -> str:
+        '''
+        `str.format()` pattern of the file holding frames of file number N, for the seek index.
+        '''
+        return self.file_name.replace('{', '{{').replace('}', '}}')
+
+    def write_tag(self, sequence: int, tag):
+        '''
+        Append the tag (first sample, monotonic ns, wall clock ns) of the frame just
+        written to `FRAME_TAG_FILE_NAME`, and its location to `FRAME_INDEX_FILE_NAME`
+        in writer directory.
+        '''
+        if self.tag_file == None:
+            self.tag_file = open(os.path.join(
+                self.directory, FRAME_TAG_FILE_NAME), mode='w')
+            self.tag_file.write(','.join(FRAME_TAG_COLUMNS) + '\n')
+            self.tag_count = 0
+            self.index_file = open(os.path.join(
+                self.directory, FRAME_INDEX_FILE_NAME), mode='wb')
+            self.index_file.write(build_frame_index_header(
+                self.writer_type, self.get_file_pattern()))
+        self.tag_file.write(
+            f'{self.tag_count},{sequence},{tag[0]},{tag[1]},{tag[2]}\n')
+        if self.frame_location != None:
+            file_number, offset, sample = self.frame_location
+            self.index_file.write(FRAME_INDEX_RECORD.pack(
+                self.tag_count, file_number, offset, sample, tag[0], tag[2]))
+        self.tag_count += 1
+
+    def close_tag_file(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.close_tag_file)}')
+
+        if self.tag_file != None:
+            self.tag_file.close()
+            self.tag_file = None
+        if self.index_file != None:
+            self.index_file.close()
+            self.index_file = None
+
 
 class CSVStreamWriter(StorageTools):
 
+    file_extension = '.csv'
+
     def __init__(self, directory: str):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.__init__)}')
 
-        super(StorageTools, self).__init__()
-        self.writer_type = 'stream'
+        super(CSVStreamWriter, self).__init__()
+        self.writer_type = 'csv'
         self.directory = directory
+        self.frame_count = 0
+        self.sample_count = 0
 
     def check_file_extension(self):
         if PRINT_FUNC_NAME_FLAG:
@@ -56,6 +146,8 @@ class CSVStreamWriter(StorageTools):
             print(f'run function - {get_func_name(self.open_file)}')
 
         self.file = open(self.file_path, mode='a')
+        self.frame_count = 0
+        self.sample_count = 0
 
     def close_file(self):
         if PRINT_FUNC_NAME_FLAG:
@@ -63,33 +155,240 @@ class CSVStreamWriter(StorageTools):
 
         if self.file != None:
             self.file.close()
+        self.close_tag_file()
+        self.recording = False
+
+    def write(self, chunk, transpose=False):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.write)}')
+
+        frame = np.transpose(chunk) if transpose else chunk
+        self.frame_location = (0, self.file.tell(), self.sample_count)
+        np.savetxt(fname=self.file, X=frame, delimiter=',')
+        self.frame_count += 1
+        self.sample_count += frame.shape[0]
+
+
+class BinaryStreamWriter(StorageTools):
+    '''
+    Append raw little-endian frames, laid out as (samples, channels), to one file
+    after a self-describing header. Read it back with `open_binary_stream()`.
+
+    The header is written with the first frame, its `channel_count` is the one of
+    the written frames. A file closed without frames gets the channel count of the
+    task params.
+    '''
+
+    file_extension = '.bin'
+    sample_dtypes: dict = {'float32': '<f4', 'float64': '<f8', 'int32': '<i4'}
+
+    def __init__(self, directory: str, sample_dtype: str = 'float32'):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        super(BinaryStreamWriter, self).__init__()
+        self.writer_type = 'stream'
+        self.directory = directory
+        self.set_sample_dtype(sample_dtype)
+        self.frame_count = 0
+        self.sample_count = 0
+        self.header_written = False
+
+    def set_sample_dtype(self, sample_dtype: str):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.set_sample_dtype)}')
+
+        if sample_dtype not in self.sample_dtypes:
+            raise BaseException(
+                f'Illegal sample dtype. Legal dtype : {tuple(self.sample_dtypes)}')
+        self.sample_dtype = sample_dtype
+        self.dtype = np.dtype(self.sample_dtypes[sample_dtype])
+
+    def check_file_extension(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.check_file_extension)}')
+
+        name, extension = os.path.splitext(self.file_name)
+        if extension != self.file_extension:
+            raise BaseException(
+                f'Illegal file extension, *{self.file_extension} required.')
+
+    def build_header(self, channel_count: int) -> bytes:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.build_header)}')
+
+        task_params = self.header if self.header != None else dict()
+        header = {
+            'version': BINARY_STREAM_VERSION,
+            'dtype': self.dtype.str,
+            'channel_count': channel_count,
+            'layout': 'samples_channels',
+            'task_params': task_params,
+        }
+        return pack_binary_header(BINARY_STREAM_MAGIC, header)
+
+    def open_file(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.open_file)}')
+
+        self.file = open(self.file_path, mode='wb')
+        self.header_written = False
+        self.frame_count = 0
+        self.sample_count = 0
+
+    def close_file(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.close_file)}')
+
+        if self.is_open() and not self.header_written:
+            task_params = self.header if self.header != None else dict()
+            self.file.write(self.build_header(len(task_params.get('channels') or [])))
+            self.header_written = True
+        if self.file != None:
+            self.file.close()
+        self.close_tag_file()
+        self.recording = False
 
     def write(self, chunk, transpose=False):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.write)}')
 
         if transpose:
-            np.savetxt(fname=self.file, X=np.transpose(chunk), delimiter=',')
-        else:
-            np.savetxt(fname=self.file, X=chunk, delimiter=',')
+            chunk = np.transpose(chunk)
+        frame = np.ascontiguousarray(chunk, dtype=self.dtype)
+        if not self.header_written:
+            self.file.write(self.build_header(frame.shape[1]))
+            self.header_written = True
+        self.frame_location = (0, self.file.tell(), self.sample_count)
+        self.file.write(frame.data)
+        self.frame_count += 1
+        self.sample_count += frame.shape[0]
+
+
+def pack_binary_header(magic: bytes, header: dict) -> bytes:
+    '''
+    magic | uint32 data offset | JSON header padded to `BINARY_STREAM_ALIGN` bytes
+    '''
+    header_bytes = json.dumps(header).encode('utf-8')
+    prefix_size = len(magic) + 4
+    data_offset = -(-(prefix_size + len(header_bytes)) //
+                    BINARY_STREAM_ALIGN) * BINARY_STREAM_ALIGN
+    header_bytes = header_bytes.ljust(data_offset - prefix_size, b' ')
+    return magic + struct.pack('<I', data_offset) + header_bytes
+
+
+def read_binary_header(file_path: str, magic: bytes) -> dict:
+    '''
+    Return the JSON header of a file of `pack_binary_header()`, with its `data_offset`.
+    '''
+    with open(file_path, mode='rb') as file:
+        if file.read(len(magic)) != magic:
+            raise BaseException(f'{file_path} does not start with {magic}.')
+        data_offset, = struct.unpack('<I', file.read(4))
+        header = json.loads(file.read(data_offset - file.tell()).decode('utf-8'))
+    header['data_offset'] = data_offset
+    return header
+
+
+def read_binary_stream_header(file_path: str) -> dict:
+    '''
+    Return the JSON header of a binary stream file, with its `data_offset`.
+    '''
+    return read_binary_header(file_path, BINARY_STREAM_MAGIC)
+
+
+def build_frame_index_header(writer_type: str, file_pattern: str) -> bytes:
+    '''
+    file_pattern: `file_pattern.format(file number)` is the file name of a frame
+    '''
+    return pack_binary_header(FRAME_INDEX_MAGIC, {
+        'version': FRAME_INDEX_VERSION,
+        'dtype': FRAME_INDEX_DTYPE.descr,
+        'writer_type': writer_type,
+        'file_pattern': file_pattern,
+    })
+
+
+def open_binary_stream(file_path: str, mode: str = 'r') -> np.memmap:
+    '''
+    Memory-map a binary stream file as (samples, channels).
+    '''
+    header = read_binary_stream_header(file_path)
+    channel_count = header['channel_count']
+    if channel_count <= 0:
+        raise BaseException(f'{file_path} has no channels in its header.')
+    dtype = np.dtype(header['dtype'])
+    data_size = os.path.getsize(file_path) - header['data_offset']
+    sample_count = data_size // (dtype.itemsize * channel_count)
+    if sample_count == 0:
+        return np.zeros((0, channel_count), dtype=dtype)
+    return np.memmap(file_path, dtype=dtype, mode=mode, offset=header['data_offset'],
+                     shape=(sample_count, channel_count))
 
 
 class NPYWriter(StorageTools):
+    '''
+    Aggregate frames into preallocated *.npy segments laid out as (samples, channels).
 
-    def __init__(self, directory: str):
+    A segment is rolled over after `segment_period` seconds of frames, or earlier
+    when it would exceed `max_segment_bytes`. A partly filled last segment is
+    shrunk to its frames on close. `segments` is the manifest of closed segments.
+    Closed segments are handed to `compressor` (`SegmentCompressor`) if it is set.
+    '''
+
+    # segment file name: f'{segment_prefix}{N}.npy'
+    segment_prefix = ''
+
+    def __init__(self, directory: str, segment_period: float = 10.0, max_segment_bytes: int = 0):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.__init__)}')
 
         super(NPYWriter, self).__init__()
         self.directory = directory
         self.writer_type = 'segment'
+        self.segment_period = segment_period
+        self.max_segment_bytes = max_segment_bytes
+        self.frames_per_segment = 1
+        self.segment = None
+        self.segment_path = None
+        self.segment_frame_count = 0
+        self.segment_frame_capacity = 0
         self.write_file_count = 0
+        self.frame_count = 0
+        self.sample_count = 0
+        self.segments: list[dict] = list()
+        self.compressor = None
+
+    def set_segment_period(self, segment_period: float, frame_duration: int):
+        '''
+        segment_period: second
+        frame_duration: millisecond
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.set_segment_period)}')
+
+        self.segment_period = segment_period
+        self.frames_per_segment = max(
+            1, int(round(segment_period * 1000 / frame_duration)))
+
+    def set_max_segment_bytes(self, max_segment_bytes: int):
+        '''
+        max_segment_bytes: 0 for no size limit
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.set_max_segment_bytes)}')
+
+        self.max_segment_bytes = max_segment_bytes
 
     def reset_write_file_count(self):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.reset_write_file_count)}')
 
+        self.close_segment()
         self.write_file_count = 0
+        self.frame_count = 0
+        self.sample_count = 0
+        self.segments = list()
 
     def check_file_extension(self):
         if PRINT_FUNC_NAME_FLAG:
@@ -99,16 +398,261 @@ class NPYWriter(StorageTools):
         if extension != '.npy':
             raise BaseException('Illegal file extension, *.npy required.')
 
+    def get_file_pattern(self) -> str:
+        return f'{self.segment_prefix}{{}}.npy'
+
+    def open_segment(self, frame):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.open_segment)}')
+
+        self.segment_frame_capacity = self.frames_per_segment
+        if self.max_segment_bytes > 0:
+            self.segment_frame_capacity = max(1, min(
+                self.segment_frame_capacity, self.max_segment_bytes // frame.nbytes))
+        self.segment_path = os.path.join(
+            self.directory, f'{self.segment_prefix}{self.write_file_count}.npy')
+        self.segment = np.lib.format.open_memmap(
+            self.segment_path, mode='w+', dtype=frame.dtype,
+            shape=(self.segment_frame_capacity * frame.shape[0], frame.shape[1]))
+        self.segment_frame_count = 0
+
+    def close_segment(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.close_segment)}')
+
+        if self.segment is None:
+            return
+        frame_len = self.segment.shape[0] // self.segment_frame_capacity
+        self.segment.flush()
+        self.segment = None
+        if self.segment_frame_count < self.segment_frame_capacity:
+            shrink_npy_file(self.segment_path,
+                            self.segment_frame_count * frame_len)
+        # pending in the compressor before the manifest lists it as closed
+        if self.compressor != None:
+            self.compressor.submit(self.segment_path)
+        self.segments.append({
+            'file_name': os.path.basename(self.segment_path),
+            'first_frame': self.frame_count - self.segment_frame_count,
+            'frame_count': self.segment_frame_count,
+            'sample_count': self.segment_frame_count * frame_len,
+        })
+        self.write_file_count += 1
+
+    def close_file(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.close_file)}')
+
+        self.close_segment()
+        self.close_tag_file()
+        self.recording = False
+
     def write(self, chunk, transpose=False):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.write)}')
 
-        file_path = os.path.join(self.directory, f'{self.write_file_count}.npy')
-        if transpose:
-            np.save(file=file_path, arr=np.transpose(chunk))
+        frame = np.transpose(chunk) if transpose else chunk
+        if self.segment is None:
+            self.open_segment(frame)
+        start = self.segment_frame_count * frame.shape[0]
+        self.frame_location = (self.write_file_count,
+                               self.segment.offset + start * frame.shape[1] * self.segment.itemsize,
+                               self.sample_count)
+        self.segment[start:start + frame.shape[0]] = frame
+        self.segment_frame_count += 1
+        self.frame_count += 1
+        self.sample_count += frame.shape[0]
+        if self.segment_frame_count == self.segment_frame_capacity:
+            self.close_segment()
+
+
+def shrink_npy_file(file_path: str, row_count: int):
+    '''
+    Cut a C-ordered *.npy file down to its first `row_count` rows in place.
+    If the shorter shape does not fit in the same header size, the rows are re-saved.
+    '''
+    with open(file_path, mode='r+b') as file:
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
         else:
-            np.save(file=file_path, arr=np.transpose(chunk))
-        self.write_file_count += 1
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+        data_offset = file.tell()
+        new_shape = (row_count,) + tuple(shape[1:])
+        header = io.BytesIO()
+        header_dict = {'descr': np.lib.format.dtype_to_descr(dtype),
+                       'fortran_order': fortran_order, 'shape': new_shape}
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(header, header_dict)
+        else:
+            np.lib.format.write_array_header_2_0(header, header_dict)
+        if len(header.getvalue()) == data_offset and not fortran_order:
+            file.seek(0)
+            file.write(header.getvalue())
+            file.truncate(data_offset + int(np.prod(new_shape)) * dtype.itemsize)
+            return
+    data = np.load(file_path, mmap_mode='r')[:row_count].copy()
+    np.save(file_path, data)
+
+
+class BackgroundWriter:
+    '''
+    Run `writer.write()` on a dedicated thread fed by a bounded queue, so file I/O
+    never blocks the DAQ callback. The queue only holds references to the frames.
+
+    policy:
+        "block" : `put()` waits for a free queue slot (backpressure to the callback)
+        "drop"  : `put()` drops the frame and counts it when the queue is full
+    '''
+
+    policies: tuple = ('block', 'drop')
+
+    def __init__(self, max_queue_size: int = 16, policy: str = 'block'):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.__init__)}')
+
+        self.writer = None
+        self.thread = None
+        self.enabled = False
+        self.put_lock = threading.Lock()
+        # called with the latency (second) of every handled frame, e.g. for a histogram
+        self.latency_callback = None
+        self.set_policy(policy)
+        self.set_max_queue_size(max_queue_size)
+        self.reset_stats()
+
+    def set_policy(self, policy: str):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.set_policy)}')
+
+        if policy not in self.policies:
+            raise BaseException(
+                f'Illegal writer queue policy. Legal policy : {self.policies}')
+        self.policy = policy
+
+    def set_max_queue_size(self, max_queue_size: int):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.set_max_queue_size)}')
+
+        if self.thread != None and self.thread.is_alive():
+            raise BaseException('Cannot resize queue while writer thread is running.')
+        self.max_queue_size = max(1, max_queue_size)
+        self.queue = queue.Queue(maxsize=self.max_queue_size)
+
+    def set_writer(self, writer):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.set_writer)}')
+
+        self.flush()
+        self.writer = writer
+
+    def reset_stats(self):
+        self.written_count = 0
+        self.dropped_count = 0
+        self.error_count = 0
+        self.max_queue_depth = 0
+        self.latency_sum = 0.0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+
+    def start(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.start)}')
+
+        if self.thread == None or not self.thread.is_alive():
+            self.thread = threading.Thread(
+                target=self.run, name='background-writer', daemon=True)
+            self.thread.start()
+        with self.put_lock:
+            self.enabled = True
+
+    def disable(self):
+        '''
+        Stop accepting frames and wait until every queued frame is written.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.disable)}')
+
+        with self.put_lock:
+            self.enabled = False
+        self.flush()
+
+    def flush(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.flush)}')
+
+        if self.thread != None and self.thread.is_alive():
+            self.queue.join()
+
+    def stop(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.stop)}')
+
+        self.disable()
+        if self.thread != None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.thread = None
+
+    def put(self, chunk, transpose=False, sequence: int = -1, tag=None) -> bool:
+        '''
+        tag: (first sample, monotonic ns, wall clock ns) of frame, written by `writer.write_tag()`
+        '''
+        with self.put_lock:
+            if not self.enabled:
+                return False
+            item = (chunk, transpose, sequence, tag, time.perf_counter())
+            if self.policy == 'block':
+                self.queue.put(item)
+            else:
+                try:
+                    self.queue.put_nowait(item)
+                except queue.Full:
+                    self.dropped_count += 1
+                    return False
+            queue_depth = self.queue.qsize()
+            if queue_depth > self.max_queue_depth:
+                self.max_queue_depth = queue_depth
+            return True
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item == None:
+                self.queue.task_done()
+                break
+            chunk, transpose, sequence, tag, put_time = item
+            try:
+                self.writer.write(chunk=chunk, transpose=transpose)
+                if tag is not None:
+                    self.writer.write_tag(sequence, tag)
+                self.written_count += 1
+            except Exception as error:
+                self.error_count += 1
+                print(f'background writer error: {error}')
+            latency = time.perf_counter() - put_time
+            self.last_latency = latency
+            self.latency_sum += latency
+            if latency > self.max_latency:
+                self.max_latency = latency
+            if self.latency_callback != None:
+                self.latency_callback(latency)
+            self.queue.task_done()
+
+    def get_stats(self) -> dict:
+        handled_count = self.written_count + self.error_count
+        return {
+            'policy': self.policy,
+            'queue_depth': self.queue.qsize(),
+            'max_queue_size': self.max_queue_size,
+            'max_queue_depth': self.max_queue_depth,
+            'written_count': self.written_count,
+            'dropped_count': self.dropped_count,
+            'error_count': self.error_count,
+            'last_latency': self.last_latency,
+            'mean_latency': self.latency_sum / handled_count if handled_count else 0.0,
+            'max_latency': self.max_latency,
+        }
 
 
 def get_func_name(func):
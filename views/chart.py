@@ -76,8 +76,7 @@ class LineChart(QWidget):
         self.chart_view.setChart(self._chart)
         self._x = np.linspace(0, 100, 512)
         self._y = np.zeros(512)
-        self._buffer = [QPointF(x, y) for x, y in zip(self._x, self._y)]
-        self._series.append(self._buffer)
+        self.replace_series()
         self.set_dark_theme()
 
     def mouseMoveEvent(self, event) -> None:
@@ -93,11 +92,31 @@ class LineChart(QWidget):
         if PRINT_FUNC_NAME_FLAG:
             print(f'run function - {get_func_name(self.set_y)}')
 
-        if len(self._buffer) != y_line.shape[0]:
+        if self._y.shape[0] != y_line.shape[0]:
             raise BaseException('Length of buffer and y-line is not match!')
-        for i in range(y_line.shape[0]):
-            self._buffer[i].setY(y_line[i])
-        self._series.replace(self._buffer)
+        # copy into the contiguous float64 buffer, then push all points at once
+        self._y[:] = y_line
+        self.replace_series()
+
+    def replace_series(self):
+        '''
+        Replace all points of series with `self._x` and `self._y` in a single call.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.replace_series)}')
+
+        if hasattr(self._series, 'replaceNp'):
+            self._series.replaceNp(self._x, self._y)
+        else:
+            # PySide6 without numpy support
+            self._series.replace([QPointF(x, y)
+                                 for x, y in zip(self._x.tolist(), self._y.tolist())])
+
+    def get_plot_width(self) -> int:
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.get_plot_width)}')
+
+        return int(self._chart.plotArea().width())
 
     def set_dark_theme(self):
         if PRINT_FUNC_NAME_FLAG:
@@ -138,8 +157,7 @@ class WaveChart(LineChart):
 
         self._x = np.linspace(0, 100, 512)
         self._y = np.zeros(512)
-        self._buffer = [QPointF(x, y) for x, y in zip(self._x, self._y)]
-        self._series.append(self._buffer)
+        self.replace_series()
 
         # self.mouse_moved = Signal(QPoint)
         # self.mouse_moved.connect(self.mouseMoveEvent)
@@ -151,8 +169,7 @@ class WaveChart(LineChart):
         self._axis_x.setRange(0, end_point)
         self._x = np.linspace(0, end_point, buffer_len)
         self._y = np.zeros(buffer_len)
-        self._buffer = [QPointF(x, y) for x, y in zip(self._x, self._y)]
-        self._series.replace(self._buffer)
+        self.replace_series()
 
     def set_y_range(self, low_limit: float, high_limit: float):
         if PRINT_FUNC_NAME_FLAG:
@@ -188,9 +205,7 @@ class SpectrumChart(LineChart):
 
         self._x = np.linspace(0, 1600, 512)
         self._y = np.zeros(512)
-
-        self._buffer = [QPointF(x, y) for x, y in zip(self._x, self._y)]
-        self._series.append(self._buffer)
+        self.replace_series()
 
         # self.mouse_moved = Signal(QPoint)
         # self.mouse_moved.connect(self.mouseMoveEvent)
@@ -203,8 +218,7 @@ class SpectrumChart(LineChart):
         self._axis_y.setRange(0, 1)
         self._x = np.linspace(0, end_point, buffer_len)
         self._y = np.zeros(buffer_len)
-        self._buffer = [QPointF(x, y) for x, y in zip(self._x, self._y)]
-        self._series.replace(self._buffer)
+        self.replace_series()
 
     def set_x_range(self, low_limit: float, high_limit: float):
         if PRINT_FUNC_NAME_FLAG:
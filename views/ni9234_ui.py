@@ -3,7 +3,7 @@
 ################################################################################
 ## Form generated from reading UI file 'ni9234.ui'
 ##
-## Created by: Qt User Interface Compiler version 6.4.2
+## Created by: Qt User Interface Compiler version 6.12.0
 ##
 ## WARNING! All changes made in this file will be lost when recompiling UI file!
 ################################################################################
@@ -70,6 +70,9 @@ class Ui_NI9234(object):
         self.NowTime_Label = QLabel(NI9234)
         self.NowTime_Label.setObjectName(u"NowTime_Label")
         self.NowTime_Label.setGeometry(QRect(10, 880, 201, 16))
+        self.Health_Label = QLabel(NI9234)
+        self.Health_Label.setObjectName(u"Health_Label")
+        self.Health_Label.setGeometry(QRect(220, 880, 151, 16))
         self.PreparationSetting_Frame = QFrame(NI9234)
         self.PreparationSetting_Frame.setObjectName(u"PreparationSetting_Frame")
         self.PreparationSetting_Frame.setGeometry(QRect(10, 150, 361, 331))
@@ -415,6 +418,7 @@ class Ui_NI9234(object):
         self.WriteFile_Label.setText(QCoreApplication.translate("NI9234", u"Data Directory", None))
         self.WriteFileStatus_Label.setText(QCoreApplication.translate("NI9234", u"Status:", None))
         self.NowTime_Label.setText(QCoreApplication.translate("NI9234", u"Now Time", None))
+        self.Health_Label.setText("")
         self.DAQParameters_GroupBox.setTitle(QCoreApplication.translate("NI9234", u"DAQ Parameters", None))
         self.SampleRate_Label.setText(QCoreApplication.translate("NI9234", u"Sampling Rate (Hz)", None))
         self.FrameDuration_Label.setText(QCoreApplication.translate("NI9234", u"Frame Duration (ms)", None))
@@ -14,11 +14,12 @@ from .chart import WaveChart, SpectrumChart
 from models.NIDAQModel import NIDAQModel
 from debug_flags import PRINT_FUNC_NAME_FLAG
 from sdk.utils import get_func_name
+from sdk.instrumentation import format_health_stats
+from sdk.sensor import load_sensor_cfg
 
 
 class NI9234ViewModel(QWidget):
 
-    wave_downsample_rate: Optional[int] = None
     spectrum_downsample_rate: Optional[int] = None
     abnormal_flags: npt.NDArray = np.array([False, False, False, False])
     vertical_line_painter = QPainter()
@@ -117,10 +118,12 @@ class NI9234ViewModel(QWidget):
             self.on_write_file_type_combox_current_text_changed)
 
         self.wave_data_buffer: Optional[npt.NDArray] = None
-        self.spectrum_data_buffer: Optional[npt.NDArray] = None
+        self.mean_spectrum: Optional[npt.NDArray] = None
 
         # set default params
         self.set_default_values()
+        # wave charts are decimated to the chart width by min/max envelope
+        self.ui.WaveDownSample_Frame.setDisabled(True)
         self.ui.WriteFileStatus_Label.setText('Status: Off')
         self.now_time_timer.start()
         self.writer_type = self.ui.WriteFileType_ComboBox.currentIndex()
@@ -349,7 +352,6 @@ class NI9234ViewModel(QWidget):
             self.ui.PreparationSetting_Frame.setDisabled(True)
             self.graph_update_timer.setInterval(
                 self.ui.ChartUpdateInterval_SpinBox.value())
-            self.wave_downsample_rate = self.ui.WaveDownSample_SpinBox.value()
             self.spectrum_downsample_rate = self.ui.SpectrumDownSample_SpinBox.value()
 
             # setting task for nidaq model
@@ -366,6 +368,7 @@ class NI9234ViewModel(QWidget):
             self.model.active_sensor_model_list = self.active_sensor_model_list
             self.model.active_sensor_cfg_list = self.active_sensor_cfg_list
             self.model.write_file_directory = self.ui.WriteFile_LineEdit.text()
+            self.model.wave_bucket_count = self.get_wave_bucket_count()
             self.model.create()
             # ------block end------
 
@@ -410,6 +413,7 @@ class NI9234ViewModel(QWidget):
         self.ui.ClearTask_PushButton.setDisabled(True)
         self.ui.WriteFile_GroupBox.setEnabled(True)
         self.ui.ChartParameters_GroupBox.setDisabled(True)
+        self.apply_chart_parameters()
         self.model.start()
 
     def on_stop_button_clicked(self):
@@ -426,6 +430,31 @@ class NI9234ViewModel(QWidget):
         self.ui.ChartParameters_GroupBox.setEnabled(True)
         self.model.stop()
 
+    def apply_chart_parameters(self):
+        '''
+        Chart parameters changed while stopped, rebuild plot buffers and charts only,
+        the task is kept as created.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(
+                f'run function - {get_func_name(self.apply_chart_parameters)}')
+
+        self.graph_update_timer.setInterval(
+            self.ui.ChartUpdateInterval_SpinBox.value())
+        self.model.update_interval = self.ui.ChartUpdateInterval_SpinBox.value()
+        if self.ui.SpectrumDownSample_SpinBox.value() != self.spectrum_downsample_rate:
+            self.spectrum_downsample_rate = self.ui.SpectrumDownSample_SpinBox.value()
+            self.reset_spectrum_chart()
+        buffer_rate = self.ui.BufferRate_SpinBox.value()
+        wave_bucket_count = self.get_wave_bucket_count()
+        if (buffer_rate, wave_bucket_count) == (self.model.buffer_rate, self.model.wave_bucket_count):
+            return
+        self.model.buffer_rate = buffer_rate
+        self.model.wave_bucket_count = wave_bucket_count
+        self.model.configure_frame_processor()
+        self.reset_wave_chart()
+        self.reset_spectrum_chart()
+
     def on_write_file_type_combox_current_text_changed(self):
         if PRINT_FUNC_NAME_FLAG:
             print(
@@ -480,8 +509,7 @@ class NI9234ViewModel(QWidget):
                 f'run function - {get_func_name(self.on_graph_update_timer_timeout)}')
 
         self.wave_data_buffer = self.model.get_wave_data_buffer()
-        self.spectrum_data_buffer = self.model.get_spectrum_data_buffer()
-        self.wave_data_buffer_mean = np.mean(self.wave_data_buffer)
+        self.mean_spectrum = self.model.get_mean_spectrum()
         self.update_wave_chart()
         self.update_spectrum_chart()
 
@@ -492,6 +520,24 @@ class NI9234ViewModel(QWidget):
 
         self.ui.NowTime_Label.setText(
             datetime.now().isoformat(sep=' ', timespec='seconds'))
+        self.update_health_label()
+
+    def update_health_label(self):
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.update_health_label)}')
+
+        health_stats = self.model.get_health_stats()
+        if health_stats == None:
+            self.ui.Health_Label.clear()
+            self.ui.Health_Label.setToolTip('')
+            return
+        max_fill = health_stats['buffer_fill']['max']
+        max_fill_text = '-' if max_fill == None else f'{max_fill * 100:.0f}%'
+        self.ui.Health_Label.setText(
+            f'buffer {max_fill_text}, overflow {health_stats["overflow_count"]}')
+        self.ui.Health_Label.setStyleSheet(
+            'color: red' if health_stats['read_error_count'] else '')
+        self.ui.Health_Label.setToolTip(format_health_stats(health_stats))
 
     def channel_is_seleted(self):
         '''
@@ -538,11 +584,8 @@ class NI9234ViewModel(QWidget):
                 self.active_channel_num_list.append(channel_num)
                 sensor_cfg_path = os.path.join(
                     self.sensor_cfg_dir, f'{combox.currentText()}.json')
-                cfg_file = open(sensor_cfg_path)
-                sensor_cfg = json.load(cfg_file)
-                cfg_file.close()
                 self.active_sensor_model_list.append(
-                    sensor_cfg['sensor_model'])
+                    load_sensor_cfg(sensor_cfg_path)['sensor_model'])
                 self.active_sensor_cfg_list.append(sensor_cfg_path)
         print(f'active sensor models: {self.active_sensor_model_list}')
 
@@ -551,12 +594,7 @@ class NI9234ViewModel(QWidget):
             print(f'run function - {get_func_name(self.reset_wave_chart)}')
 
         time_limit = self.model.buffer_duration
-        wave_len = self.model.get_wave_buffer_len()
-        wave_tail = wave_len % self.wave_downsample_rate
-        if wave_tail == 0:
-            wave_len = wave_len // self.wave_downsample_rate
-        else:
-            wave_len = wave_len // self.wave_downsample_rate + 1
+        wave_len = self.model.get_wave_envelope_len()
 
         for num in self.active_channel_num_list:
             wave_chart: WaveChart = self.channel_wave_charts[num]
@@ -586,31 +624,43 @@ class NI9234ViewModel(QWidget):
 
         for i, num in enumerate(self.active_channel_num_list):
             wave_chart: WaveChart = self.channel_wave_charts[num]
-            wave_data_downsample = self.wave_data_buffer[i,
-                                                         ::self.wave_downsample_rate]
-            wave_chart.set_y(wave_data_downsample)
+            wave_chart.set_y(self.wave_data_buffer[i])
+
+    def get_wave_bucket_count(self) -> int:
+        '''
+        One min/max bucket per pixel of the widest active wave chart.
+        '''
+        if PRINT_FUNC_NAME_FLAG:
+            print(f'run function - {get_func_name(self.get_wave_bucket_count)}')
+
+        plot_width = max(self.channel_wave_charts[num].get_plot_width()
+                         for num in self.active_channel_num_list)
+        if plot_width <= 0:
+            # chart not laid out yet
+            plot_width = self.model.default_settings['default_wave_bucket_count']
+        return plot_width
 
     def update_spectrum_chart(self):
         if PRINT_FUNC_NAME_FLAG:
             print(
                 f'run function - {get_func_name(self.update_spectrum_chart)}')
 
+        # all channels at once, format: (number of channels, bins)
+        spectrum_data_downsample = self.mean_spectrum[:, ::self.spectrum_downsample_rate]
+        # normalize 0~1
+        spectrum_max = np.max(spectrum_data_downsample, axis=1, keepdims=True)
+        spectrum_data_downsample = spectrum_data_downsample / \
+            np.where(spectrum_max > 0, spectrum_max, 1)
+        max_power_idxs = np.argmax(self.mean_spectrum, axis=1)
+        abnormal_flag = self.model.get_abnormal_flag()
+
         for i, num in enumerate(self.active_channel_num_list):
-            abnormal_flag = self.model.get_abnormal_flag()
             spectrum_chart: SpectrumChart = self.channel_spectrum_charts[num]
-            mean_spectrum = np.mean(self.spectrum_data_buffer[i], axis=0)
-            # mean_spectrum = mean_spectrum / np.max(mean_spectrum) # normalize 0~1
-            spectrum_data_downsample = mean_spectrum[::self.spectrum_downsample_rate]
-            # normalize 0~1
-            spectrum_data_downsample = spectrum_data_downsample / \
-                np.max(spectrum_data_downsample)
-            spectrum_chart.set_y(spectrum_data_downsample)
+            spectrum_chart.set_y(spectrum_data_downsample[i])
 
             if abnormal_flag:
-                max_power_idx = np.where(
-                    mean_spectrum == np.max(mean_spectrum))[0][0]
                 spectrum_chart.chart_view.vertical_line_x = self.model.get_spectrum_freqs()[
-                    max_power_idx]
+                    max_power_idxs[i]]
                 spectrum_chart.chart_view.drawForeground(
                     self.vertical_line_painter, self.vertical_line_rectf)
 